@@ -1,4 +1,5 @@
 import os
+import sys
 import streamlit as st
 import pandas as pd
 import altair as alt
@@ -6,6 +7,13 @@ import warnings
 import datetime
 warnings.filterwarnings("ignore", message="Could not infer format, so each element will be parsed individually")
 
+# make the shared `nem` package importable when this page is run on its own
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nem.charts import (STATISTICS, altair_chart, fold_statistics, legend_toggle, statistic_param,
+                        with_statistic)
+from nem.data import load_bucket_quantiles, load_data, load_interval_stats, load_pyramid, load_time_index
+from nem.pyramid import MAX_POINTS
+
 
 # st.set_page_config(
 #     page_title="NEM Trade Price Analysis",
@@ -24,17 +32,8 @@ REGIONS =[ 'NSW1', 'QLD1', 'SA1', 'TAS1', 'VIC1']
 # File path
 data_folder = os.path.join(os.path.dirname(__file__), "data/concatenated_data")
 
-# Load data function
-def load_data(file_path, date_column):
-    try:
-        data = pd.read_csv(file_path, parse_dates=[date_column])
-        return data
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return None
-
 def chart_by_years(data, y_column, color=None, x_column='MONTH', year_column='YEAR',
-                             y_title='Trade Price', x_title='Month'):
+                             y_title='Trade Price', x_title='Month', statistic=None):
     """
     Creates an interactive Altair chart with line, highlight points, and tooltips.
 
@@ -45,6 +44,8 @@ def chart_by_years(data, y_column, color=None, x_column='MONTH', year_column='YE
         year_column (str, optional): The column name for the year (default is 'YEAR').
         y_title (str, optional): Title for the y-axis (default is 'Trade Price').
         x_title (str, optional): Title for the x-axis (default is 'Month').
+        statistic (alt.Parameter, optional): For data folded with `fold_statistics`,
+            the parameter choosing the statistic to show (see `statistic_param`).
 
     Returns:
         alt.Chart: An Altair chart object.
@@ -56,11 +57,14 @@ def chart_by_years(data, y_column, color=None, x_column='MONTH', year_column='YE
             y=alt.Y(f'{y_column}:Q', title=y_title)
         )
     else:
+        # click the legend to show some of the lines only (in the browser, without a rerun)
+        toggle = legend_toggle(color)
         line = alt.Chart(data).mark_line().encode(
             x=alt.X(f'{x_column}:O', title=x_title, axis=alt.Axis(labelAngle=0)),
             y=alt.Y(f'{y_column}:Q', title=y_title),
-            color=alt.Color(f'{color}:N', title='Year')
-        )
+            color=alt.Color(f'{color}:N', title='Year'),
+            opacity=alt.condition(toggle, alt.value(1), alt.value(0.1))
+        ).add_params(toggle)
 
     # Transparent selectors across the chart for hover interactivity
     nearest = alt.selection_point(
@@ -90,6 +94,8 @@ def chart_by_years(data, y_column, color=None, x_column='MONTH', year_column='YE
 
     # Combine the layers
     chart = alt.layer(line, selectors, highlight_points, tooltips).interactive()
+    if statistic is not None:
+        chart = with_statistic(chart, statistic)
 
     return chart
 
@@ -122,23 +128,22 @@ with st.container():
     file_path = f"data/analysis/PRICE_STATS_BY_MONTH_{selected_region}.csv"
     st.subheader(f"Trade Price from 2019 to 2024 for {selected_region} by Months")
 
-    option = ['mean', 'median', 'min', 'max']
-    selection = st.pills("Select one or more statistic to display", 
-                         option, 
-                         selection_mode='multi', 
-                         default=['mean', 'median'],
-                         key="overall")
-    
+    st.write("Click the legend to choose the statistics to display (shift-click for several).")
 
     if selected_region:
-        data = load_data(file_path, date_column='YEAR_MONTH')
+        data = load_data(file_path, date_columns=['YEAR_MONTH'])
         if data is not None:
-
-            if selection:
-                    _selection = [f'RRP_{s}' for s in selection]
-                    mychart = st.line_chart(data, x='YEAR_MONTH', y=_selection, x_label= "Year", y_label='Trade Price')
-            else:
-                st.warning("Please select one or more statistics to display the plot.")
+            # all four statistics in long form; the legend toggles them in the browser
+            data = fold_statistics(data, ['YEAR_MONTH'], measures=('RRP',))
+            toggle = legend_toggle('STATISTIC', value=['mean', 'median'])
+            chart = alt.Chart(data).mark_line().encode(
+                x=alt.X('YEAR_MONTH:T', title="Year"),
+                y=alt.Y('RRP:Q', title='Trade Price'),
+                color=alt.Color('STATISTIC:N', title=None, sort=STATISTICS),
+                opacity=alt.condition(toggle, alt.value(1), alt.value(0.1)),
+                tooltip=['YEAR_MONTH:T', 'STATISTIC', 'RRP']
+            ).add_params(toggle).interactive()
+            altair_chart(chart)
         else:
             st.warning("Please provide a valid file path to load data.")
     else:
@@ -151,30 +156,21 @@ with st.container():
 
     st.subheader(f"Trade Price for {selected_region} by Different Years")
 
-    option = ['mean', 'median', 'min', 'max']
-    selection = st.pills("Select a statistic to display", 
-                         option, 
-                         selection_mode='single', 
-                         default=['median'],
-                         key="by_year")
-    
+    st.write("Choose the statistic with the buttons under the chart and click the legend to show some of the years.")
+
     month, quarter, fortnight, week = st.tabs(["Month", "Quarter", "Fortnight", "Week"])
 
     with month:
         file_path = f"data/analysis/PRICE_STATS_BY_MONTH_{selected_region}.csv"
 
         if selected_region:
-            data = load_data(file_path, date_column='YEAR_MONTH')
+            data = load_data(file_path, date_columns=['YEAR_MONTH'])
 
             if data is not None:
-                if selection:
-                    _selection = f'RRP_{selection}'
-
-                    chart = chart_by_years(data, y_column=_selection, x_column='MONTH', x_title='Month', color='YEAR')
-
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+                data = fold_statistics(data, ['YEAR', 'MONTH'], measures=('RRP',))
+                chart = chart_by_years(data, y_column='RRP', x_column='MONTH', x_title='Month', color='YEAR',
+                                       statistic=statistic_param())
+                altair_chart(chart)
             else:
                 st.warning("Please provide a valid file path to load data.")
         else:
@@ -184,20 +180,22 @@ with st.container():
         file_path = f"data/analysis/PRICE_STATS_BY_MONTH_{selected_region}.csv"
 
         if selected_region:
-            data = load_data(file_path, date_column='YEAR_MONTH')
+            data = load_data(file_path, date_columns=['YEAR_MONTH'])
 
             if data is not None:
                 # aggregate monthly data to quarterly data, month 1-3 is Q1, 4-6 is Q2, 7-9 is Q3, 10-12 is Q4
                 data['QUARTER'] = data['MONTH'].apply(lambda x: f"Q{int((x-1)/3)+1}")
                 data = data.groupby(['YEAR', 'QUARTER']).agg({'RRP_mean': 'mean', 'RRP_median': 'median', 'RRP_min': 'min', 'RRP_max': 'max'}).round(2).reset_index()
-
-                if selection:
-                    _selection = f'RRP_{selection}'
-
-                    chart = chart_by_years(data, y_column=_selection, x_column='QUARTER', x_title='Quarter', color='YEAR')
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+                # a median of monthly medians is not the quarter's median: merge the monthly sketches when available
+                medians = load_bucket_quantiles(selected_region, "MONTH", "RRP", [0.5],
+                                                regroup=lambda month: month.str[:4] + "-Q" + ((month.str[5:7].astype(int) - 1) // 3 + 1).astype(str))
+                if medians is not None:
+                    data['RRP_median'] = (data['YEAR'].astype(str) + "-" + data['QUARTER']).map(medians[0.5]).round(2)
+
+                data = fold_statistics(data, ['YEAR', 'QUARTER'], measures=('RRP',))
+                chart = chart_by_years(data, y_column='RRP', x_column='QUARTER', x_title='Quarter', color='YEAR',
+                                       statistic=statistic_param())
+                altair_chart(chart)
             else:
                 st.warning("Please provide a valid file path to load data.")
         else:
@@ -207,17 +205,20 @@ with st.container():
         file_path = f"data/analysis/PRICE_STATS_BY_WEEK_{selected_region}.csv"
 
         if selected_region:
-            data = load_data(file_path, date_column='YEAR_WEEK')
+            data = load_data(file_path, date_columns=['YEAR_WEEK'])
 
             if data is not None:
                 data['FORTNIGHT'] = data['WEEK'].apply(lambda x: int(((x-1)/2))+1)
                 data = data.groupby(['YEAR', 'FORTNIGHT']).agg({'RRP_mean': 'mean', 'RRP_median': 'median', 'RRP_min': 'min', 'RRP_max': 'max'}).round(2).reset_index()
-                if selection:
-                    _selection = f'RRP_{selection}'
-                    chart = chart_by_years(data, y_column=_selection, x_column='FORTNIGHT', x_title='Fortnight', color='YEAR')
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+                # likewise, merge the weekly sketches into fortnights for the median
+                medians = load_bucket_quantiles(selected_region, "WEEK", "RRP", [0.5],
+                                                regroup=lambda week: week.str[:4] + "-" + (((week.str[5:].astype(int) - 1) / 2).astype(int) + 1).astype(str))
+                if medians is not None:
+                    data['RRP_median'] = (data['YEAR'].astype(str) + "-" + data['FORTNIGHT'].astype(str)).map(medians[0.5]).round(2)
+                data = fold_statistics(data, ['YEAR', 'FORTNIGHT'], measures=('RRP',))
+                chart = chart_by_years(data, y_column='RRP', x_column='FORTNIGHT', x_title='Fortnight', color='YEAR',
+                                       statistic=statistic_param())
+                altair_chart(chart)
             else:
                 st.warning("Please provide a valid file path to load data.")
 
@@ -225,15 +226,13 @@ with st.container():
         file_path = f"data/analysis/PRICE_STATS_BY_WEEK_{selected_region}.csv"
 
         if selected_region:
-            data = load_data(file_path, date_column='YEAR_WEEK')
+            data = load_data(file_path, date_columns=['YEAR_WEEK'])
 
             if data is not None:
-                if selection:
-                    _selection = f'RRP_{selection}'
-                    chart = chart_by_years(data, y_column=_selection, x_column='WEEK', x_title='Week', color='YEAR')
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+                data = fold_statistics(data, ['YEAR', 'WEEK'], measures=('RRP',))
+                chart = chart_by_years(data, y_column='RRP', x_column='WEEK', x_title='Week', color='YEAR',
+                                       statistic=statistic_param())
+                altair_chart(chart)
             else:
                 st.warning("Please provide a valid file path to load data.")
         else:
@@ -247,19 +246,12 @@ with st.container():
 
     file_path = f"data/analysis/PRICE_STATS_BY_DAY_{selected_region}.csv"
 
-    col1, col2, _ = st.columns([0.25, 0.25, 0.4])
-    with col2:
-        year_range = st.slider("Select year range to display the data", 2019, 2024, (2020, 2024), 1, key="year-slider")
+    col1, _ = st.columns([0.25, 0.75])
     with col1:
-        option = ['mean', 'median', 'min', 'max']
-        selection = st.pills("Select a statistic to display", 
-                            option, 
-                            selection_mode='single', 
-                            default=['median'],
-                            key="by_month")
+        year_range = st.slider("Select year range to display the data", 2019, 2024, (2020, 2024), 1, key="year-slider")
 
     if selected_region:
-        data = load_data(file_path, date_column='YEAR_MONTH_DAY')
+        data = load_data(file_path, date_columns=['YEAR_MONTH_DAY'])
         if data is not None:
             # get year in the selected range
             data = data[(data['YEAR'] >= year_range[0]) & (data['YEAR'] <= year_range[1])]
@@ -269,45 +261,41 @@ with st.container():
                                               'TOTALDEMAND_mean': 'mean', 'TOTALDEMAND_median': 'median',
                                                 'TOTALDEMAND_min': 'min', 'TOTALDEMAND_max': 'max'}).round(2).reset_index()
 
-            if selection:
-                _selection_RRP = f'RRP_{selection}'
-                _selection_DEMAND = f'TOTALDEMAND_{selection}'
-                
-                base = alt.Chart(data).encode(
-                    x=alt.X('DAY:O', title="Day", axis=alt.Axis(labelAngle=0))
-                )
-                
-                rrp_line = base.mark_line(color='red').encode(
-                    y=alt.Y(f'{_selection_RRP}:Q', title='Trade Price',
-                            scale=alt.Scale(zero=False, nice=True)),
-                    tooltip=['DAY', f'{_selection_RRP}'],
-                    color=alt.value('red')
-                ).properties(
-                    title='Trade Price'
-                )
-                
-                demand_line = base.mark_line(color='blue', strokeDash=[5, 5]).encode(
-                    y=alt.Y(f'{_selection_DEMAND}:Q', title='Total Demand', 
-                            scale=alt.Scale(zero=False, nice=True)),
-                    tooltip=['DAY', f'{_selection_DEMAND}'],
-                    color=alt.value('blue')
-                ).properties(
-                    title='Total Demand'
-                )
-                
-                chart = alt.layer(rrp_line, demand_line).resolve_scale(
-                    y='independent'
-                ).interactive()
-                
-                chart = chart.configure_legend(
-                    orient='bottom',
-                    title=None,
-                    labelFontSize=12
-                )
-                
-                st.altair_chart(chart, theme="streamlit", use_container_width=True)
-            else:
-                st.warning("Please select one statistic to display the plot.")
+            data = fold_statistics(data, ['DAY'])
+
+            base = alt.Chart(data).encode(
+                x=alt.X('DAY:O', title="Day", axis=alt.Axis(labelAngle=0))
+            )
+
+            rrp_line = base.mark_line(color='red').encode(
+                y=alt.Y('RRP:Q', title='Trade Price',
+                        scale=alt.Scale(zero=False, nice=True)),
+                tooltip=['DAY', 'STATISTIC', 'RRP'],
+                color=alt.value('red')
+            ).properties(
+                title='Trade Price'
+            )
+
+            demand_line = base.mark_line(color='blue', strokeDash=[5, 5]).encode(
+                y=alt.Y('TOTALDEMAND:Q', title='Total Demand',
+                        scale=alt.Scale(zero=False, nice=True)),
+                tooltip=['DAY', 'STATISTIC', 'TOTALDEMAND'],
+                color=alt.value('blue')
+            ).properties(
+                title='Total Demand'
+            )
+
+            chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                y='independent'
+            ).interactive()
+
+            chart = chart.configure_legend(
+                orient='bottom',
+                title=None,
+                labelFontSize=12
+            )
+
+            altair_chart(with_statistic(chart, statistic_param()))
 
 ### Chart 4: Trade Price Weekly Distribution for selected_region
 ### x-axis: week, x-range: day, y-axis: mean, median, min, max
@@ -317,19 +305,12 @@ with st.container():
 
     file_path = f"data/analysis/PRICE_STATS_BY_DAY_{selected_region}.csv"
 
-    col1, col2, _ = st.columns([0.25, 0.25, 0.4])
-    with col2:
-        year_range = st.slider("Select year range to display the data", 2019, 2024, (2020, 2024), 1, key="year-slider-2")
+    col1, _ = st.columns([0.25, 0.75])
     with col1:
-        option = ['mean', 'median', 'min', 'max']
-        selection = st.pills("Select a statistic to display", 
-                            option, 
-                            selection_mode='single', 
-                            default=['median'],
-                            key="by_week")
+        year_range = st.slider("Select year range to display the data", 2019, 2024, (2020, 2024), 1, key="year-slider-2")
 
     if selected_region:
-        data = load_data(file_path, date_column='YEAR_MONTH_DAY')
+        data = load_data(file_path, date_columns=['YEAR_MONTH_DAY'])
         if data is not None:
             # get year in the selected range
             data = data[(data['YEAR'] >= year_range[0]) & (data['YEAR'] <= year_range[1])]
@@ -339,32 +320,28 @@ with st.container():
                                               'TOTALDEMAND_mean': 'mean', 'TOTALDEMAND_median': 'median',
                                                 'TOTALDEMAND_min': 'min', 'TOTALDEMAND_max': 'max'}).round(2).reset_index()
             
-            if selection:
-                _selection_RRP = f'RRP_{selection}'
-                _selection_DEMAND = f'TOTALDEMAND_{selection}'
-                
-                base = alt.Chart(data).encode(
-                    x=alt.X('WEEKDAY:O', title="Day", axis=alt.Axis(labelAngle=0,
-                            labelExpr="{'0': 'Mon', '1': 'Tue', '2': 'Wed', '3': 'Thu', '4': 'Fri', '5': 'Sat', '6': 'Sun'}[datum.value]")),)
-                
-                rrp_line = base.mark_line(color='blue').encode(
-                    y=alt.Y(f'{_selection_RRP}:Q', title='Trade Price',
-                            scale=alt.Scale(zero=False, nice=True)),
-                    tooltip=['WEEKDAY', f'{_selection_RRP}']
-                )
-                
-                demand_line = base.mark_line(color='red', strokeDash=(5,5)).encode(
-                    y=alt.Y(f'{_selection_DEMAND}:Q', title='Total Demand',
-                            scale=alt.Scale(zero=False, nice=True)),
-                    tooltip=['WEEKDAY', f'{_selection_DEMAND}']
-                )
-                
-                chart = alt.layer(rrp_line, demand_line).resolve_scale(
-                    y='independent'
-                ).interactive()
-                st.altair_chart(chart, theme="streamlit", use_container_width=True)
-            else:
-                st.warning("Please select one statistic to display the plot.")
+            data = fold_statistics(data, ['WEEKDAY'])
+
+            base = alt.Chart(data).encode(
+                x=alt.X('WEEKDAY:O', title="Day", axis=alt.Axis(labelAngle=0,
+                        labelExpr="{'0': 'Mon', '1': 'Tue', '2': 'Wed', '3': 'Thu', '4': 'Fri', '5': 'Sat', '6': 'Sun'}[datum.value]")),)
+
+            rrp_line = base.mark_line(color='blue').encode(
+                y=alt.Y('RRP:Q', title='Trade Price',
+                        scale=alt.Scale(zero=False, nice=True)),
+                tooltip=['WEEKDAY', 'STATISTIC', 'RRP']
+            )
+
+            demand_line = base.mark_line(color='red', strokeDash=(5,5)).encode(
+                y=alt.Y('TOTALDEMAND:Q', title='Total Demand',
+                        scale=alt.Scale(zero=False, nice=True)),
+                tooltip=['WEEKDAY', 'STATISTIC', 'TOTALDEMAND']
+            )
+
+            chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                y='independent'
+            ).interactive()
+            altair_chart(with_statistic(chart, statistic_param()))
         else:
             st.warning("Please provide a valid file path to load data.")
     else:
@@ -376,16 +353,9 @@ with st.container():
 with st.container():
     st.subheader(f"Trade Price Daily Distribution for {selected_region}")
 
-    col1, col2, _ = st.columns([0.25, 0.20, 0.55])
+    col1, _ = st.columns([0.25, 0.75])
 
     with col1:
-        option = ['mean', 'median', 'min', 'max']
-        selection = st.pills("Select a statistic to display", 
-                            option, 
-                            selection_mode='single', 
-                            default=['median'],
-                            key="by_day")
-    with col2:
         year = st.selectbox("Select a year to display the data", list(range(2022, 2025)), index=1, key="year-select")
     
     hours, dispatch = st.tabs(["1 Hour", "Dispatch"])
@@ -393,7 +363,7 @@ with st.container():
     with hours:
         file_path = f"data/analysis/PRICE_STATS_BY_HOUR_{selected_region}.csv"
         if selected_region:
-            data = load_data(file_path, date_column='YEAR_MONTH_DAY_HOUR')
+            data = load_data(file_path, date_columns=['YEAR_MONTH_DAY_HOUR'])
             if data is not None:
                 # get year in the selected range
                 data = data[data['YEAR'] == year]
@@ -403,32 +373,28 @@ with st.container():
                                                 'TOTALDEMAND_mean': 'mean', 'TOTALDEMAND_median': 'median',
                                                     'TOTALDEMAND_min': 'min', 'TOTALDEMAND_max': 'max'}).round(2).reset_index()
                 
-                if selection:
-                    _selection_RRP = f'RRP_{selection}'
-                    _selection_DEMAND = f'TOTALDEMAND_{selection}'
-                    
-                    base = alt.Chart(data).encode(
-                        x=alt.X('HOUR:O', title="Hour", axis=alt.Axis(labelAngle=0))
-                    )
-                    
-                    rrp_line = base.mark_line(color='red').encode(
-                        y=alt.Y(f'{_selection_RRP}:Q', title='Trade Price',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['HOUR', f'{_selection_RRP}']
-                    )
-                    
-                    demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
-                        y=alt.Y(f'{_selection_DEMAND}:Q', title='Total Demand',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['HOUR', f'{_selection_DEMAND}']
-                    )
-                    
-                    chart = alt.layer(rrp_line, demand_line).resolve_scale(
-                        y='independent'
-                    ).interactive()
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+                data = fold_statistics(data, ['HOUR'])
+
+                base = alt.Chart(data).encode(
+                    x=alt.X('HOUR:O', title="Hour", axis=alt.Axis(labelAngle=0))
+                )
+
+                rrp_line = base.mark_line(color='red').encode(
+                    y=alt.Y('RRP:Q', title='Trade Price',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['HOUR', 'STATISTIC', 'RRP']
+                )
+
+                demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
+                    y=alt.Y('TOTALDEMAND:Q', title='Total Demand',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['HOUR', 'STATISTIC', 'TOTALDEMAND']
+                )
+
+                chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                    y='independent'
+                ).interactive()
+                altair_chart(with_statistic(chart, statistic_param()))
             else:
                 st.warning("Please provide a valid file path to load data.")
         else:
@@ -436,56 +402,37 @@ with st.container():
 
     with dispatch:
 
-        file_path = f"data/analysis/PRICE_AND_DEMAND_ALL_YEARS_{selected_region}.csv"
         if selected_region:
-            data = load_data(file_path, date_column='SETTLEMENTDATE')
+            # mean, median, min, max for each dispatch interval of the day over the whole year, computed in SQL
+            data = load_interval_stats(selected_region, "dispatch", years=[year])
             if data is not None:
-                # get year in the selected range
-                data = data[data['YEAR'] == year]
-                # calculate mean, median, min, max for each hour in the day over the whole year
-                data = data.groupby(['HOUR', 'MINUTE']).agg(                
-                    RRP_mean=('RRP', 'mean'),
-                    RRP_median=('RRP', 'median'),
-                    RRP_min=('RRP', 'min'),
-                    RRP_max=('RRP', 'max'),
-                    TOTALDEMAND_mean=('TOTALDEMAND', 'mean'),
-                    TOTALDEMAND_median=('TOTALDEMAND', 'median'),
-                    TOTALDEMAND_min=('TOTALDEMAND', 'min'),
-                    TOTALDEMAND_max=('TOTALDEMAND', 'max')
-                ).round(2).reset_index()
-                
                 data['time'] = data['HOUR'].astype(str).str.zfill(2) + ':' + data['MINUTE'].astype(str).str.zfill(2)
 
-                if selection:
-                    _selection_RRP = f'RRP_{selection}'
-                    _selection_DEMAND = f'TOTALDEMAND_{selection}'
-                    
-                    base = alt.Chart(data).encode(
-                        x=alt.X('time:O', title="Time", axis=alt.Axis(labelAngle=0))
-                    )
-                    
-                    rrp_line = base.mark_line(color='red').encode(
-                        y=alt.Y(f'{_selection_RRP}:Q', title='Trade Price',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['time', f'{_selection_RRP}']
-                    )
-                    
-                    demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
-                        y=alt.Y(f'{_selection_DEMAND}:Q', title='Total Demand',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['time', f'{_selection_DEMAND}']
-                    )
-                    
-                    chart = alt.layer(rrp_line, demand_line).resolve_scale(
-                        y='independent'
-                    ).interactive()
-
-                    st.warning("Since AEMC changed the settlement period from 30 minutes to 5 minutes in 2022, the data before 2022 is not included in the analysis of dispatch level.")
-
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+                data = fold_statistics(data, ['time'])
+
+                base = alt.Chart(data).encode(
+                    x=alt.X('time:O', title="Time", axis=alt.Axis(labelAngle=0))
+                )
+
+                rrp_line = base.mark_line(color='red').encode(
+                    y=alt.Y('RRP:Q', title='Trade Price',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['time', 'STATISTIC', 'RRP']
+                )
+
+                demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
+                    y=alt.Y('TOTALDEMAND:Q', title='Total Demand',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['time', 'STATISTIC', 'TOTALDEMAND']
+                )
+
+                chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                    y='independent'
+                ).interactive()
+
+                st.warning("Since AEMC changed the settlement period from 30 minutes to 5 minutes in 2022, the data before 2022 is not included in the analysis of dispatch level.")
+
+                altair_chart(with_statistic(chart, statistic_param()))
             else:
                 st.warning("Please provide a valid file path to load data.")
         else:
@@ -518,38 +465,58 @@ with st.container():
                                             (start_date, end_date), format="YYYY-MM-DD", key="date-slider")
             start_date, end_date = selected_date_range
         
-        file_path = f"data/analysis/PRICE_AND_DEMAND_ALL_YEARS_{selected_region}.csv"
         if selected_region:
-            data = load_data(file_path, date_column='SETTLEMENTDATE')
-            data["SETTLEMENTDATE"] = pd.to_datetime(data["SETTLEMENTDATE"])
+            # at most MAX_POINTS periods per measure: the finest pyramid level that fits the range,
+            # with the min/max of each period as a band so that spikes stay visible
+            pyramid = load_pyramid(selected_region)
+            if pyramid is not None:
+                last = pd.Timestamp(end_date) + pd.Timedelta(days=1) - pd.Timedelta(minutes=1)
+                frames = []
+                for measure in ['RRP', 'TOTALDEMAND']:
+                    frame, level = pyramid.select(measure, start_date, last, MAX_POINTS)
+                    frames.append(frame.set_index('TIME').add_prefix(f'{measure}_'))
+                data = pd.concat(frames, axis=1).reset_index()
+            else:
+                index = load_time_index(selected_region, columns=['TOTALDEMAND', 'RRP'])
+                level = '5min'
+                data = None
+                if index is not None:
+                    # rows from start_date to the end of end_date, found by binary search on the sorted history
+                    rows = index.slice(start_date, end_date)
+                    data = pd.DataFrame({'TIME': rows['SETTLEMENTDATE']})
+                    for measure in ['RRP', 'TOTALDEMAND']:
+                        for stat in ['MIN', 'MAX', 'MEAN']:
+                            data[f'{measure}_{stat}'] = rows[measure]
             if data is not None:
-                # based on the start_date and end_date to filter the data
-                data = data[(data['SETTLEMENTDATE'].dt.date >= start_date) 
-                            & (data['SETTLEMENTDATE'].dt.date <= end_date)]
-                
                 base = alt.Chart(data).encode(
-                    x=alt.X('SETTLEMENTDATE', title="Date", axis=alt.Axis(labelAngle=0),
+                    x=alt.X('TIME:T', title="Date", axis=alt.Axis(labelAngle=0),
                             scale=alt.Scale(domain=alt.selection_interval(bind='scales')), # Enables scrolling
                             )  
                 )
                 
+                rrp_band = base.mark_area(color='red', opacity=0.2).encode(
+                    y=alt.Y('RRP_MIN:Q', title='Trade Price', scale=alt.Scale(zero=False, nice=True)),
+                    y2='RRP_MAX:Q'
+                )
+
                 rrp_line = base.mark_line(color='red').encode(
-                    y=alt.Y(f'RRP', title='Trade Price',
-                            scale=alt.Scale(zero=False, nice=True)),
-                    tooltip=['SETTLEMENTDATE', f'RRP']
+                    y=alt.Y('RRP_MEAN:Q', title='Trade Price'),
+                    tooltip=['TIME:T', 'RRP_MIN:Q', 'RRP_MEAN:Q', 'RRP_MAX:Q']
                 )
                 
                 demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
-                    y=alt.Y(f'TOTALDEMAND', title='Total Demand',
+                    y=alt.Y('TOTALDEMAND_MEAN:Q', title='Total Demand',
                             scale=alt.Scale(zero=False, nice=True)),
-                    tooltip=['SETTLEMENTDATE', f'TOTALDEMAND']
+                    tooltip=['TIME:T', 'TOTALDEMAND_MIN:Q', 'TOTALDEMAND_MEAN:Q', 'TOTALDEMAND_MAX:Q']
                 )
                 
-                chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                chart = alt.layer(alt.layer(rrp_band, rrp_line), demand_line).resolve_scale(
                     y='independent'
                 ).interactive()
 
-                st.altair_chart(chart, theme="streamlit", use_container_width=True)
+                altair_chart(chart)
+                if level != '5min':
+                    st.caption(f"Aggregated to {level} periods: the line is the mean and the band the min/max of each period.")
             else:
                 st.warning("Please provide a valid file path to load data.")
         else:
@@ -558,64 +525,35 @@ with st.container():
 
     with daily:
 
-        # select statistic
-        option = ['mean', 'median', 'min', 'max']
-        selection = st.pills("Select a statistic to display", 
-                            option, 
-                            selection_mode='single', 
-                            default=['median'],
-                            key="by_day_range")
-        
-        file_path = f"data/analysis/PRICE_AND_DEMAND_ALL_YEARS_{selected_region}.csv"
         if selected_region:
-            data = load_data(file_path, date_column='SETTLEMENTDATE')
-            data["SETTLEMENTDATE"] = pd.to_datetime(data["SETTLEMENTDATE"])
+            # mean, median, min, max for each dispatch interval of the day between start_date and end_date
+            data = load_interval_stats(selected_region, "dispatch", start=start_date, end=end_date)
             if data is not None:
-                # based on the start_date and end_date to filter the data
-                data = data[(data['SETTLEMENTDATE'].dt.date >= start_date) 
-                            & (data['SETTLEMENTDATE'].dt.date <= end_date)]
-                # calculate mean, median, min, max for each hour in the day over the whole year
-                data = data.groupby(['HOUR', 'MINUTE']).agg(                
-                    RRP_mean=('RRP', 'mean'),
-                    RRP_median=('RRP', 'median'),
-                    RRP_min=('RRP', 'min'),
-                    RRP_max=('RRP', 'max'),
-                    TOTALDEMAND_mean=('TOTALDEMAND', 'mean'),
-                    TOTALDEMAND_median=('TOTALDEMAND', 'median'),
-                    TOTALDEMAND_min=('TOTALDEMAND', 'min'),
-                    TOTALDEMAND_max=('TOTALDEMAND', 'max')
-                ).round(2).reset_index()
-                
                 data['time'] = data['HOUR'].astype(str).str.zfill(2) + ':' + data['MINUTE'].astype(str).str.zfill(2)
 
-                if selection:
-                    _selection_RRP = f'RRP_{selection}'
-                    _selection_DEMAND = f'TOTALDEMAND_{selection}'
-                    
-                    base = alt.Chart(data).encode(
-                        x=alt.X('time:O', title="Time", axis=alt.Axis(labelAngle=0))
-                    )
-                    
-                    rrp_line = base.mark_line(color='red').encode(
-                        y=alt.Y(f'{_selection_RRP}:Q', title='Trade Price',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['time', f'{_selection_RRP}']
-                    )
-                    
-                    demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
-                        y=alt.Y(f'{_selection_DEMAND}:Q', title='Total Demand',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['time', f'{_selection_DEMAND}']
-                    )
-                    
-                    chart = alt.layer(rrp_line, demand_line).resolve_scale(
-                        y='independent'
-                    ).interactive()
-
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+                data = fold_statistics(data, ['time'])
+
+                base = alt.Chart(data).encode(
+                    x=alt.X('time:O', title="Time", axis=alt.Axis(labelAngle=0))
+                )
+
+                rrp_line = base.mark_line(color='red').encode(
+                    y=alt.Y('RRP:Q', title='Trade Price',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['time', 'STATISTIC', 'RRP']
+                )
+
+                demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
+                    y=alt.Y('TOTALDEMAND:Q', title='Total Demand',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['time', 'STATISTIC', 'TOTALDEMAND']
+                )
+
+                chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                    y='independent'
+                ).interactive()
+
+                altair_chart(with_statistic(chart, statistic_param()))
             else:
                 st.warning("Please provide a valid file path to load data.")
         else:
@@ -265,6 +265,21 @@ import pandas as pd
 # Example of reading the file correctly
 df = pd.read_csv("data/aemo_data/DISPATCH_UNIT_SCADA_202401.csv", skiprows=1, skipfooter=1, engine='python')
 ```
+
+`skipfooter` forces pandas to use its slow pure-Python parser, and the CSV has to be extracted first, so the data sits on disk twice. \
+The rows of an MMS file also carry a type in their first field: `C` (comment, including the footer), `I` (the header of a table) and \
+`D` (data). Some files contain several tables, each starting with its own `I` row. This repository ships a reader (`nem/mms.py`) that \
+streams the CSV straight out of the zip, handles all three row types and parses the data rows with the fast C parser:
+```python
+from nem.mms import iter_mms_chunks, read_mms_table
+
+# one table as a single DataFrame, with SETTLEMENTDATE and LASTCHANGED parsed as datetimes
+df = read_mms_table("data/aemo_data/DISPATCH_UNIT_SCADA_202401.zip", "DISPATCH_UNIT_SCADA")
+
+# or chunk by chunk, so a whole month never has to be in memory
+for table, chunk in iter_mms_chunks("data/aemo_data/DISPATCH_UNIT_SCADA_202401.zip"):
+    print(table, len(chunk))
+```
 ''')
 
 st.header("4. Creating a Generalized Download Function")
@@ -645,6 +660,24 @@ def download_large_file(url, local_filename, chunk_size=8192):
     return local_filename
 ```
 
+This function cannot resume: an interruption restarts a multi-hundred-MB archive such as DISPATCHLOAD or BIDPEROFFER_D
+from byte zero, and the partial `.zip` it leaves behind looks complete to an `os.path.exists` check. The download engine
+of the dashboard repository (`nem/download.py`, see below) avoids both problems:
+
+- the body is written to `{file}.part`, next to a small `{file}.part.json` with the URL, ETag and Last-Modified
+- after an interruption, the next attempt (or the next run) asks only for the missing bytes with `Range: bytes={size}-`,
+  guarded by `If-Range` so that a republished file is downloaded again in full
+- the complete file is checked against the size reported by the server, and zips against the CRC-32 of every member,
+  before it is atomically renamed to its final name
+- reads start at 64 KB and double while data arrives faster than it is written, up to 4 MB
+
+```python
+from nem.download import download
+
+results = download([(url, "data/aemo_data/DISPATCHLOAD_202401.zip")])
+print(results[0]["bytes"], results[0]["resumed"], results[0]["sha256"])
+```
+
 ### Parallel Downloads for Multiple Files
 
 To dramatically speed up downloading multiple files, you can use parallel processing:
@@ -758,6 +791,58 @@ for month in range(1, 13):
 results = parallel_download(download_list, max_workers=4)
 ```
 
+### Asynchronous Downloads with Connection Pooling
+
+Each `requests.get` above opens a new connection, and every thread sleeps between files. The dashboard repository ships an
+asynchronous engine, `nem/download.py`, that downloads many files over one pooled, keep-alive `aiohttp` session:
+
+- a global limit on files in flight (`concurrency`) and on open connections per host (`per_host`)
+- per-host politeness: request starts to the same host are spaced by at least `delay` seconds
+- retries of connection errors, timeouts, 429 and 5xx responses with jittered exponential backoff, honouring `Retry-After`
+- streaming, resumable writes to a `.part` file that is validated and renamed into place only when complete
+
+```python
+from nem.download import download, mms_items, print_progress, summarise
+
+# DISPATCHPRICE data for all of 2023, at most 4 connections to NEMWEB and one request start every 0.25s
+items = mms_items("DISPATCHPRICE", [f"2023{month:02d}" for month in range(1, 13)], "data/aemo_data")
+results = download(items, concurrency=8, per_host=4, delay=0.25, progress=print_progress)
+print(summarise(results))
+```
+
+The same is available from the command line:
+
+```bash
+python -m nem.download mms DISPATCHPRICE 202301 202312
+python -m nem.download price-and-demand 201901 202412
+```
+
+### Refreshing Downloads with a Catalog
+
+Deciding what to fetch from whether a local file exists misses files that AEMO republishes, and forces manual cleanup.
+`nem/catalog.py` keeps a catalog of the downloads (`data/aemo_data/catalog.jsonl`, one JSON record per line) with the
+URL, local path, ETag, Last-Modified, byte size, SHA-256 and any extracted files. With `refresh=True` the engine sends
+the recorded validators as `If-None-Match` / `If-Modified-Since` headers: unchanged files cost one `304 Not Modified`
+response, and only new or republished files are transferred. Files downloaded before the catalog existed are checked
+against their modification time and then added to the catalog.
+
+```python
+from nem.catalog import Catalog, catalog_path
+
+catalog = Catalog(catalog_path("data/aemo_data"))
+results = download(items, catalog=catalog, refresh=True, progress=print_progress)
+print(summarise(results))   # {'downloaded': 1, 'unchanged': 11, 'skipped': 0, 'failed': 0}
+```
+
+```bash
+python -m nem.download mms DISPATCHPRICE 202301 202312 --refresh
+python -m nem.catalog list
+```
+
+`python -m nem.download selftest` checks the engine offline. It serves fake NEMWEB archives from a local HTTP server
+(`nem/fakeweb.py`) with latency, random 503 responses and connections dropped halfway through a body, downloads them,
+verifies every byte and reports throughput, retries, resumed bytes and how many connections were opened.
+
 ### Organising Downloads by Data Type and Date
 
 For better organisation, especially when downloading many tables, consider structuring your downloads by table type and date range:
@@ -0,0 +1,7 @@
+"""
+Shared data-access helpers for the NEM Dashboard pages.
+
+The modules in this package are imported by the Streamlit pages in `topics/` and
+by the data preparation scripts. They hold no Streamlit state of their own, so
+they can also be used from the notebook or the command line.
+"""
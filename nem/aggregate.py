@@ -0,0 +1,386 @@
+"""
+Single-pass builder for the `PRICE_STATS_BY_*` files.
+
+The notebook builds each granularity with its own function, which re-reads
+`PRICE_AND_DEMAND_ALL_YEARS_{region}.csv`, re-parses SETTLEMENTDATE and groups
+on `dt.strftime` string keys, one region after the other. This module reads
+each region once, derives integer calendar keys arithmetically and emits every
+granularity from that one read:
+
+    PRICE_STATS_BY_HOUR_{region}.csv
+    PRICE_STATS_BY_DAY_{region}.csv
+    PRICE_STATS_BY_WEEK_{region}.csv
+    PRICE_STATS_BY_FORTNIGHT_{region}.csv
+    PRICE_STATS_BY_MONTH_{region}.csv
+    PRICE_STATS_BY_QUARTER_{region}.csv
+
+Regions are processed in parallel worker processes. The HOUR, DAY, WEEK and
+MONTH files have the same layout and values as the notebook output. Each
+bucket from DAY up also gets a mergeable quantile sketch of its RRP and
+TOTALDEMAND intervals (`nem.sketch`), stored per region in
+`data/store/sketches`.
+
+Usage:
+    python -m nem.aggregate build [--src data/analysis] [--dest data/analysis]
+    python -m nem.aggregate check   # compare with the files in --dest
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from nem import sketch, store
+
+
+GRANULARITIES = ["HOUR", "DAY", "WEEK", "FORTNIGHT", "MONTH", "QUARTER"]
+# an hour holds 12 intervals at most, so its sketch would be no smaller than the values
+SKETCH_GRANULARITIES = ["DAY", "WEEK", "FORTNIGHT", "MONTH", "QUARTER"]
+
+# None: the last year of the data (see `last_year`)
+END_YEAR = None
+
+AGGREGATIONS = {
+    f"{measure}_{stat}": (measure, stat)
+    for measure in ["RRP", "TOTALDEMAND"]
+    for stat in ["mean", "median", "min", "max"]
+}
+
+
+def stats_path(granularity, region, dest=store.CSV_DIR):
+    return os.path.join(dest, f"PRICE_STATS_BY_{granularity}_{region}.csv")
+
+
+def read_intervals(region, src=store.CSV_DIR):
+    """
+    Read the 5-minute RRP and TOTALDEMAND history of a region once.
+
+    The Parquet store is used when it has been built.
+    """
+    if store.available_years(region):
+        return store.read_price_and_demand(region, columns=store.MEASURES)
+    return pd.read_csv(store.csv_path(region, src), usecols=["SETTLEMENTDATE"] + store.MEASURES,
+                       parse_dates=["SETTLEMENTDATE"])
+
+
+def last_year(dates):
+    """
+    The last year with intervals of its own in a datetime series.
+
+    The history ends with the interval ending at midnight on 1 January, which
+    closes the previous year. The notebook drops that one-interval year, and
+    so does this; a year with later intervals (e.g. months added by
+    `nem.ingest`) is kept.
+    """
+    last = pd.Timestamp(dates.max())
+    return last.year - 1 if last == pd.Timestamp(last.year, 1, 1) else last.year
+
+
+def calendar_keys(dates):
+    """
+    Integer calendar fields of a datetime series, computed without strftime.
+
+    WEEK follows `%U` (weeks start on Sunday, days before the first Sunday are
+    week 0) and FORTNIGHT pairs weeks as the archived price analysis does
+    (weeks 0-2 are fortnight 1, weeks 3-4 fortnight 2, ...).
+
+    Returns:
+        dict: int64 arrays YEAR, MONTH, DAY, HOUR, WEEKDAY, WEEK, FORTNIGHT, QUARTER.
+    """
+    dt = dates.dt
+    year = dt.year.to_numpy(np.int64)
+    month = dt.month.to_numpy(np.int64)
+    weekday = dt.weekday.to_numpy(np.int64)
+    day_of_year = dt.dayofyear.to_numpy(np.int64) - 1
+    week = (day_of_year + 7 - (weekday + 1) % 7) // 7
+    return {
+        "YEAR": year,
+        "MONTH": month,
+        "DAY": dt.day.to_numpy(np.int64),
+        "HOUR": dt.hour.to_numpy(np.int64),
+        "WEEKDAY": weekday,
+        "WEEK": week,
+        "FORTNIGHT": np.fix((week - 1) / 2).astype(np.int64) + 1,
+        "QUARTER": (month - 1) // 3 + 1,
+    }
+
+
+def _group_key(keys, granularity):
+    year = keys["YEAR"]
+    if granularity == "HOUR":
+        return ((year * 100 + keys["MONTH"]) * 100 + keys["DAY"]) * 100 + keys["HOUR"]
+    if granularity == "DAY":
+        return (year * 100 + keys["MONTH"]) * 100 + keys["DAY"]
+    return year * 100 + keys[granularity]
+
+
+def _key_year(key, granularity):
+    return key // {"HOUR": 1000000, "DAY": 10000}.get(granularity, 100)
+
+
+def _zfill(values, width=2):
+    return pd.Series(values).astype(str).str.zfill(width).to_numpy()
+
+
+def _label(key, granularity):
+    """Index label and split columns of each group, in the notebook's format."""
+    if granularity in ("HOUR", "DAY"):
+        if granularity == "HOUR":
+            key, hour = key // 100, key % 100
+        year, month, day = key // 10000, key // 100 % 100, key % 100
+        label = pd.Series(year).astype(str) + "-" + _zfill(month) + "-" + _zfill(day)
+        columns = {"YEAR": year, "MONTH": _zfill(month), "DAY": _zfill(day)}
+        if granularity == "HOUR":
+            label = label + " " + _zfill(hour) + ":00"
+            # the notebook splits the label on "-", so DAY keeps the time ("01 00:00")
+            columns["DAY"] = columns["DAY"] + " " + _zfill(hour) + ":00"
+            columns["HOUR"] = _zfill(hour)
+        columns["WEEKDAY"] = pd.to_datetime({"year": year, "month": month, "day": day}).dt.dayofweek.to_numpy()
+        return f"YEAR_MONTH_DAY{'_HOUR' if granularity == 'HOUR' else ''}", label.to_numpy(), columns
+
+    year, part = key // 100, key % 100
+    if granularity == "QUARTER":
+        label = pd.Series(year).astype(str) + "-Q" + pd.Series(part).astype(str)
+        return "YEAR_QUARTER", label.to_numpy(), {"YEAR": year, "QUARTER": part}
+    label = pd.Series(year).astype(str) + "-" + _zfill(part)
+    return f"YEAR_{granularity}", label.to_numpy(), {"YEAR": year, granularity: _zfill(part)}
+
+
+def price_stats(data, granularity, keys=None, end_year=END_YEAR):
+    """
+    Mean, median, min and max of RRP and TOTALDEMAND per calendar bucket.
+
+    Args:
+        data (pd.DataFrame): Intervals with SETTLEMENTDATE, RRP and TOTALDEMAND.
+        granularity (str): One of GRANULARITIES.
+        keys (dict, optional): `calendar_keys(data["SETTLEMENTDATE"])`, to share
+            the key derivation between granularities.
+        end_year (int, optional): Last year to keep. Defaults to
+            `last_year` of the intervals.
+
+    Returns:
+        pd.DataFrame: One row per bucket, indexed by its label (e.g.
+        YEAR_MONTH), with the eight statistics and the split calendar columns.
+    """
+    if keys is None:
+        keys = calendar_keys(data["SETTLEMENTDATE"])
+    if end_year is None:
+        end_year = last_year(data["SETTLEMENTDATE"])
+    group = _group_key(keys, granularity)
+    stats = data[store.MEASURES].groupby(group).agg(**AGGREGATIONS).round(2)
+    stats = stats[_key_year(stats.index.to_numpy(), granularity) <= end_year]
+
+    name, label, columns = _label(stats.index.to_numpy(), granularity)
+    stats.index = pd.Index(label, name=name)
+    for column, values in columns.items():
+        stats[column] = values
+    return stats
+
+
+def price_sketches(data, granularity, keys=None, end_year=END_YEAR):
+    """
+    Quantile sketches of RRP and TOTALDEMAND per calendar bucket.
+
+    Returns:
+        pd.DataFrame: `nem.sketch.COLUMNS` rows, with the bucket labels of
+        `price_stats` (e.g. "2023-01" for YEAR_MONTH).
+    """
+    if keys is None:
+        keys = calendar_keys(data["SETTLEMENTDATE"])
+    if end_year is None:
+        end_year = last_year(data["SETTLEMENTDATE"])
+    group = _group_key(keys, granularity)
+    frames = []
+    for measure in store.MEASURES:
+        sketches = sketch.build(group, data[measure].to_numpy())
+        sketches.insert(0, "MEASURE", measure)
+        frames.append(sketches)
+    sketches = pd.concat(frames, ignore_index=True)
+    year = _key_year(sketches["BUCKET"].to_numpy(), granularity)
+    sketches = sketches[year <= end_year]
+
+    buckets, codes = np.unique(sketches["BUCKET"].to_numpy(), return_inverse=True)
+    _, labels, _ = _label(buckets, granularity)
+    sketches["BUCKET"] = labels[codes]
+    sketches.insert(0, "YEAR", year[year <= end_year].astype("int16"))
+    sketches.insert(0, "GRANULARITY", granularity)
+    return sketches[sketch.COLUMNS]
+
+
+def _sketched(granularities):
+    return [g for g in granularities if g in SKETCH_GRANULARITIES]
+
+
+def build_region(region, src=store.CSV_DIR, dest=store.CSV_DIR, granularities=GRANULARITIES,
+                 end_year=END_YEAR, sketch_root=sketch.SKETCH_DIR):
+    """
+    Read one region once and write every granularity, and the sketches of
+    its buckets.
+
+    Returns:
+        dict: Region, rows read and seconds spent reading and aggregating.
+    """
+    start = time.perf_counter()
+    data = read_intervals(region, src)
+    keys = calendar_keys(data["SETTLEMENTDATE"])
+    read_seconds = time.perf_counter() - start
+
+    os.makedirs(dest, exist_ok=True)
+    for granularity in granularities:
+        price_stats(data, granularity, keys, end_year).to_csv(stats_path(granularity, region, dest))
+    sketch.write_sketches(pd.concat([price_sketches(data, g, keys, end_year) for g in _sketched(granularities)],
+                                    ignore_index=True), region, sketch_root)
+    return {
+        "region": region,
+        "rows": len(data),
+        "read_seconds": read_seconds,
+        "total_seconds": time.perf_counter() - start,
+    }
+
+
+def build_price_stats(regions=store.REGIONS, src=store.CSV_DIR, dest=store.CSV_DIR,
+                      granularities=GRANULARITIES, end_year=END_YEAR, workers=None, sketch_root=sketch.SKETCH_DIR):
+    """
+    Build the `PRICE_STATS_BY_*` files of several regions in parallel.
+
+    Args:
+        workers (int, optional): Worker processes. Defaults to one per region,
+            capped at the number of CPUs.
+
+    Returns:
+        list: `build_region` results, in region order.
+    """
+    regions = [r for r in regions if store.available_years(r) or os.path.exists(store.csv_path(r, src))]
+    workers = workers or min(len(regions), os.cpu_count() or 1) or 1
+    if workers == 1:
+        return [build_region(r, src, dest, granularities, end_year, sketch_root) for r in regions]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(build_region, r, src, dest, granularities, end_year, sketch_root)
+                   for r in regions]
+        return [future.result() for future in futures]
+
+
+def refresh_region(region, years, dest=store.CSV_DIR, granularities=GRANULARITIES, end_year=END_YEAR,
+                   root=store.STORE_DIR, sketch_root=sketch.SKETCH_DIR):
+    """
+    Recompute the buckets of some years of a region from the store and splice
+    them into the existing `PRICE_STATS_BY_*` files and sketches.
+
+    Every bucket lies within one calendar year (weeks follow `%U`), so the rows
+    of the other years are kept as they are, byte for byte. A granularity
+    without a file yet is built in full, as are the sketches of a region
+    without a sketch file.
+
+    Args:
+        years (iterable): Years whose intervals changed.
+
+    Returns:
+        dict: Region, years and rows read.
+    """
+    years = sorted(set(years))
+    data = store.read_price_and_demand(region, years, columns=store.MEASURES, root=root)
+    keys = calendar_keys(data["SETTLEMENTDATE"])
+    full = None
+
+    os.makedirs(dest, exist_ok=True)
+    for granularity in granularities:
+        path = stats_path(granularity, region, dest)
+        if not os.path.exists(path):
+            if full is None:
+                full = store.read_price_and_demand(region, columns=store.MEASURES, root=root)
+            price_stats(full, granularity, None, end_year).to_csv(path)
+            continue
+
+        buffer = io.StringIO()
+        price_stats(data, granularity, keys, end_year).to_csv(buffer)
+        buffer.seek(0)
+        fresh = pd.read_csv(buffer, dtype=str, keep_default_na=False)
+        existing = pd.read_csv(path, dtype=str, keep_default_na=False)
+        existing = existing[~existing["YEAR"].astype(int).isin(years)]
+        combined = pd.concat([existing, fresh], ignore_index=True)
+        combined = combined.sort_values(combined.columns[0], kind="stable")
+
+        tmp_path = path + ".tmp"
+        combined.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    if os.path.exists(sketch.sketch_path(region, sketch_root)):
+        existing = sketch.read_sketches(region, root=sketch_root)
+        existing = existing[~(existing["YEAR"].isin(years) & existing["GRANULARITY"].isin(granularities))]
+        fresh = [price_sketches(data, g, keys, end_year) for g in _sketched(granularities)]
+    else:
+        if full is None:
+            full = store.read_price_and_demand(region, columns=store.MEASURES, root=root)
+        existing, fresh = None, [price_sketches(full, g, None, end_year) for g in _sketched(granularities)]
+    sketches = pd.concat([existing, *fresh], ignore_index=True)
+    sketch.write_sketches(sketches.sort_values(["GRANULARITY", "BUCKET", "MEASURE", "KEY"], kind="stable"),
+                          region, sketch_root)
+    return {"region": region, "years": years, "rows": len(data)}
+
+
+def check_price_stats(regions=store.REGIONS, src=store.CSV_DIR, dest=store.CSV_DIR,
+                      granularities=GRANULARITIES, end_year=END_YEAR):
+    """
+    Compare freshly computed statistics with the files in `dest`.
+
+    Returns:
+        list: (granularity, region, reason) for each mismatch or missing file.
+    """
+    mismatches = []
+    for region in regions:
+        if not (store.available_years(region) or os.path.exists(store.csv_path(region, src))):
+            continue
+        data = read_intervals(region, src)
+        keys = calendar_keys(data["SETTLEMENTDATE"])
+        for granularity in granularities:
+            path = stats_path(granularity, region, dest)
+            if not os.path.exists(path):
+                mismatches.append((granularity, region, "file not found"))
+                continue
+            buffer = io.StringIO()
+            price_stats(data, granularity, keys, end_year).to_csv(buffer)
+            buffer.seek(0)
+            try:
+                pd.testing.assert_frame_equal(pd.read_csv(buffer), pd.read_csv(path))
+            except AssertionError as e:
+                mismatches.append((granularity, region, str(e).splitlines()[0]))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.aggregate", description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--src", default=store.CSV_DIR, help="directory of PRICE_AND_DEMAND_ALL_YEARS_{region}.csv")
+    parser.add_argument("--dest", default=store.CSV_DIR, help="directory of the PRICE_STATS_BY_* files")
+    parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    parser.add_argument("--granularities", nargs="+", default=GRANULARITIES, choices=GRANULARITIES)
+    parser.add_argument("--end-year", type=int, default=END_YEAR,
+                        help="last year to keep (default: the last year of the data)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        results = build_price_stats(args.regions, args.src, args.dest, args.granularities, args.end_year, args.workers)
+        for result in results:
+            print(f"{result['region']}: {result['rows']} rows, read {result['read_seconds']:.2f}s, "
+                  f"total {result['total_seconds']:.2f}s")
+        print(f"Built {len(args.granularities)} granularities for {len(results)} regions "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    elif args.command == "check":
+        mismatches = check_price_stats(args.regions, args.src, args.dest, args.granularities, args.end_year)
+        for granularity, region, reason in mismatches:
+            print(f"Mismatch {granularity} {region}: {reason}")
+        if mismatches:
+            sys.exit(1)
+        print("Price statistics match the files on disk")
+
+
+if __name__ == "__main__":
+    main()
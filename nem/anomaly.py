@@ -0,0 +1,359 @@
+"""
+Price-anomaly detection over the 5-minute RRP history of each region.
+
+Four detectors run over a region's RRP series in one vectorised pass each:
+
+- "mad": robust score against the trailing day, (RRP - rolling median) /
+  (1.4826 * rolling MAD), flagged beyond MAD_THRESHOLD;
+- "seasonal": z-score of the residual from the same time of day over the
+  previous SEASON_DAYS days, flagged beyond Z_THRESHOLD;
+- "spike": RRP at or above SPIKE_THRESHOLD $/MWh;
+- "run": spikes in a run of at least RUN_INTERVALS consecutive intervals.
+
+The "mad" and "seasonal" windows count observations and look backwards only,
+so a new interval is scored from the intervals before it. A run's length also
+depends on the intervals after it, so a spike run still open at the last
+interval is scored again when the next intervals arrive. That makes the
+incremental mode exact: `update` keeps the last CONTEXT intervals of each
+region, and at least the open run, as its state, scores the intervals newer
+than the state and replaces the "run" rows of the open run, without reading
+the rest of the history. `python -m nem.anomaly check` compares `update` with
+a full `build`.
+
+Anomalies are stored per region, sorted by SETTLEMENTDATE:
+
+    data/store/anomalies/ANOMALIES_{region}.parquet   SETTLEMENTDATE, DETECTOR, RRP, BASELINE, SCORE
+    data/store/anomalies/STATE_{region}.parquet       the last CONTEXT intervals
+
+and `read_anomalies` answers region and date-range queries by binary search
+on the sorted timestamps.
+
+Usage:
+    python -m nem.anomaly build [--regions QLD1 ...]
+    python -m nem.anomaly update [--regions QLD1 ...]
+    python -m nem.anomaly check [--regions QLD1 ...]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from nem import store
+
+
+ANOMALY_DIR = "data/store/anomalies"
+
+DETECTORS = ["mad", "seasonal", "spike", "run"]
+
+WINDOW = 288            # rolling median/MAD window: one day of 5-minute intervals
+MAD_THRESHOLD = 6.0
+SEASON_DAYS = 28        # previous observations of the same time of day
+Z_THRESHOLD = 4.0
+SPIKE_THRESHOLD = 300.0
+RUN_INTERVALS = 6       # 30 minutes
+MIN_SCALE = 1.0         # $/MWh floor of the MAD and standard deviation
+
+CONTEXT = SEASON_DAYS * 288 + WINDOW
+
+
+def table_path(region, root=ANOMALY_DIR):
+    return os.path.join(root, f"ANOMALIES_{region}.parquet")
+
+
+def state_path(region, root=ANOMALY_DIR):
+    return os.path.join(root, f"STATE_{region}.parquet")
+
+
+def rolling_mad(values, window=WINDOW):
+    """
+    Trailing rolling median and MAD (median absolute deviation from it).
+
+    Returns:
+        tuple: (median, mad) arrays; NaN until half a window has been seen.
+    """
+    series = pd.Series(values)
+    median = series.rolling(window, min_periods=window // 2).median()
+    mad = (series - median).abs().rolling(window, min_periods=window // 2).median()
+    return median.to_numpy(), mad.to_numpy()
+
+
+def seasonal_baseline(times, values, days=SEASON_DAYS):
+    """
+    Mean and standard deviation of the previous `days` observations in the
+    same 5-minute slot of the day, excluding the current one.
+
+    The intervals are ordered by slot and the trailing sums are taken from
+    cumulative sums within each slot, so the cost is one sort plus O(n).
+
+    Returns:
+        tuple: (mean, std) arrays; NaN with fewer than `days // 2` observations.
+    """
+    times = pd.DatetimeIndex(times)
+    slots = (times.hour * 12 + times.minute // 5).to_numpy()
+    n = len(values)
+    if not n:
+        return np.empty(0), np.empty(0)
+    order = np.lexsort((np.arange(n), slots))
+    ordered, grouped = np.asarray(values, dtype="float64")[order], slots[order]
+
+    position = np.arange(n)
+    first = np.r_[True, grouped[1:] != grouped[:-1]]
+    group_start = np.maximum.accumulate(np.where(first, position, 0))
+    low = np.maximum(group_start, position - days)
+    count = position - low
+    sums = np.r_[0.0, np.cumsum(ordered)]
+    squares = np.r_[0.0, np.cumsum(ordered * ordered)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[position] - sums[low]) / count
+        std = np.sqrt(np.maximum((squares[position] - squares[low]) / count - mean * mean, 0))
+    enough = count >= days // 2
+    mean, std = np.where(enough, mean, np.nan), np.where(enough, std, np.nan)
+
+    result_mean, result_std = np.empty(n), np.empty(n)
+    result_mean[order], result_std[order] = mean, std
+    return result_mean, result_std
+
+
+def run_lengths(flags):
+    """Length of the run of consecutive True values each True value belongs to (0 elsewhere)."""
+    flags = np.asarray(flags, dtype=bool)
+    if not len(flags):
+        return np.zeros(0, dtype="int64")
+    edges = np.flatnonzero(np.diff(np.r_[False, flags, False].astype("int8")))
+    starts, ends = edges[::2], edges[1::2]
+    lengths = np.zeros(len(flags), dtype="int64")
+    run = np.repeat(ends - starts, ends - starts)
+    lengths[flags] = run
+    return lengths
+
+
+def detect(data):
+    """
+    Run every detector over a region's intervals.
+
+    Args:
+        data (pd.DataFrame): SETTLEMENTDATE and RRP, sorted by SETTLEMENTDATE.
+
+    Returns:
+        pd.DataFrame: One row per flagged (interval, detector): SETTLEMENTDATE,
+        DETECTOR, RRP, BASELINE (the value the interval was compared with)
+        and SCORE, sorted by SETTLEMENTDATE.
+    """
+    times = data["SETTLEMENTDATE"].to_numpy()
+    rrp = data["RRP"].to_numpy("float64")
+
+    median, mad = rolling_mad(rrp)
+    mad_score = (rrp - median) / (1.4826 * np.maximum(mad, MIN_SCALE))
+    mean, std = seasonal_baseline(times, rrp)
+    z_score = (rrp - mean) / np.maximum(std, MIN_SCALE)
+    spikes = rrp >= SPIKE_THRESHOLD
+    runs = run_lengths(spikes)
+
+    with np.errstate(invalid="ignore"):
+        found = {
+            "mad": (np.abs(mad_score) > MAD_THRESHOLD, median, mad_score),
+            "seasonal": (np.abs(z_score) > Z_THRESHOLD, mean, z_score),
+            "spike": (spikes, np.full(len(rrp), SPIKE_THRESHOLD), rrp / SPIKE_THRESHOLD),
+            "run": (runs >= RUN_INTERVALS, np.full(len(rrp), SPIKE_THRESHOLD), runs.astype("float64")),
+        }
+    frames = []
+    for detector, (flags, baseline, score) in found.items():
+        frames.append(pd.DataFrame({
+            "SETTLEMENTDATE": times[flags],
+            "DETECTOR": detector,
+            "RRP": rrp[flags],
+            "BASELINE": baseline[flags],
+            "SCORE": score[flags],
+        }))
+    anomalies = pd.concat(frames, ignore_index=True).sort_values(["SETTLEMENTDATE"], kind="stable")
+    anomalies["DETECTOR"] = pd.Categorical(anomalies["DETECTOR"], categories=DETECTORS)
+    return anomalies.reset_index(drop=True)
+
+
+def open_run_start(rrp):
+    """Position of the first interval of the spike run open at the end of `rrp` (its length if none)."""
+    below = np.flatnonzero(np.asarray(rrp, dtype="float64") < SPIKE_THRESHOLD)
+    return below[-1] + 1 if len(below) else 0
+
+
+def _state(history):
+    """The last CONTEXT intervals of `history`, extended back to the start of an open spike run."""
+    first = min(max(len(history) - CONTEXT, 0), open_run_start(history["RRP"]))
+    return history.iloc[first:]
+
+
+def _write(frame, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frame.to_parquet(path + ".tmp", index=False, compression="zstd")
+    os.replace(path + ".tmp", path)
+
+
+def build(region, root=ANOMALY_DIR, store_root=store.STORE_DIR, data=None):
+    """
+    Detect the anomalies of a region's whole history (or of `data`) and write
+    its table and state.
+
+    Returns:
+        dict: Region, intervals scanned and anomalies found.
+    """
+    if data is None:
+        data = store.read_price_and_demand(region, columns=["RRP"], root=store_root)
+    data = data[["SETTLEMENTDATE", "RRP"]]
+    anomalies = detect(data)
+    _write(anomalies, table_path(region, root))
+    _write(_state(data), state_path(region, root))
+    return {"region": region, "intervals": len(data), "anomalies": len(anomalies)}
+
+
+def update(region, data=None, root=ANOMALY_DIR, store_root=store.STORE_DIR):
+    """
+    Score the intervals that arrived since the last `build` or `update`.
+
+    Only the partitions of the years after the state's last interval are
+    read (or `data`, when the new intervals are given). The new intervals are
+    scored with the state as their history, and the "run" rows from the start
+    of the spike run open at the state's last interval are replaced, which
+    gives the same anomalies as a full `build`. Intervals revised at or before
+    the state's last interval need a `build`.
+
+    Returns:
+        dict: Region, new intervals and anomalies found among them.
+    """
+    if not os.path.exists(state_path(region, root)):
+        return build(region, root, store_root)
+    state = pd.read_parquet(state_path(region, root))
+    last = state["SETTLEMENTDATE"].iloc[-1]
+    if data is None:
+        years = [y for y in store.available_years(region, store_root) if y >= last.year]
+        data = store.read_price_and_demand(region, years, columns=["RRP"], root=store_root)
+    data = data.loc[data["SETTLEMENTDATE"] > last, ["SETTLEMENTDATE", "RRP"]]
+    if data.empty:
+        return {"region": region, "intervals": 0, "anomalies": 0}
+
+    # the run open at `last` continues into the new intervals and is scored again
+    run_start = open_run_start(state["RRP"])
+    first = state["SETTLEMENTDATE"].iloc[run_start] if run_start < len(state) else data["SETTLEMENTDATE"].iloc[0]
+
+    history = pd.concat([state, data], ignore_index=True)
+    anomalies = detect(history)
+    anomalies = anomalies[(anomalies["SETTLEMENTDATE"] > last)
+                          | ((anomalies["SETTLEMENTDATE"] >= first) & (anomalies["DETECTOR"] == "run"))]
+    table = pd.read_parquet(table_path(region, root))
+    times = table["SETTLEMENTDATE"]
+    kept, rescored = table[times < first], table[(times >= first) & (table["DETECTOR"] != "run")]
+    tail = pd.concat([rescored, anomalies], ignore_index=True).sort_values(["SETTLEMENTDATE", "DETECTOR"],
+                                                                            kind="stable")
+    _write(pd.concat([kept, tail], ignore_index=True), table_path(region, root))
+    _write(_state(history), state_path(region, root))
+    return {"region": region, "intervals": len(data), "anomalies": len(anomalies)}
+
+
+def read_table(region, root=ANOMALY_DIR):
+    """A region's anomaly table, or None if it has not been built."""
+    path = table_path(region, root)
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+
+def select(table, start=None, end=None, detectors=None):
+    """
+    Anomalies of a table within [start, end], by binary search on the sorted
+    SETTLEMENTDATE column.
+
+    Args:
+        start (datetime-like, optional): First interval to include.
+        end (datetime-like, optional): Last interval to include.
+        detectors (list, optional): Subset of DETECTORS.
+    """
+    times = table["SETTLEMENTDATE"].to_numpy()
+    low = 0 if start is None else np.searchsorted(times, np.datetime64(pd.Timestamp(start)), side="left")
+    high = len(times) if end is None else np.searchsorted(times, np.datetime64(pd.Timestamp(end)), side="right")
+    selected = table.iloc[low:high]
+    if detectors is not None:
+        selected = selected[selected["DETECTOR"].isin(detectors)]
+    return selected
+
+
+def read_anomalies(region, start=None, end=None, detectors=None, root=ANOMALY_DIR):
+    """
+    Anomalies of a region within a date range.
+
+    Returns:
+        pd.DataFrame or None: The anomalies, or None if the table has not been built.
+    """
+    table = read_table(region, root)
+    return None if table is None else select(table, start, end, detectors)
+
+
+def check_update(region, data, splits):
+    """
+    Compare `update` with a full `build` of `data`, a region's intervals.
+
+    For each split, the intervals before it are built into a scratch
+    directory and the rest are added with `update`.
+
+    Args:
+        data (pd.DataFrame): SETTLEMENTDATE and RRP, sorted by SETTLEMENTDATE.
+        splits (list): Positions to split at.
+
+    Returns:
+        list: (split time, reason) for each mismatch.
+    """
+    expected = detect(data)
+    mismatches = []
+    for split in splits:
+        with tempfile.TemporaryDirectory() as root:
+            build(region, root, data=data.iloc[:split])
+            update(region, data.iloc[split:], root)
+            actual = read_table(region, root)
+        try:
+            pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected)
+        except AssertionError as e:
+            mismatches.append((data["SETTLEMENTDATE"].iloc[split], str(e).splitlines()[0]))
+    return mismatches
+
+
+def with_spike_run(data, length=10):
+    """A copy of `data` with a run of `length` spikes centred on its middle interval."""
+    middle = len(data) // 2
+    data = data.copy()
+    data.iloc[middle - length // 2:middle + length - length // 2, data.columns.get_loc("RRP")] = 2 * SPIKE_THRESHOLD
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.anomaly", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help in (("build", "detect over the whole history"),
+                       ("update", "score only the intervals newer than the saved state"),
+                       ("check", "compare update with a full build")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("--regions", nargs="+", default=store.REGIONS)
+        command.add_argument("--root", default=ANOMALY_DIR)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    run = build if args.command == "build" else update
+    for region in args.regions:
+        if not store.available_years(region):
+            print(f"{region}: not in the store, run `python -m nem.store convert` first")
+            continue
+        if args.command == "check":
+            # split the history in the middle, and in the middle of a spike run crossing it
+            data = store.read_price_and_demand(region, columns=["RRP"])
+            mismatches = (check_update(region, data, [len(data) // 2])
+                          + check_update(region, with_spike_run(data), [len(data) // 2]))
+            for when, reason in mismatches:
+                print(f"{region}: update split at {when} differs from build: {reason}")
+            print(f"{region}: " + ("update matches build" if not mismatches else f"{len(mismatches)} mismatches"))
+            continue
+        result = run(region, root=args.root)
+        print(f"{region}: {result['intervals']} intervals, {result['anomalies']} anomalies")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
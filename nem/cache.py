@@ -0,0 +1,160 @@
+"""
+Process-wide, read-only cache for the datasets used by the dashboard pages.
+
+Streamlit re-executes a page script on every widget interaction and for every
+session. Without a cache each rerun re-parses the same CSV files. The
+`DatasetCache` keeps one parsed copy of each dataset per server process and
+hands out shallow copies, so adding or replacing columns on the returned
+DataFrame does not affect the cached copy.
+
+Entries are invalidated when the file's modification time or size changes, and
+the least recently used entries are evicted once the total in-memory size
+exceeds the configured budget (`NEM_CACHE_MAX_BYTES`, default 512 MB).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+DEFAULT_MAX_BYTES = int(os.environ.get("NEM_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+
+class _Entry:
+    __slots__ = ("value", "mtime", "size", "nbytes")
+
+    def __init__(self, value, mtime, size, nbytes):
+        self.value = value
+        self.mtime = mtime
+        self.size = size
+        self.nbytes = nbytes
+
+
+def _frame_nbytes(value):
+    if isinstance(value, tuple):
+        return sum(_frame_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_frame_nbytes(item) for item in value.values())
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return int(getattr(value, "nbytes", 0))
+
+
+class DatasetCache:
+    """
+    LRU cache of parsed datasets keyed by file path and load options.
+
+    Args:
+        max_bytes (int): Memory budget for all cached entries. The least recently
+            used entries are evicted when the budget is exceeded. A single entry
+            larger than the budget is returned but not kept.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, path, loader, key=None):
+        """
+        Return the cached value for `path`, calling `loader(path)` on a miss.
+
+        Args:
+            path (str): File the value is derived from. Its mtime and size are
+                checked on every call.
+            loader (callable): Function that parses `path` into a value.
+            key (hashable, optional): Extra key component for different load
+                options of the same file (e.g. the parsed date columns).
+
+        Returns:
+            The cached value. DataFrames (also inside a tuple or dict) are
+            returned as shallow copies.
+        """
+        stat = os.stat(path)
+        cache_key = (os.path.realpath(path), key)
+
+        with self._lock:
+            entry = self._lookup(cache_key, stat)
+            if entry is not None:
+                return _shallow(entry.value)
+            key_lock = self._key_locks.setdefault(cache_key, threading.Lock())
+
+        # Only one thread parses a given file; the others wait and then hit.
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(cache_key, stat, count=False)
+                if entry is not None:
+                    self._stats["hits"] += 1
+                    return _shallow(entry.value)
+                self._stats["misses"] += 1
+
+            value = loader(path)
+            nbytes = _frame_nbytes(value)
+
+            with self._lock:
+                self._key_locks.pop(cache_key, None)
+                if nbytes <= self.max_bytes:
+                    self._entries[cache_key] = _Entry(value, stat.st_mtime_ns, stat.st_size, nbytes)
+                    self._evict()
+        return _shallow(value)
+
+    def _lookup(self, cache_key, stat, count=True):
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        if entry.mtime != stat.st_mtime_ns or entry.size != stat.st_size:
+            del self._entries[cache_key]
+            self._stats["invalidations"] += 1
+            return None
+        self._entries.move_to_end(cache_key)
+        if count:
+            self._stats["hits"] += 1
+        return entry
+
+    def _evict(self):
+        total = sum(e.nbytes for e in self._entries.values())
+        while total > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            total -= entry.nbytes
+            self._stats["evictions"] += 1
+
+    def clear(self):
+        """Drop every cached entry. Counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: hits, misses, invalidations, evictions, number of entries and
+            the bytes currently held.
+        """
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _shallow(value):
+    if isinstance(value, tuple):
+        return tuple(_shallow(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _shallow(item) for key, item in value.items()}
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+
+# One cache per server process, shared by every session and page.
+dataset_cache = DatasetCache()
@@ -0,0 +1,143 @@
+"""
+Persistent catalog of downloaded files.
+
+The catalog is a JSON-lines file next to the downloads:
+
+    data/aemo_data/catalog.jsonl
+
+with one record per download or check. A record holds the URL, local path,
+ETag and Last-Modified the server sent, byte size, SHA-256, the files
+extracted from it, and when it was downloaded and last checked. Later records
+of a URL replace earlier ones, so the file is appended to and never
+rewritten while downloading; `compact` rewrites it with one line per URL.
+
+With the validators on record, `nem.download` refreshes files with conditional
+requests (If-None-Match / If-Modified-Since): an unchanged file costs one 304
+response instead of a full transfer.
+
+Usage:
+    python -m nem.catalog list [--dest data/aemo_data]
+    python -m nem.catalog compact [--dest data/aemo_data]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+
+CATALOG_NAME = "catalog.jsonl"
+
+FIELDS = ["url", "path", "etag", "last_modified", "bytes", "sha256", "extracted", "downloaded", "checked"]
+
+
+def catalog_path(dest):
+    return os.path.join(dest, CATALOG_NAME)
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class Catalog:
+    """
+    Download records keyed by URL, backed by an append-only JSON-lines file.
+
+    Args:
+        path (str): Catalog file. Created on the first record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line cut short by an interrupted run
+                        continue
+                    self._entries[entry["url"]] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def get(self, url):
+        """The latest record of a URL, or None."""
+        entry = self._entries.get(url)
+        return dict(entry) if entry is not None else None
+
+    def entries(self):
+        return [dict(entry) for entry in self._entries.values()]
+
+    def _append(self, entry):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            self._entries[entry["url"]] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def record_download(self, result):
+        """
+        Record a completed `nem.download.fetch` result.
+
+        Files extracted from an earlier version of the URL are kept on record
+        until `record_extracted` replaces them.
+        """
+        previous = self._entries.get(result["url"], {})
+        now = _now()
+        entry = {field: result.get(field) for field in FIELDS}
+        entry.update(extracted=previous.get("extracted", []), downloaded=now, checked=now)
+        self._append(entry)
+        return entry
+
+    def record_check(self, url):
+        """Record that the server reported a URL unchanged."""
+        entry = dict(self._entries[url], checked=_now())
+        self._append(entry)
+        return entry
+
+    def record_extracted(self, url, paths):
+        """Record the files extracted from the download of a URL."""
+        entry = dict(self._entries[url], extracted=list(paths))
+        self._append(entry)
+        return entry
+
+    def compact(self):
+        """Rewrite the file with only the latest record of each URL."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.catalog", description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["list", "compact"])
+    parser.add_argument("--dest", default="data/aemo_data", help="download directory holding the catalog")
+    args = parser.parse_args(argv)
+
+    catalog = Catalog(catalog_path(args.dest))
+    if args.command == "list":
+        for entry in catalog.entries():
+            print(f"{entry['path']}  {entry['bytes'] or 0:>12,d} B  {entry['etag'] or '-'}  "
+                  f"{entry['last_modified'] or '-'}  checked {entry['checked']}")
+        print(f"{len(catalog)} files in {catalog.path}")
+    elif args.command == "compact":
+        catalog.compact()
+        print(f"Compacted {catalog.path} to {len(catalog)} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Compact rendering of Altair charts for the dashboard pages.
+
+`st.altair_chart` ships every DataFrame a chart references in full, as an
+Arrow dataset next to the Vega-Lite spec, although a chart usually encodes
+only a few of its columns: a profile chart plots two of the twelve
+`{measure}_{statistic}` columns. `altair_chart` renders the same chart with a
+smaller payload:
+
+- every dataset is projected to the columns the spec refers to (encodings,
+  tooltips, transforms and expressions);
+- datasets that are identical after projection are sent once;
+- a view that is the only user of its dataset and whose transforms are simple
+  filters, constant calculations or a whole-data aggregate gets them applied
+  in pandas, VegaFusion-style, when that makes the payload smaller. Results
+  of at most INLINE_ROWS rows are inlined into the spec as JSON values.
+
+Charts of the `{measure}_{statistic}` columns carry all STATISTICS at once:
+`fold_statistics` puts them in long form, one row per key and STATISTIC, and
+`with_statistic` filters the rows with a Vega-Lite parameter bound to radio
+buttons under the chart, so switching statistic, like toggling series with a
+`legend_toggle`, happens in the browser without a rerun of the page.
+
+`NEM_COMPACT_CHARTS=0` renders with `st.altair_chart` instead, which is how
+`python -m nem.charts benchmark` measures the bytes of each chart's message
+before and after.
+
+Usage:
+    python -m nem.charts benchmark [pages ...]
+"""
+
+import argparse
+import io
+import json
+import operator
+import os
+import re
+import threading
+
+import altair as alt
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from altair.vegalite.data import default_data_transformer
+
+
+INLINE_ROWS = 50
+
+STATISTICS = ["mean", "median", "min", "max"]
+
+PAGES = [
+    "topics/Topic-1-Price-Anomaly-Detection.py",
+    "topics/Topic-2-Outage-Analysis.py",
+    "topics/Topic-3-Renewable-Integration.py",
+    "archive/price_analysis.py",
+]
+
+AGGREGATES = {"mean": "mean", "average": "mean", "sum": "sum", "min": "min", "max": "max",
+              "median": "median", "count": "count", "distinct": "nunique"}
+
+COMPARISONS = {"==": operator.eq, "===": operator.eq, "!=": operator.ne, "!==": operator.ne,
+               ">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+
+_COMPARISON = re.compile(r"^\(?\s*datum\.(\w+)\s*(===?|!==?|>=|<=|>|<)\s*(-?\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\")\s*\)?$")
+_LITERAL = re.compile(r"^\s*(-?\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\")\s*$")
+_DATUM = re.compile(r"datum\s*(?:\.\s*(\w+)|\[\s*['\"]([^'\"]+)['\"]\s*\])")
+
+
+def compact_enabled():
+    return os.environ.get("NEM_COMPACT_CHARTS", "1") != "0"
+
+
+def fold_statistics(data, keys, measures=("RRP", "TOTALDEMAND"), statistics=STATISTICS):
+    """
+    Long form of the `{measure}_{statistic}` columns of a frame.
+
+    Args:
+        data (pd.DataFrame): Frame with the key columns and a column per
+            measure and statistic, e.g. RRP_mean.
+        keys (list): Columns identifying a row, e.g. ["HOUR"].
+        measures (tuple, optional): Measures to fold.
+        statistics (list, optional): Statistics to fold.
+
+    Returns:
+        pd.DataFrame: The key columns, STATISTIC (categorical) and one column
+        per measure.
+    """
+    parts = []
+    for statistic in statistics:
+        part = data[list(keys) + [f"{measure}_{statistic}" for measure in measures]]
+        part = part.set_axis(list(keys) + list(measures), axis=1)
+        parts.append(part.assign(STATISTIC=statistic))
+    data = pd.concat(parts, ignore_index=True)
+    # sent as an Arrow dictionary rather than a string per row
+    data["STATISTIC"] = pd.Categorical(data["STATISTIC"], categories=statistics)
+    return data
+
+
+def statistic_param(default="median", statistics=STATISTICS, name="statistic"):
+    """
+    A Vega-Lite parameter choosing a statistic with radio buttons under the chart.
+
+    It is named: Streamlit renumbers Altair's `param_N` names per chart, but
+    not inside filter expressions.
+    """
+    return alt.param(name=name, value=default, bind=alt.binding_radio(options=statistics, name="Statistic "))
+
+
+def with_statistic(chart, param):
+    """Add `param` to a chart of folded statistics and keep the rows of the chosen one."""
+    return chart.add_params(param).transform_filter(alt.datum.STATISTIC == param)
+
+
+def legend_toggle(field, value=None):
+    """
+    A selection of `field` values toggled by clicking the legend (shift-click
+    for several), with all of them, or `value`, selected at first.
+    """
+    value = alt.Undefined if value is None else [{field: item} for item in value]
+    return alt.selection_point(name=f"toggle_{field}", fields=[field], bind="legend", value=value)
+
+
+_collected = threading.local()
+_render_lock = threading.Lock()
+
+
+def _collect(data):
+    """
+    Data transformer of `to_spec`: keeps each DataFrame in the calling
+    thread's collection and names it in the spec.
+    """
+    datasets = getattr(_collected, "datasets", None)
+    if datasets is None:
+        # a chart converted outside `to_spec` by another thread while enabled
+        return default_data_transformer(data)
+    name = f"data_{id(data)}"
+    datasets[name] = data
+    return {"name": name}
+
+
+alt.data_transformers.register("nem_collect", _collect)
+
+
+def _drop_theme(config, theme, own):
+    """Remove from `config` the entries of `theme` that the chart does not set itself."""
+    for key, value in theme.items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            _drop_theme(config[key], value, own.get(key, {}))
+            if not config[key]:
+                del config[key]
+        elif key not in own:
+            config.pop(key, None)
+
+
+def to_spec(chart):
+    """
+    Vega-Lite spec of a chart, with its DataFrames collected by dataset name.
+
+    Charts are converted by concurrent sessions and prefetch threads, so the
+    collecting transformer is only enabled under a lock, and the default
+    theme is not switched: its entries are removed from the spec instead.
+
+    Returns:
+        tuple: (spec dict, {name: DataFrame}).
+    """
+    with _render_lock:
+        _collected.datasets = datasets = {}
+        try:
+            with alt.data_transformers.enable("nem_collect"):
+                spec = chart.to_dict()
+        finally:
+            del _collected.datasets
+    # like st.altair_chart, without the default theme's width/height
+    if alt.theme.active == "default" and "config" in spec:
+        own = chart.config.to_dict() if chart.config is not alt.Undefined else {}
+        _drop_theme(spec["config"], alt.theme.get()().get("config", {}), own)
+        if not spec["config"]:
+            del spec["config"]
+    return spec, datasets
+
+
+def referenced_names(spec):
+    """
+    Every string in a spec, plus the fields expressions read as `datum.X` or
+    `datum['X']`: the columns a dataset must keep are among them.
+    """
+    names = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+        elif isinstance(node, str):
+            names.add(node)
+            for dotted, quoted in _DATUM.findall(node):
+                names.add(dotted or quoted)
+
+    walk({key: value for key, value in spec.items() if key != "datasets"})
+    return names
+
+
+def project(frame, names):
+    """The columns of a frame that the spec refers to (all of them if none match)."""
+    columns = [column for column in frame.columns if str(column) in names]
+    return frame[columns] if columns else frame
+
+
+def _views(node, inherited=None):
+    """Yield (view, name of the dataset it reads) for every unit view of a spec."""
+    data = node.get("data", {})
+    name = data.get("name", inherited) if isinstance(data, dict) else inherited
+    children = [child for key in ("layer", "hconcat", "vconcat", "concat") for child in node.get(key, [])]
+    if "spec" in node:
+        children.append(node["spec"])
+    if "mark" in node:
+        yield node, name
+    for child in children:
+        yield from _views(child, name)
+
+
+def _literal(text):
+    value = text.strip()
+    return value[1:-1] if value[:1] in "'\"" else float(value)
+
+
+def apply_transforms(view, frame):
+    """
+    Evaluate a view's transforms and whole-data aggregates in pandas.
+
+    Returns:
+        tuple or None: (rewritten view without transforms, resulting frame),
+        or None if a transform or encoding is not supported.
+    """
+    frame = frame.copy()
+    for transform in view.get("transform", []):
+        if set(transform) == {"filter"} and isinstance(transform["filter"], str):
+            match = _COMPARISON.match(transform["filter"])
+            if match is None or match.group(1) not in frame.columns:
+                return None
+            column, compare, value = match.groups()
+            frame = frame[COMPARISONS[compare](frame[column], _literal(value))]
+        elif set(transform) == {"calculate", "as"} and _LITERAL.match(transform["calculate"]):
+            frame[transform["as"]] = _literal(transform["calculate"])
+        else:
+            return None
+
+    view = {key: value for key, value in view.items() if key != "transform"}
+    encoding = view.get("encoding", {})
+    channels = {channel: definition for channel, definition in encoding.items()
+                if isinstance(definition, dict) and ("field" in definition or "aggregate" in definition)}
+    aggregated = [channel for channel, definition in channels.items() if "aggregate" in definition]
+    if aggregated:
+        if len(aggregated) != len(channels):
+            return None
+        row = {}
+        encoding = dict(encoding)
+        for channel in aggregated:
+            definition = dict(encoding[channel])
+            operation = AGGREGATES.get(definition.pop("aggregate"))
+            field = definition.get("field")
+            if operation is None or (field is not None and field not in frame.columns):
+                return None
+            name = f"{operation}_{field or 'rows'}"
+            row[name] = len(frame) if field is None else getattr(frame[field], operation)()
+            definition["field"] = name
+            encoding[channel] = definition
+        view["encoding"] = encoding
+        frame = pd.DataFrame([row])
+    return view, frame
+
+
+def arrow_bytes(frame):
+    """Size of a frame as an Arrow IPC stream, as Streamlit sends datasets."""
+    table = pa.Table.from_pandas(frame)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return len(sink.getvalue())
+
+
+def _values(frame):
+    return json.loads(frame.to_json(orient="records", date_format="iso"))
+
+
+def compact_spec(chart):
+    """
+    A chart's spec and the datasets it needs, projected, deduplicated and with
+    simple transforms applied where that shrinks the payload.
+
+    Returns:
+        dict: Vega-Lite spec with a "datasets" mapping of names to DataFrames.
+    """
+    spec, datasets = to_spec(chart)
+    names = referenced_names(spec)
+    views = list(_views(spec))
+    users = {}
+    for view, name in views:
+        users.setdefault(name, []).append(view)
+
+    for number, (view, name) in enumerate(views):
+        if name not in datasets or len(users[name]) > 1 or not ("transform" in view or any(
+                isinstance(d, dict) and "aggregate" in d for d in view.get("encoding", {}).values())):
+            continue
+        applied = apply_transforms(view, datasets[name])
+        if applied is None:
+            continue
+        rewritten, result = applied
+        before = arrow_bytes(project(datasets[name], names))
+        inline = len(result) <= INLINE_ROWS
+        after = len(json.dumps(_values(result))) if inline else arrow_bytes(result)
+        if after < before:
+            view.clear()
+            view.update(rewritten)
+            if inline:
+                view["data"] = {"values": _values(result)}
+            else:
+                view["data"] = {"name": f"{name}_view{number}"}
+                datasets[view["data"]["name"]] = result
+            users[name] = []
+
+    # project, then send identical datasets once; the hash sum ignores row order,
+    # so a candidate is only reused once its rows compare equal
+    referenced = referenced_names(spec)
+    compact, renames, seen = {}, {}, {}
+    for name, frame in datasets.items():
+        if name not in referenced:
+            continue
+        frame = project(frame, referenced).reset_index(drop=True)
+        key = pd.util.hash_pandas_object(frame, index=False).sum(), tuple(frame.columns), len(frame)
+        same = next((other for other in seen.get(key, []) if compact[other].equals(frame)), None)
+        if same is not None:
+            renames[name] = same
+        else:
+            seen.setdefault(key, []).append(name)
+            compact[name] = frame
+
+    def rename(node):
+        if isinstance(node, dict):
+            if set(node) == {"name"} and node["name"] in renames:
+                node["name"] = renames[node["name"]]
+            for value in node.values():
+                rename(value)
+        elif isinstance(node, list):
+            for value in node:
+                rename(value)
+
+    rename(spec)
+    spec["datasets"] = compact
+    return spec
+
+
+def altair_chart(chart, theme="streamlit", use_container_width=True, **kwargs):
+    """
+    Render an Altair chart like `st.altair_chart`, with the compact payload of
+    `compact_spec` (unless `NEM_COMPACT_CHARTS=0`).
+    """
+    if not compact_enabled():
+        return st.altair_chart(chart, theme=theme, use_container_width=use_container_width, **kwargs)
+    return st.vega_lite_chart(compact_spec(chart), theme=theme, use_container_width=use_container_width, **kwargs)
+
+
+def benchmark(pages=PAGES, timeout=120):
+    """
+    Run each page with `st.altair_chart` and with `altair_chart`, and compare
+    the serialised size of every chart message.
+
+    Returns:
+        dict: {page: list of (bytes before, bytes after) per chart}.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    def chart_bytes(page, compact):
+        os.environ["NEM_COMPACT_CHARTS"] = "1" if compact else "0"
+        app = AppTest.from_file(page, default_timeout=timeout).run()
+        return [len(element.proto.SerializeToString()) for element in app.get("arrow_vega_lite_chart")]
+
+    previous = os.environ.get("NEM_COMPACT_CHARTS")
+    try:
+        return {page: list(zip(chart_bytes(page, False), chart_bytes(page, True))) for page in pages}
+    finally:
+        if previous is None:
+            os.environ.pop("NEM_COMPACT_CHARTS", None)
+        else:
+            os.environ["NEM_COMPACT_CHARTS"] = previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.charts", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="bytes per chart with st.altair_chart and with altair_chart")
+    bench.add_argument("pages", nargs="*", default=PAGES)
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        for page, charts in benchmark(args.pages).items():
+            before, after = sum(b for b, _ in charts), sum(a for _, a in charts)
+            print(f"{page}: {len(charts)} charts, {before / 1e3:.1f} KB -> {after / 1e3:.1f} KB")
+            for i, (b, a) in enumerate(charts, 1):
+                print(f"  chart {i}: {b / 1e3:.1f} KB -> {a / 1e3:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+"""
+Data-access functions used by the dashboard pages.
+
+Every page loads its datasets through `load_data`, which parses each file once
+per server process and serves later reruns and sessions from `dataset_cache`;
+a table with a current Parquet copy (`nem.tables`) is read from the copy.
+The price-and-demand history is read from the Parquet store (`nem.store`) when
+it has been built, and from `PRICE_AND_DEMAND_ALL_YEARS_{region}.csv` otherwise;
+the memory-mapped grids of `nem.grid` serve fixed-grid reads of it, and the
+pyramids of `nem.pyramid` long-range charts within a point budget.
+Unit generation is held as a star schema (`nem.scada.to_star`): a narrow fact
+table and a unit dimension, instead of the registration columns on every row,
+and for roll-ups as a sparse unit-by-time matrix (`nem.matrix`). Ad-hoc
+aggregates of the 5-minute intervals are computed in SQL by `nem.sql`, and
+price anomalies and events are read from the tables of `nem.anomaly` and
+`nem.events`.
+"""
+
+import os
+
+import pandas as pd
+import streamlit as st
+
+from nem import anomaly, events, profiles, scada, sketch, sql, store, tables
+from nem.grid import Grid, meta_path
+from nem.matrix import UnitMatrix, matrix_paths
+from nem.pyramid import Pyramid, pyramid_path
+from nem.timeindex import TimeIndex
+from nem.cache import dataset_cache
+
+
+def read_csv(file_path, date_columns=None):
+    """
+    Read a CSV file through the shared dataset cache.
+
+    Its Parquet copy (`nem.tables`) is read instead while it is not older
+    than the CSV.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        date_columns (list, optional): Columns to parse as datetimes.
+
+    Returns:
+        pd.DataFrame: A shallow copy of the cached DataFrame. Adding or replacing
+        columns is safe; do not modify values in place.
+    """
+    date_columns = list(date_columns) if date_columns else None
+    key = ("csv", tuple(date_columns) if date_columns else None)
+    if tables.is_current(file_path):
+        return dataset_cache.get(tables.table_path(file_path), lambda path: tables.read_table(path, date_columns),
+                                 key=key)
+    return dataset_cache.get(file_path, lambda path: pd.read_csv(path, parse_dates=date_columns), key=key)
+
+
+def load_data(file_path, date_columns=None):
+    """
+    Load a dataset for a page, reporting errors in the page instead of raising.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        date_columns (list, optional): Columns to parse as datetimes.
+
+    Returns:
+        pd.DataFrame or None: The data, or None if it could not be loaded.
+    """
+    try:
+        return read_csv(file_path, date_columns)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_price_and_demand(region, years=None, columns=None, calendar=True):
+    """
+    Read price-and-demand intervals through the shared dataset cache.
+
+    Each region-year partition of the store is cached separately, so switching
+    the year only loads the new year. Without a store the full CSV is cached
+    and filtered.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        years (iterable, optional): Years to read. Defaults to all years.
+        columns (list, optional): Measure columns to read, e.g. ["RRP"].
+        calendar (bool, optional): Add the YEAR ... WEEKDAY columns.
+
+    Returns:
+        pd.DataFrame: Intervals sorted by SETTLEMENTDATE.
+    """
+    key = ("store", tuple(columns) if columns else None, calendar)
+    stored = store.available_years(region)
+    if stored:
+        years = stored if years is None else [y for y in years if y in stored]
+        frames = [
+            dataset_cache.get(
+                store.partition_path(region, year),
+                lambda path, year=year: store.read_price_and_demand(region, [year], columns, calendar),
+                key=key,
+            )
+            for year in years
+        ]
+        if not frames:
+            return store.read_price_and_demand(region, [], columns, calendar)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    data = read_csv(store.csv_path(region), date_columns=["SETTLEMENTDATE"])
+    if years is not None:
+        data = data[data["SETTLEMENTDATE"].dt.year.isin(list(years))]
+    if columns is not None:
+        data = data[["SETTLEMENTDATE"] + [c for c in columns if c != "SETTLEMENTDATE"]]
+        if calendar:
+            data = store.add_calendar_columns(data.copy())
+    return data.reset_index(drop=True)
+
+
+def load_price_and_demand(region, years=None, columns=None, calendar=True):
+    """
+    Page wrapper of `read_price_and_demand` that reports errors in the page.
+
+    Returns:
+        pd.DataFrame or None: The data, or None if it could not be loaded.
+    """
+    try:
+        return read_price_and_demand(region, years, columns, calendar)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_time_index(region, columns=None):
+    """
+    A region's whole history as a `TimeIndex`, cached once per server process,
+    for pages with a date slider over the 5-minute data.
+
+    The index is rebuilt when any partition of the region is rewritten (the
+    partition directory's mtime changes), or the CSV when there is no store.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        columns (list, optional): Measure columns to keep, e.g. ["RRP"].
+
+    Returns:
+        TimeIndex: Its `slice(start, end)` returns views of the cached frame;
+        do not modify values in place.
+    """
+    key = ("time_index", tuple(columns) if columns else None)
+    if store.available_years(region):
+        directory = os.path.dirname(store.partition_path(region, store.available_years(region)[0]))
+        return dataset_cache.get(
+            directory, lambda path: TimeIndex(store.read_price_and_demand(region, columns=columns)), key=key)
+
+    def from_csv(path):
+        data = pd.read_csv(path, parse_dates=["SETTLEMENTDATE"])
+        return TimeIndex(data if columns is None else data[["SETTLEMENTDATE", *columns]])
+    return dataset_cache.get(store.csv_path(region), from_csv, key=key)
+
+
+def load_time_index(region, columns=None):
+    """
+    Page wrapper of `read_time_index` that reports errors in the page.
+
+    Returns:
+        TimeIndex or None: The index, or None if it could not be loaded.
+    """
+    try:
+        return read_time_index(region, columns)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_grid(region):
+    """
+    A region's memory-mapped grid (`nem.grid`), opened once per server process.
+
+    The arrays are mapped, not loaded, so the cache accounts no memory for them
+    and every session reads the same pages.
+
+    Returns:
+        Grid or None: The grid, or None if it has not been built
+        (`python -m nem.grid build`).
+    """
+    path = meta_path(region)
+    if not os.path.exists(path):
+        return None
+    return dataset_cache.get(path, lambda path: Grid(region), key="grid")
+
+
+def load_grid(region):
+    """
+    Page wrapper of `read_grid` that reports errors in the page.
+
+    Returns:
+        Grid or None: The grid, or None if it is not built or could not be opened.
+    """
+    try:
+        return read_grid(region)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_pyramid(region):
+    """
+    A region's multi-resolution pyramid (`nem.pyramid`), loaded once per
+    server process.
+
+    Returns:
+        Pyramid or None: The pyramid, or None if it has not been built
+        (`python -m nem.pyramid build`).
+    """
+    path = pyramid_path(region)
+    if not os.path.exists(path):
+        return None
+    return dataset_cache.get(path, lambda path: Pyramid(region), key="pyramid")
+
+
+def load_pyramid(region):
+    """
+    Page wrapper of `read_pyramid` that reports errors in the page.
+
+    Returns:
+        Pyramid or None: The pyramid, or None if it is not built or could not be loaded.
+    """
+    try:
+        return read_pyramid(region)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def load_interval_stats(region, by, years=None, start=None, end=None, statistics=sql.STATISTICS):
+    """
+    Page wrapper of `nem.sql.interval_stats` that reports errors in the page.
+
+    Returns:
+        pd.DataFrame or None: The statistics, or None if they could not be computed.
+    """
+    try:
+        return sql.interval_stats(region, by, years, start, end, statistics)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_bucket_quantiles(region, granularity, measure, qs, regroup=None):
+    """
+    Quantiles of the `PRICE_STATS_BY_{granularity}` buckets from their sketches.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        granularity (str): Sketched granularity, e.g. "MONTH".
+        measure (str): "RRP" or "TOTALDEMAND".
+        qs (list): Quantiles, e.g. [0.05, 0.5, 0.95].
+        regroup (callable, optional): Maps the bucket labels (a Series) to
+            coarser labels; the sketches are merged into those first.
+
+    Returns:
+        pd.DataFrame or None: One row per bucket label and one column per
+        quantile, or None if the region has no sketches.
+    """
+    path = sketch.sketch_path(region)
+    if not os.path.exists(path):
+        return None
+    sketches = dataset_cache.get(path, lambda path: sketch.read_sketches(region), key="sketches")
+    sketches = sketches[(sketches["GRANULARITY"] == granularity) & (sketches["MEASURE"] == measure)]
+    if regroup is not None:
+        sketches = sketch.merge(sketches, regroup(sketches["BUCKET"]))
+    return sketch.quantiles(sketches, qs)
+
+
+def load_bucket_quantiles(region, granularity, measure, qs, regroup=None):
+    """
+    Page wrapper of `read_bucket_quantiles` that reports errors in the page.
+
+    Returns:
+        pd.DataFrame or None: The quantiles, or None if there are no sketches
+        or they could not be loaded.
+    """
+    try:
+        return read_bucket_quantiles(region, granularity, measure, qs, regroup)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_anomalies(region, start=None, end=None, detectors=None):
+    """
+    Anomalies of a region within a date range, from the table cached once per
+    server process.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        start (datetime-like, optional): First interval to include.
+        end (datetime-like, optional): Last interval to include.
+        detectors (list, optional): Subset of `nem.anomaly.DETECTORS`.
+
+    Returns:
+        pd.DataFrame or None: The anomalies, or None if the table has not been
+        built (`python -m nem.anomaly build`).
+    """
+    path = anomaly.table_path(region)
+    if not os.path.exists(path):
+        return None
+    table = dataset_cache.get(path, pd.read_parquet, key="anomalies")
+    return anomaly.select(table, start, end, detectors)
+
+
+def load_anomalies(region, start=None, end=None, detectors=None):
+    """
+    Page wrapper of `read_anomalies` that reports errors in the page.
+
+    Returns:
+        pd.DataFrame or None: The anomalies, or None if they could not be loaded.
+    """
+    try:
+        return read_anomalies(region, start, end, detectors)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_events(region, kind, threshold, start=None, end=None, min_peak=None, min_hours=None):
+    """
+    Price events of a region from its event index, cached once per server
+    process (see `nem.events.select` for the arguments).
+
+    Returns:
+        pd.DataFrame or None: The events, or None if the index has not been
+        built (`python -m nem.events build`).
+    """
+    path = events.events_path(region)
+    if not os.path.exists(path):
+        return None
+    index = dataset_cache.get(path, lambda path: events.read_events(region), key="events")
+    return events.select(index, kind, threshold, start, end, min_peak, min_hours)
+
+
+def load_events(region, kind, threshold, start=None, end=None, min_peak=None, min_hours=None):
+    """
+    Page wrapper of `read_events` that reports errors in the page.
+
+    Returns:
+        pd.DataFrame or None: The events, or None if they could not be loaded.
+    """
+    try:
+        return read_events(region, kind, threshold, start, end, min_peak, min_hours)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_profile(granularity, region, year):
+    """
+    Return an intra-day profile ("hour" or "dispatch") for one region and year.
+
+    The profile is looked up in the precomputed cube (`nem.profiles`) when it
+    exists, and computed from the source data otherwise.
+
+    Returns:
+        pd.DataFrame: HOUR (and MINUTE for "dispatch") and the eight
+        RRP/TOTALDEMAND statistic columns.
+    """
+    if os.path.exists(profiles.PROFILE_PATH):
+        cube = dataset_cache.get(profiles.PROFILE_PATH, profiles.read_cube, key="profiles")
+        profile = profiles.lookup(cube, granularity, region, year)
+        if profile is not None:
+            return profile
+
+    if granularity == "hour":
+        data = read_csv(profiles.hour_stats_path(region), date_columns=['YEAR_MONTH_DAY_HOUR'])
+        return profiles.hourly_profile(data[data['YEAR'] == year])
+    data = read_price_and_demand(region, years=[year], columns=store.MEASURES)
+    return profiles.dispatch_profile(data)
+
+
+def load_profile(granularity, region, year):
+    """
+    Page wrapper of `read_profile` that reports errors in the page.
+
+    Returns:
+        pd.DataFrame or None: The profile, or None if it could not be loaded.
+    """
+    try:
+        return read_profile(granularity, region, year)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_generation(span):
+    """
+    Read the daily unit generation of a month span as a star schema.
+
+    The star files written by `python -m nem.scada --star` are used when they
+    exist; otherwise `DISPATCH_UNIT_SCADA_{span}_daily.csv` is split into a
+    star once and the star is cached.
+
+    Args:
+        span (str): Month span of the files, e.g. "202501".
+
+    Returns:
+        tuple: (fact, units) DataFrames, see `nem.scada.to_star`.
+    """
+    fact_path, _ = scada.star_paths(span)
+    if os.path.exists(fact_path):
+        return dataset_cache.get(fact_path, lambda path: scada.read_star(span), key="star")
+    csv_path = os.path.join(scada.ANALYSIS_DIR, f"{scada.TABLE}_{span}_daily.csv")
+    return dataset_cache.get(csv_path, lambda path: scada.to_star(pd.read_csv(path)), key="star")
+
+
+def load_generation(span):
+    """
+    Page wrapper of `read_generation` that reports errors in the page.
+
+    Returns:
+        tuple or None: (fact, units), or None if it could not be loaded.
+    """
+    try:
+        return read_generation(span)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_generation_matrix(span):
+    """
+    Read the unit generation of a month span as a `nem.matrix.UnitMatrix`.
+
+    The 5-minute matrix written by `python -m nem.matrix build` is used when
+    it exists; otherwise the daily matrix is built from `read_generation`.
+    Either is cached, so roll-ups on later reruns are only matrix products.
+
+    Args:
+        span (str): Month span of the files, e.g. "202501".
+    """
+    path = _generation_path(span)
+    if path == matrix_paths(span)[0]:
+        return dataset_cache.get(path, lambda path: UnitMatrix.load(span), key="matrix")
+    return dataset_cache.get(path, lambda path: UnitMatrix.from_fact(*read_generation(span)), key="matrix")
+
+
+def _generation_path(span):
+    """The file unit generation of a span is read from: matrix, star or CSV."""
+    for path in (matrix_paths(span)[0], scada.star_paths(span)[0]):
+        if os.path.exists(path):
+            return path
+    return os.path.join(scada.ANALYSIS_DIR, f"{scada.TABLE}_{span}_daily.csv")
+
+
+def load_generation_matrix(span):
+    """
+    Page wrapper of `read_generation_matrix` that reports errors in the page.
+
+    Returns:
+        UnitMatrix or None: The matrix, or None if it could not be loaded.
+    """
+    try:
+        return read_generation_matrix(span)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def read_region_mixes(span, by):
+    """
+    Daily mixes of a unit column for every region and the whole NEM.
+
+    All regions are rolled up together once and cached, so switching the
+    region is a dictionary lookup.
+
+    Args:
+        span (str): Month span of the files, e.g. "202501".
+        by (str): Unit column or `nem.matrix.MEMBERSHIPS` key, e.g. "fuel".
+
+    Returns:
+        dict: {"ALL" or region: DataFrame of the column, DATE, SCADAVALUE_sum,
+        Total and Percent}.
+    """
+    return dataset_cache.get(_generation_path(span),
+                             lambda path: read_generation_matrix(span).region_mixes(by, freq="D"),
+                             key=("region_mixes", by))
+
+
+def load_region_mixes(span, by):
+    """
+    Page wrapper of `read_region_mixes` that reports errors in the page.
+
+    Returns:
+        dict or None: The mixes, or None if they could not be loaded.
+    """
+    try:
+        return read_region_mixes(span, by)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+def cache_stats():
+    """Return the hit/miss counters of the shared dataset cache."""
+    return dataset_cache.stats()
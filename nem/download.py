@@ -0,0 +1,626 @@
+"""
+Asynchronous download engine for NEMWEB and AEMO data files.
+
+The notebook and the download guide fetch one file at a time with a new
+connection for every `requests.get`, then sleep. This engine downloads a list
+of (url, path) pairs concurrently over one pooled, keep-alive `aiohttp`
+session:
+
+- at most `concurrency` files are in flight overall, and at most `per_host`
+  connections are open to any one host;
+- request starts to the same host are spaced by at least `delay` seconds, so
+  the servers see a steady, polite request rate instead of bursts;
+- connection errors, timeouts, 429 and 5xx responses are retried with
+  exponential backoff and full jitter, honouring `Retry-After`;
+- bodies are streamed to a `.part` file in adaptively sized chunks. An
+  interrupted transfer keeps its part file and resumes with an HTTP Range
+  request (guarded by If-Range), on the next attempt or the next run;
+- a finished file is checked against the size and ETag reported by the
+  server, and zips against the CRC-32 of every member, before it is renamed
+  into place. A file at its final path is therefore always complete, and
+  truncated zips left by older downloads are fetched again;
+- downloads are recorded in a catalog (`nem.catalog`) with their ETag,
+  Last-Modified, size and SHA-256. With `refresh`, existing files are
+  re-checked with conditional requests, so only new or republished files
+  are transferred.
+
+Usage:
+    python -m nem.download mms DISPATCH_UNIT_SCADA 202401 202412 [--dest data/aemo_data] [--refresh]
+    python -m nem.download price-and-demand 201901 202412 [--regions QLD1 ...] [--refresh]
+    python -m nem.download selftest [--files 48]   # offline, against nem.fakeweb
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from nem.catalog import Catalog, catalog_path
+from nem.scada import month_range
+from nem.store import REGIONS
+
+
+NEMWEB_ROOT = "http://www.nemweb.com.au"
+AEMO_ROOT = "https://aemo.com.au"
+MMS_PATH = "/Data_Archive/Wholesale_Electricity/MMSDM/{year}/MMSDM_{year}_{month}/MMSDM_Historical_Data_SQLLoader/DATA/{name}.zip"
+PRICE_AND_DEMAND_PATH = "/aemo/data/nem/priceanddemand/PRICE_AND_DEMAND_{month}_{region}.csv"
+DATA_DIR = "data/aemo_data"
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+CONCURRENCY = 8
+PER_HOST = 4
+DELAY = 0.25
+RETRIES = 4
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+TIMEOUT = 60
+MIN_CHUNK_BYTES = 64 * 1024
+CHUNK_BYTES = 4 * 1024 * 1024
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def mms_url(table, month, root=NEMWEB_ROOT):
+    """
+    URL of the monthly MMS Data Model archive of a table.
+
+    The archive file naming changed in August 2024.
+    """
+    year, mm = month[:4], month[4:]
+    if month >= "202408":
+        name = f"PUBLIC_ARCHIVE%23{table}%23FILE01%23{month}010000"
+    else:
+        name = f"PUBLIC_DVD_{table}_{month}010000"
+    return root + MMS_PATH.format(year=year, month=mm, name=name)
+
+
+def mms_items(table, months, dest=DATA_DIR, root=NEMWEB_ROOT):
+    """(url, path) pairs of a table's monthly archives, saved as `{table}_{month}.zip`."""
+    return [(mms_url(table, month, root), os.path.join(dest, f"{table}_{month}.zip")) for month in months]
+
+
+def price_and_demand_items(months, regions=REGIONS, dest=DATA_DIR, root=AEMO_ROOT):
+    """(url, path) pairs of the monthly `PRICE_AND_DEMAND_{month}_{region}.csv` files."""
+    return [
+        (root + PRICE_AND_DEMAND_PATH.format(month=month, region=region),
+         os.path.join(dest, f"PRICE_AND_DEMAND_{month}_{region}.csv"))
+        for month in months
+        for region in regions
+    ]
+
+
+class _HostPacer:
+    """Space request starts to the same host by at least `delay` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._next = {}
+        self._locks = {}
+
+    async def wait(self, host):
+        if not self.delay:
+            return
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            start = max(loop.time(), self._next.get(host, 0.0))
+            self._next[host] = start + self.delay
+            await asyncio.sleep(start - loop.time())
+
+
+def _backoff(attempt, backoff, retry_after=None):
+    """Seconds to wait before retry `attempt` (1-based): full jitter, or Retry-After."""
+    if retry_after is not None and retry_after.isdigit():
+        return min(float(retry_after), MAX_BACKOFF)
+    return random.uniform(0, min(MAX_BACKOFF, backoff * 2 ** (attempt - 1)))
+
+
+class _RetryableError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _part_paths(path):
+    return path + ".part", path + ".part.json"
+
+
+def _read_part(path, url):
+    """
+    Bytes already in the `.part` file of `path` and the validators they were
+    downloaded under, or (0, {}) if there is nothing to resume.
+    """
+    tmp_path, meta_path = _part_paths(path)
+    if not (os.path.exists(tmp_path) and os.path.exists(meta_path)):
+        return 0, {}
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return 0, {}
+    if meta.get("url") != url:
+        return 0, {}
+    return os.path.getsize(tmp_path), meta
+
+
+def _write_part_meta(path, meta):
+    tmp_path, meta_path = _part_paths(path)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def _discard_part(path):
+    for part in _part_paths(path):
+        if os.path.exists(part):
+            os.remove(part)
+
+
+def _hash_file(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest
+
+
+def check_zip(path):
+    """
+    Raise `zipfile.BadZipFile` unless `path` is a complete zip whose members
+    all match their CRC-32.
+    """
+    with zipfile.ZipFile(path) as archive:
+        bad = archive.testzip()
+    if bad is not None:
+        raise zipfile.BadZipFile(f"CRC mismatch in {bad}")
+
+
+def is_complete(path):
+    """
+    Whether a downloaded file can be trusted. Files written before downloads
+    went through `.part` files may be truncated zips, which have no central
+    directory.
+    """
+    return os.path.exists(path) and (not path.lower().endswith(".zip") or zipfile.is_zipfile(path))
+
+
+def _content_range(header):
+    """(first byte, total size) of a `Content-Range: bytes first-last/total` header."""
+    try:
+        span, total = header.split(" ", 1)[1].split("/")
+        return int(span.split("-")[0]), (None if total == "*" else int(total))
+    except (AttributeError, IndexError, ValueError):
+        return None, None
+
+
+def _conditional_headers(path, entry):
+    """
+    Validators for refreshing the file at `path`: the ETag and Last-Modified
+    on record, or the file's modification time if it is not in the catalog.
+    """
+    if entry is not None and entry.get("path") == path and entry.get("bytes") == os.path.getsize(path):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if headers:
+            return headers
+    return {"If-Modified-Since": formatdate(os.path.getmtime(path), usegmt=True)}
+
+
+async def _stream_to_file(session, url, path, chunk_bytes, min_chunk_bytes=MIN_CHUNK_BYTES, conditional=None):
+    """
+    GET `url` into `path` through a `.part` file, resuming a previous attempt.
+
+    The part file is kept when the transfer fails, so the next attempt (or the
+    next run) only asks for the missing bytes with a Range request. If-Range
+    makes the server send the whole file again if it changed in between. The
+    complete file is checked against the size and ETag the server reported,
+    and zips against their CRCs, before it is renamed into place.
+
+    With `conditional` validators (and nothing to resume), a 304 response
+    leaves the existing file untouched.
+
+    Returns:
+        dict: status ("downloaded" or "unchanged"), bytes (file size), resumed
+        (bytes reused from an earlier attempt), sha256 (None when unchanged),
+        etag and last_modified.
+    """
+    tmp_path, _ = _part_paths(path)
+    offset, meta = _read_part(path, url)
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if meta.get("etag") or meta.get("last_modified"):
+            headers["If-Range"] = meta.get("etag") or meta["last_modified"]
+    elif conditional:
+        headers.update(conditional)
+
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304:
+            return {"status": "unchanged", "bytes": os.path.getsize(path), "resumed": 0, "sha256": None,
+                    "etag": response.headers.get("ETag", conditional.get("If-None-Match")),
+                    "last_modified": response.headers.get("Last-Modified", conditional.get("If-Modified-Since"))}
+        if response.status == 416:
+            _discard_part(path)
+            raise _RetryableError("HTTP 416, restarting from the first byte")
+        if response.status in RETRY_STATUSES:
+            raise _RetryableError(f"HTTP {response.status}", response.headers.get("Retry-After"))
+        response.raise_for_status()
+
+        etag = response.headers.get("ETag")
+        if response.status == 206:
+            first, total = _content_range(response.headers.get("Content-Range"))
+            if first != offset or (meta.get("etag") and etag and etag != meta["etag"]):
+                _discard_part(path)
+                raise _RetryableError("Range response does not continue the partial file")
+        else:
+            offset = 0
+            length = response.headers.get("Content-Length")
+            total = int(length) if length is not None and length.isdigit() else None
+
+        meta = {"url": url, "etag": etag, "last_modified": response.headers.get("Last-Modified"), "size": total}
+        _write_part_meta(path, meta)
+        digest = await asyncio.to_thread(_hash_file, tmp_path) if offset else hashlib.sha256()
+
+        # Start with small reads and double the read size whenever a read
+        # comes back full, i.e. whenever data arrives faster than it is
+        # written, up to chunk_bytes.
+        chunk = min(min_chunk_bytes, chunk_bytes)
+        with open(tmp_path, "ab" if offset else "wb") as f:
+            while True:
+                data = await response.content.read(chunk)
+                if not data:
+                    break
+                f.write(data)
+                digest.update(data)
+                if len(data) == chunk:
+                    chunk = min(chunk * 2, chunk_bytes)
+
+    size = os.path.getsize(tmp_path)
+    if total is not None and size != total:
+        if size > total:
+            _discard_part(path)
+        raise _RetryableError(f"Received {size} of {total} bytes")
+    if path.lower().endswith(".zip"):
+        try:
+            await asyncio.to_thread(check_zip, tmp_path)
+        except zipfile.BadZipFile as e:
+            _discard_part(path)
+            raise _RetryableError(f"Invalid zip: {e}")
+
+    os.replace(tmp_path, path)
+    _discard_part(path)
+    return {"status": "downloaded", "bytes": size, "resumed": offset, "sha256": digest.hexdigest(),
+            "etag": meta["etag"], "last_modified": meta["last_modified"]}
+
+
+async def fetch(session, url, path, pacer=None, retries=RETRIES, backoff=BACKOFF, chunk_bytes=CHUNK_BYTES,
+                overwrite=False, catalog=None, refresh=False):
+    """
+    Download one file with retries.
+
+    Args:
+        catalog (nem.catalog.Catalog, optional): Catalog to record the
+            download in, and to take refresh validators from.
+        refresh (bool, optional): Check existing files with a conditional
+            request instead of skipping them.
+
+    Returns:
+        dict: url, path, status ("downloaded", "unchanged", "skipped" or
+        "failed"), bytes, resumed, sha256, etag, last_modified, attempts,
+        seconds and error.
+    """
+    result = {"url": url, "path": path, "status": "skipped", "bytes": 0, "resumed": 0, "sha256": None,
+              "etag": None, "last_modified": None, "attempts": 0, "seconds": 0.0, "error": None}
+    complete = is_complete(path)
+    if complete and not overwrite and not refresh:
+        return result
+    if overwrite:
+        _discard_part(path)
+    conditional = None
+    if complete and not overwrite:
+        conditional = _conditional_headers(path, catalog.get(url) if catalog is not None else None)
+
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    host = urlsplit(url).netloc
+    for attempt in range(1, retries + 2):
+        result["attempts"] = attempt
+        if pacer is not None:
+            await pacer.wait(host)
+        try:
+            result.update(await _stream_to_file(session, url, path, chunk_bytes, conditional=conditional))
+            result["error"] = None
+            break
+        except (_RetryableError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                asyncio.TimeoutError) as e:
+            result["status"], result["error"] = "failed", str(e) or type(e).__name__
+            if attempt > retries:
+                break
+            await asyncio.sleep(_backoff(attempt, backoff, getattr(e, "retry_after", None)))
+        except aiohttp.ClientResponseError as e:
+            # 404 and other client errors will not succeed on a retry
+            result["status"], result["error"] = "failed", f"HTTP {e.status}"
+            break
+    result["seconds"] = time.perf_counter() - start
+
+    if catalog is not None and result["status"] != "failed":
+        entry = catalog.get(url)
+        if result["status"] == "unchanged" and entry is not None and entry["path"] == path:
+            catalog.record_check(url)
+        else:
+            if result["sha256"] is None:
+                result["sha256"] = (await asyncio.to_thread(_hash_file, path)).hexdigest()
+            catalog.record_download(result)
+    return result
+
+
+async def download_all(items, concurrency=CONCURRENCY, per_host=PER_HOST, delay=DELAY, retries=RETRIES,
+                       backoff=BACKOFF, chunk_bytes=CHUNK_BYTES, timeout=TIMEOUT, headers=HEADERS,
+                       overwrite=False, catalog=None, refresh=False, progress=None):
+    """
+    Download (url, path) pairs concurrently over one pooled session.
+
+    Args:
+        items (iterable): (url, path) pairs.
+        concurrency (int, optional): Files in flight at once.
+        per_host (int, optional): Open connections per host.
+        delay (float, optional): Minimum seconds between request starts to one host.
+        retries (int, optional): Retries per file after the first attempt.
+        backoff (float, optional): Base of the exponential backoff, in seconds.
+        chunk_bytes (int, optional): Largest read from the response. Reads
+            start at MIN_CHUNK_BYTES and grow while data arrives faster than
+            it is written.
+        timeout (float, optional): Seconds allowed to connect and between reads.
+        overwrite (bool, optional): Download files that already exist.
+        catalog (nem.catalog.Catalog, optional): Catalog of the downloads.
+        refresh (bool, optional): Check existing files with conditional
+            requests (If-None-Match / If-Modified-Since) and download only
+            those that changed.
+        progress (callable, optional): Called with each result as it completes.
+
+    Returns:
+        list: `fetch` results, in the order of `items`.
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(concurrency)
+    pacer = _HostPacer(delay)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+
+    async with aiohttp.ClientSession(connector=connector, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout),
+                                     read_bufsize=chunk_bytes) as session:
+        async def run(url, path):
+            async with semaphore:
+                result = await fetch(session, url, path, pacer, retries, backoff, chunk_bytes, overwrite, catalog,
+                                     refresh)
+            if progress is not None:
+                progress(result)
+            return result
+
+        return await asyncio.gather(*(run(url, path) for url, path in items))
+
+
+def download(items, **kwargs):
+    """
+    Blocking wrapper of `download_all`, usable from scripts and notebooks.
+
+    Jupyter already runs an event loop in the main thread, so the downloads
+    then run on their own loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(download_all(items, **kwargs))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, download_all(items, **kwargs)).result()
+
+
+def extract(path, dest, catalog=None, url=None):
+    """
+    Extract the members of a downloaded zip into `dest`.
+
+    `nem.mms` reads the archives directly, so this is only needed by tools
+    that want the CSV files. With a catalog, the extracted paths are recorded
+    against the URL.
+
+    Returns:
+        list: Paths of the extracted files.
+    """
+    with zipfile.ZipFile(path) as archive:
+        paths = [archive.extract(member, dest) for member in archive.namelist()]
+    if catalog is not None and url in catalog:
+        catalog.record_extracted(url, paths)
+    return paths
+
+
+def print_progress(result):
+    if result["status"] == "downloaded":
+        print(f"Downloaded {result['path']} ({result['bytes'] / 1e6:.1f} MB, {result['attempts']} attempts)")
+    elif result["status"] == "unchanged":
+        print(f"Unchanged {result['path']}")
+    elif result["status"] == "skipped":
+        print(f"Skipping {result['path']} - already exists")
+    else:
+        print(f"Failed to download {result['url']}: {result['error']}")
+
+
+def summarise(results):
+    """Count results per status."""
+    counts = {"downloaded": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return counts
+
+
+def selftest(files=48, file_bytes=512 * 1024, latency=0.05, fail_rate=0.1, cut_rate=0.1, concurrency=CONCURRENCY,
+             per_host=PER_HOST, changed=3):
+    """
+    Download fake archives from a local `FakeNemweb` server and verify them.
+
+    With `cut_rate`, some responses are dropped halfway, so the downloads
+    must resume with Range requests. A second, catalogued refresh run after
+    republishing `changed` files must download only those and get a 304 for
+    every other file.
+
+    Also times the sequential, one-connection-per-file approach of the
+    notebook (without its one-second sleeps) on the same server.
+
+    Returns:
+        dict: Timings, server statistics and the list of failed or corrupt files.
+    """
+    from nem.fakeweb import FakeNemweb
+    import requests
+
+    months = month_range("202001", "209912")[:files]
+    with FakeNemweb(file_bytes=file_bytes, latency=latency, fail_rate=fail_rate, cut_rate=cut_rate) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        items = mms_items("DISPATCH_UNIT_SCADA", months, tmp, root=server.url)
+        expected = {url: hashlib.sha256(server.body(url)).digest() for url, _ in items}
+        start = time.perf_counter()
+        catalog = Catalog(catalog_path(tmp))
+        results = download(items, concurrency=concurrency, per_host=per_host, delay=0, backoff=0.05,
+                           catalog=catalog)
+        seconds = time.perf_counter() - start
+        stats = server.stats()
+
+        bad = []
+        for result in results:
+            if result["status"] != "downloaded":
+                bad.append(f"{result['path']}: {result['error']}")
+            elif _hash_file(result["path"]).digest() != expected[result["url"]] \
+                    or result["sha256"] != expected[result["url"]].hex():
+                bad.append(f"{result['path']}: content differs from the served file")
+        bad += [f"{name}: left behind" for name in os.listdir(tmp) if name.endswith((".part", ".part.json"))]
+        bad += [f"{url}: not in the catalog" for url, _ in items if url not in catalog]
+
+        server.fail_rate = server.cut_rate = 0.0
+        for url, _ in items[:changed]:
+            server.republish(url)
+        start = time.perf_counter()
+        refreshed = download(items, concurrency=concurrency, per_host=per_host, delay=0,
+                             catalog=Catalog(catalog_path(tmp)), refresh=True)
+        refresh_seconds = time.perf_counter() - start
+        for result in refreshed:
+            should_change = result["url"] in {url for url, _ in items[:changed]}
+            if result["status"] != ("downloaded" if should_change else "unchanged"):
+                bad.append(f"{result['path']}: {result['status']} on refresh")
+            elif _hash_file(result["path"]).digest() != hashlib.sha256(server.body(result["url"])).digest():
+                bad.append(f"{result['path']}: content differs from the republished file")
+        start = time.perf_counter()
+        for url, _ in items:
+            requests.get(url, headers=HEADERS).raise_for_status()
+        sequential_seconds = time.perf_counter() - start
+
+    return {
+        "files": len(items),
+        "bytes": sum(r["bytes"] for r in results),
+        "seconds": seconds,
+        "sequential_seconds": sequential_seconds,
+        "summary": summarise(results),
+        "retries": sum(r["attempts"] - 1 for r in results),
+        "resumed": sum(r["resumed"] for r in results),
+        "refresh_seconds": refresh_seconds,
+        "refresh_summary": summarise(refreshed),
+        "refresh_bytes": sum(r["bytes"] for r in refreshed if r["status"] == "downloaded"),
+        "server": stats,
+        "bad": bad,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.download", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=PER_HOST)
+    parser.add_argument("--delay", type=float, default=DELAY, help="seconds between request starts per host")
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    mms = commands.add_parser("mms", help="download the monthly archives of an MMS Data Model table")
+    mms.add_argument("table", help="e.g. DISPATCH_UNIT_SCADA")
+    mms.add_argument("start", help="first month, YYYYMM")
+    mms.add_argument("end", help="last month, YYYYMM")
+    mms.add_argument("--dest", default=DATA_DIR)
+    mms.add_argument("--overwrite", action="store_true")
+    mms.add_argument("--refresh", action="store_true", help="re-check existing files with conditional requests")
+    mms.add_argument("--extract", action="store_true", help="also extract the CSV files of new downloads")
+
+    pad = commands.add_parser("price-and-demand", help="download the monthly PRICE_AND_DEMAND files")
+    pad.add_argument("start", help="first month, YYYYMM")
+    pad.add_argument("end", help="last month, YYYYMM")
+    pad.add_argument("--regions", nargs="+", default=REGIONS)
+    pad.add_argument("--dest", default=DATA_DIR)
+    pad.add_argument("--overwrite", action="store_true")
+    pad.add_argument("--refresh", action="store_true", help="re-check existing files with conditional requests")
+
+    test = commands.add_parser("selftest", help="download from a local fake NEMWEB server and verify")
+    test.add_argument("--files", type=int, default=48)
+    test.add_argument("--file-bytes", type=int, default=512 * 1024)
+    test.add_argument("--latency", type=float, default=0.05, help="server seconds per response")
+    test.add_argument("--fail-rate", type=float, default=0.1, help="share of 503 responses")
+    test.add_argument("--cut-rate", type=float, default=0.1, help="share of responses dropped halfway")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "selftest":
+        result = selftest(args.files, args.file_bytes, args.latency, args.fail_rate, args.cut_rate,
+                          args.concurrency, args.per_host)
+        server = result["server"]
+        print(f"Async:      {result['files']} files, {result['bytes'] / 1e6:.1f} MB in {result['seconds']:.2f}s "
+              f"({result['bytes'] / 1e6 / result['seconds']:.1f} MB/s), {result['retries']} retries, "
+              f"{result['resumed'] / 1e6:.1f} MB resumed")
+        print(f"Sequential: {result['sequential_seconds']:.2f}s "
+              f"({result['sequential_seconds'] / result['seconds']:.1f}x slower)")
+        print(f"Refresh:    {result['refresh_summary']['unchanged']} unchanged (304), "
+              f"{result['refresh_summary']['downloaded']} republished files downloaded, "
+              f"{result['refresh_bytes'] / 1e6:.1f} MB in {result['refresh_seconds']:.2f}s")
+        print(f"Server: {server.get('requests', 0)} requests over {server.get('connections', 0)} connections, "
+              f"at most {server.get('max_in_flight', 0)} in flight, {server.get('status_503', 0)} answered 503, "
+              f"{server.get('cut', 0)} dropped halfway, {server.get('range_requests', 0)} Range requests")
+        for problem in result["bad"]:
+            print(f"Failed: {problem}")
+        if result["bad"] or result["summary"]["failed"]:
+            sys.exit(1)
+        print("All files match the served content")
+        return
+
+    months = month_range(args.start, args.end)
+    if args.command == "mms":
+        items = mms_items(args.table, months, args.dest)
+    else:
+        items = price_and_demand_items(months, args.regions, args.dest)
+
+    start = time.perf_counter()
+    catalog = Catalog(catalog_path(args.dest))
+    results = download(items, concurrency=args.concurrency, per_host=args.per_host, delay=args.delay,
+                       retries=args.retries, overwrite=args.overwrite, catalog=catalog, refresh=args.refresh,
+                       progress=print_progress)
+    if getattr(args, "extract", False):
+        for result in results:
+            if result["status"] == "downloaded":
+                print(f"Extracted {', '.join(extract(result['path'], args.dest, catalog, result['url']))}")
+    counts = summarise(results)
+    print(f"Downloaded {counts['downloaded']}, unchanged {counts['unchanged']}, skipped {counts['skipped']}, "
+          f"failed {counts['failed']} in {time.perf_counter() - start:.2f}s")
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Index of price events: contiguous runs of intervals beyond a price threshold.
+
+Questions like "every interval where SA1 exceeded $5,000/MWh" or "negative-price
+runs longer than two hours in 2024" used to need a scan of the whole history.
+The index stores, per region and threshold, one row per run of consecutive
+intervals with RRP >= a HIGH threshold or RRP < a LOW threshold:
+
+    data/store/events/EVENTS_{region}.parquet   KIND, THRESHOLD, START, END, INTERVALS, HOURS, PEAK, INTEGRAL
+
+START and END are the first and last SETTLEMENTDATE of the run, HOURS its
+length, PEAK its highest (HIGH) or lowest (LOW) RRP and INTEGRAL the sum of
+RRP x interval hours ($/MWh x h). Rows are sorted by KIND, THRESHOLD and
+START. The runs of one threshold do not overlap, so their END is sorted too,
+and `select` finds the events overlapping a time range by binary search
+before filtering on magnitude and duration.
+
+`update` appends the runs of the intervals newer than the index. A run that
+was still open at the end of the index is extended by merging its
+aggregates, so the history is not re-read. `nem.ingest` calls it after each
+ingest once the index has been built.
+
+Usage:
+    python -m nem.events build [--regions SA1 ...] [--high 300 1000 5000] [--low 0]
+    python -m nem.events update [--regions SA1 ...]
+    python -m nem.events query SA1 --kind high --threshold 5000 [--start 2024-01-01] [--end 2024-12-31]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from nem import store
+
+
+EVENT_DIR = "data/store/events"
+STATE_NAME = "state.json"
+
+HIGH = [300.0, 1000.0, 5000.0]
+LOW = [0.0]
+
+MAX_GAP = pd.Timedelta(minutes=30)   # a longer gap between intervals ends a run
+
+COLUMNS = ["KIND", "THRESHOLD", "START", "END", "INTERVALS", "HOURS", "PEAK", "INTEGRAL"]
+
+
+def events_path(region, root=EVENT_DIR):
+    return os.path.join(root, f"EVENTS_{region}.parquet")
+
+
+def read_state(root=EVENT_DIR):
+    """
+    Last indexed interval and thresholds of each region.
+
+    Returns:
+        dict: {region: {"last", "high", "low"}}.
+    """
+    path = os.path.join(root, STATE_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(state, root=EVENT_DIR):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, STATE_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def interval_hours(times, previous=None):
+    """
+    Length of each interval in hours: the time since the previous interval,
+    capped at MAX_GAP. The first interval takes the length of the second one
+    when `previous` is not given.
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    if not len(times):
+        return np.zeros(0)
+    first = np.datetime64(pd.Timestamp(previous), "ns") if previous is not None else None
+    steps = np.diff(times, prepend=first if first is not None else times[:1])
+    if first is None:
+        steps[0] = steps[1] if len(steps) > 1 else np.timedelta64(5, "m")
+    return np.minimum(steps, MAX_GAP.to_timedelta64()) / np.timedelta64(1, "h")
+
+
+def find_runs(times, rrp, flags, hours, kind, threshold):
+    """
+    Runs of consecutive flagged intervals, split where the gap exceeds MAX_GAP.
+
+    Returns:
+        pd.DataFrame: One COLUMNS row per run.
+    """
+    gaps = np.r_[False, np.diff(times) > MAX_GAP.to_timedelta64()]
+    first = flags & (np.r_[True, ~flags[:-1]] | gaps)
+    starts = np.flatnonzero(first)
+    if not len(starts):
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in _DTYPES.items()})
+    run = np.cumsum(first)[flags] - 1
+    ends = np.flatnonzero(flags & (np.r_[~flags[1:], True] | np.r_[gaps[1:], False]))
+    peak = np.maximum if kind == "high" else np.minimum
+    return pd.DataFrame({
+        "KIND": kind,
+        "THRESHOLD": float(threshold),
+        "START": times[starts],
+        "END": times[ends],
+        "INTERVALS": (ends - starts + 1).astype("int32"),
+        "HOURS": np.bincount(run, weights=hours[flags], minlength=len(starts)),
+        "PEAK": peak.reduceat(rrp[flags], np.r_[0, np.cumsum(ends - starts + 1)[:-1]]),
+        "INTEGRAL": np.bincount(run, weights=(rrp * hours)[flags], minlength=len(starts)),
+    })
+
+
+_DTYPES = {"KIND": object, "THRESHOLD": "float64", "START": "datetime64[s]", "END": "datetime64[s]",
+           "INTERVALS": "int32", "HOURS": "float64", "PEAK": "float64", "INTEGRAL": "float64"}
+
+
+def index_events(data, high=HIGH, low=LOW, previous=None):
+    """
+    Events of a region's intervals for every threshold.
+
+    Args:
+        data (pd.DataFrame): SETTLEMENTDATE and RRP, sorted by SETTLEMENTDATE.
+        high (list, optional): Thresholds of RRP >= threshold runs.
+        low (list, optional): Thresholds of RRP < threshold runs.
+        previous (datetime-like, optional): Interval before the first row,
+            for the length of the first interval.
+
+    Returns:
+        pd.DataFrame: COLUMNS rows sorted by KIND, THRESHOLD and START.
+    """
+    times = data["SETTLEMENTDATE"].to_numpy()
+    rrp = data["RRP"].to_numpy("float64")
+    hours = interval_hours(times, previous)
+    frames = [find_runs(times, rrp, rrp >= t, hours, "high", t) for t in high]
+    frames += [find_runs(times, rrp, rrp < t, hours, "low", t) for t in low]
+    events = pd.concat(frames, ignore_index=True).astype(_DTYPES)
+    return events.sort_values(["KIND", "THRESHOLD", "START"], ignore_index=True)
+
+
+def _write(events, region, root):
+    os.makedirs(root, exist_ok=True)
+    path = events_path(region, root)
+    events.astype({"KIND": "category"}).to_parquet(path + ".tmp", index=False, compression="zstd")
+    os.replace(path + ".tmp", path)
+
+
+def build(region, high=HIGH, low=LOW, root=EVENT_DIR, store_root=store.STORE_DIR):
+    """
+    Index a region's whole history.
+
+    Returns:
+        dict: Region, intervals scanned and events found.
+    """
+    data = store.read_price_and_demand(region, columns=["RRP"], root=store_root)
+    events = index_events(data, high, low)
+    _write(events, region, root)
+    state = read_state(root)
+    state[region] = {"last": str(data["SETTLEMENTDATE"].iloc[-1]), "high": list(high), "low": list(low)}
+    write_state(state, root)
+    return {"region": region, "intervals": len(data), "events": len(events)}
+
+
+def _merge(events, new, last, first):
+    """
+    Join the runs of `events` still open at `last` with the runs of `new`
+    starting at its first interval `first`, by combining their aggregates.
+    """
+    keys = ["KIND", "THRESHOLD"]
+    pairs = events[events["END"] == last].merge(new[new["START"] == first], on=keys, suffixes=("", "_NEW"))
+    if pairs.empty:
+        return pd.concat([events, new], ignore_index=True)
+
+    high = (pairs["KIND"] == "high").to_numpy()
+    joined = pd.DataFrame({
+        "KIND": pairs["KIND"],
+        "THRESHOLD": pairs["THRESHOLD"],
+        "START": pairs["START"],
+        "END": pairs["END_NEW"],
+        "INTERVALS": pairs["INTERVALS"] + pairs["INTERVALS_NEW"],
+        "HOURS": pairs["HOURS"] + pairs["HOURS_NEW"],
+        "PEAK": np.where(high, np.maximum(pairs["PEAK"], pairs["PEAK_NEW"]),
+                         np.minimum(pairs["PEAK"], pairs["PEAK_NEW"])),
+        "INTEGRAL": pairs["INTEGRAL"] + pairs["INTEGRAL_NEW"],
+    })
+
+    def without(frame, runs):
+        index = pd.MultiIndex.from_frame(frame[keys + ["START"]])
+        return frame[~index.isin(pd.MultiIndex.from_frame(runs.set_axis(keys + ["START"], axis=1)))]
+
+    return pd.concat([without(events, pairs[keys + ["START"]]), joined,
+                      without(new, pairs[keys + ["START_NEW"]])], ignore_index=True)
+
+
+def update(region, data=None, root=EVENT_DIR, store_root=store.STORE_DIR):
+    """
+    Add the events of the intervals newer than the index.
+
+    Only the partitions of the years from the last indexed interval on are
+    read (or `data`, when the new intervals are given). Runs still open at the
+    last indexed interval are extended, so the result equals a `build` over
+    the whole history. Intervals revised at or before the last indexed
+    interval need a `build`.
+
+    Returns:
+        dict: Region, new intervals and events found among them.
+    """
+    state = read_state(root).get(region)
+    if state is None or not os.path.exists(events_path(region, root)):
+        return build(region, root=root, store_root=store_root)
+    last = pd.Timestamp(state["last"])
+    if data is None:
+        years = [y for y in store.available_years(region, store_root) if y >= last.year]
+        data = store.read_price_and_demand(region, years, columns=["RRP"], root=store_root)
+    data = data.loc[data["SETTLEMENTDATE"] > last, ["SETTLEMENTDATE", "RRP"]].reset_index(drop=True)
+    if data.empty:
+        return {"region": region, "intervals": 0, "events": 0}
+
+    events = read_events(region, root)
+    new = index_events(data, state["high"], state["low"], previous=last)
+    first = data["SETTLEMENTDATE"].iloc[0]
+    if first - last <= MAX_GAP:
+        events = _merge(events, new, last, first)
+    else:
+        events = pd.concat([events, new], ignore_index=True)
+    _write(events.astype(_DTYPES).sort_values(["KIND", "THRESHOLD", "START"], ignore_index=True), region, root)
+    state["last"] = str(data["SETTLEMENTDATE"].iloc[-1])
+    write_state({**read_state(root), region: state}, root)
+    return {"region": region, "intervals": len(data), "events": len(new)}
+
+
+def read_events(region, root=EVENT_DIR):
+    """A region's event index, or None if it has not been built."""
+    path = events_path(region, root)
+    return pd.read_parquet(path).astype(_DTYPES) if os.path.exists(path) else None
+
+
+def select(events, kind, threshold, start=None, end=None, min_peak=None, min_hours=None):
+    """
+    Events of one threshold overlapping [start, end], optionally at least as
+    extreme as `min_peak` and lasting at least `min_hours`.
+
+    The threshold's rows are located and the time range is cut by binary
+    search; only the events in range are filtered on magnitude.
+
+    Args:
+        events (pd.DataFrame): A region's index, as from `read_events`.
+        kind (str): "high" or "low".
+        threshold (float): An indexed threshold of `kind`.
+        start (datetime-like, optional): Events ending at or after it.
+        end (datetime-like, optional): Events starting at or before it.
+        min_peak (float, optional): PEAK at least this high ("high") or at
+            most this low ("low").
+        min_hours (float, optional): Minimum HOURS.
+
+    Returns:
+        pd.DataFrame: The events, sorted by START.
+    """
+    kinds = events["KIND"].to_numpy()
+    thresholds = events["THRESHOLD"].to_numpy()
+    low = np.searchsorted(kinds, kind, side="left")
+    high = np.searchsorted(kinds, kind, side="right")
+    low, high = low + np.searchsorted(thresholds[low:high], threshold, side="left"), \
+        low + np.searchsorted(thresholds[low:high], threshold, side="right")
+    block = events.iloc[low:high]
+    if start is not None:
+        block = block.iloc[np.searchsorted(block["END"].to_numpy(), np.datetime64(pd.Timestamp(start)), side="left"):]
+    if end is not None:
+        block = block.iloc[:np.searchsorted(block["START"].to_numpy(), np.datetime64(pd.Timestamp(end)), side="right")]
+    if min_peak is not None:
+        block = block[block["PEAK"] >= min_peak] if kind == "high" else block[block["PEAK"] <= min_peak]
+    if min_hours is not None:
+        block = block[block["HOURS"] >= min_hours]
+    return block
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.events", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--root", default=EVENT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="index the whole history")
+    build_parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    build_parser.add_argument("--high", nargs="*", type=float, default=HIGH, help="RRP >= threshold runs")
+    build_parser.add_argument("--low", nargs="*", type=float, default=LOW, help="RRP < threshold runs")
+    update_parser = commands.add_parser("update", help="index only the intervals newer than the index")
+    update_parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    query_parser = commands.add_parser("query", help="list the events of a threshold")
+    query_parser.add_argument("region")
+    query_parser.add_argument("--kind", choices=["high", "low"], default="high")
+    query_parser.add_argument("--threshold", type=float, default=HIGH[0])
+    query_parser.add_argument("--start", default=None)
+    query_parser.add_argument("--end", default=None)
+    query_parser.add_argument("--min-peak", type=float, default=None)
+    query_parser.add_argument("--min-hours", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        events = read_events(args.region, args.root)
+        if events is None:
+            print(f"No event index for {args.region}, run `python -m nem.events build` first")
+            return
+        start = time.perf_counter()
+        found = select(events, args.kind, args.threshold, args.start, args.end, args.min_peak, args.min_hours)
+        elapsed = time.perf_counter() - start
+        with pd.option_context("display.max_rows", 100, "display.width", 200):
+            print(found)
+        print(f"{len(found)} events in {elapsed * 1000:.2f}ms")
+        return
+
+    start = time.perf_counter()
+    for region in args.regions:
+        if not store.available_years(region):
+            print(f"{region}: not in the store, run `python -m nem.store convert` first")
+            continue
+        if args.command == "build":
+            result = build(region, args.high, args.low, args.root)
+        else:
+            result = update(region, root=args.root)
+        print(f"{region}: {result['intervals']} intervals, {result['events']} events")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Local HTTP server that serves fake NEMWEB and AEMO files, for offline checks
+of the download engine.
+
+Any path is served. Paths ending in `.zip` get a zip holding one MMS-format CSV
+(C/I/D rows), other paths get a price-and-demand style CSV. Bodies are
+generated deterministically from the path, so a client can verify what it
+received with `FakeNemweb.body(path)`. The server speaks HTTP/1.1 with
+keep-alive, sends ETag and Last-Modified, answers conditional (If-None-Match /
+If-Modified-Since) and Range / If-Range requests, can republish a path with new
+content, and can add latency, random 503 responses and connections dropped mid-body to
+exercise retries and resumption.
+
+    with FakeNemweb(file_bytes=1_000_000, fail_rate=0.1, cut_rate=0.1) as server:
+        url = server.url + "/Data_Archive/.../PUBLIC_ARCHIVE%23DISPATCHPRICE%23FILE01%23202401010000.zip"
+        ...
+        print(server.stats())
+"""
+
+import hashlib
+import io
+import random
+import threading
+import time
+import zipfile
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+# 2025-01-01 00:00:00 UTC, the Last-Modified of every first version
+PUBLISHED = 1735689600
+
+
+def _mms_csv(name, size, seed):
+    """MMS-format CSV of roughly `size` bytes."""
+    rng = random.Random(seed)
+    lines = [f"C,NEMP.WORLD,{name},AEMO,PUBLIC,2025/01/01,00:00:00,0000000000000001,{name},0000000000000001",
+             "I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE,LASTCHANGED"]
+    length = sum(len(line) + 1 for line in lines)
+    minute = 0
+    while length < size:
+        minute += 5
+        stamp = f"2025/01/{1 + minute // 1440 % 28:02d} {minute // 60 % 24:02d}:{minute % 60:02d}:00"
+        line = f'D,DISPATCH,UNIT_SCADA,1,"{stamp}",UNIT{rng.randrange(500):03d},{rng.uniform(0, 500):.5f},"{stamp}"'
+        lines.append(line)
+        length += len(line) + 1
+    lines.append(f'C,"END OF REPORT",{len(lines) + 1}')
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _price_and_demand_csv(size, seed):
+    rng = random.Random(seed)
+    lines = ["REGION,SETTLEMENTDATE,TOTALDEMAND,RRP,PERIODTYPE"]
+    length, minute = len(lines[0]) + 1, 0
+    while length < size:
+        minute += 5
+        line = (f"QLD1,2024/01/{1 + minute // 1440 % 28:02d} {minute // 60 % 24:02d}:{minute % 60:02d}:00,"
+                f"{rng.uniform(4000, 9000):.2f},{rng.uniform(-50, 300):.2f},TRADE")
+        lines.append(line)
+        length += len(line) + 1
+    return ("\n".join(lines) + "\n").encode()
+
+
+def make_body(path, size, version=0):
+    """Deterministic body of a served path, different for each version."""
+    path = unquote(urlsplit(path).path)
+    seed = int.from_bytes(hashlib.sha256(f"{path}#{version}".encode()).digest()[:8], "big")
+    name = path.rsplit("/", 1)[-1]
+    if not name.lower().endswith(".zip"):
+        return _price_and_demand_csv(size, seed)
+    member = name[:-len(".zip")] + ".CSV"
+    buffer = io.BytesIO()
+    # stored, not deflated: the random digits barely compress and the size stays predictable
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr(member, _mms_csv(member, size, seed))
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.fake.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        fake = self.server.fake
+        fake.enter()
+        try:
+            if fake.latency:
+                time.sleep(fake.latency)
+            if fake.should_fail():
+                self._send(503, b"Service Unavailable", {"Retry-After": "0"})
+                return
+
+            body = fake.body(self.path)
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            last_modified = fake.last_modified(self.path)
+            headers = {"ETag": etag, "Last-Modified": last_modified, "Accept-Ranges": "bytes"}
+            if self._not_modified(etag, last_modified):
+                self.server.fake.count("status_304")
+                self.send_response(304)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+
+            status, first = 200, 0
+            byte_range = self.headers.get("Range", "")
+            if byte_range.startswith("bytes=") and self.headers.get("If-Range", etag) in (etag, last_modified):
+                first = int(byte_range[len("bytes="):].split("-")[0])
+                if first >= len(body):
+                    self._send(416, b"", {"Content-Range": f"bytes */{len(body)}"})
+                    return
+                status = 206
+                headers["Content-Range"] = f"bytes {first}-{len(body) - 1}/{len(body)}"
+                fake.count("range_requests")
+            self._send(status, body[first:], headers, cut=fake.should_cut())
+        finally:
+            fake.leave()
+
+    def _not_modified(self, etag, last_modified):
+        if "If-None-Match" in self.headers:
+            return self.headers["If-None-Match"] == etag
+        since = self.headers.get("If-Modified-Since")
+        return since is not None and parsedate_to_datetime(since) >= parsedate_to_datetime(last_modified)
+
+    def _send(self, status, body, headers=None, cut=False):
+        """Send a response; with `cut`, drop the connection halfway through the body."""
+        self.server.fake.count(f"status_{status}")
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if cut:
+            self.server.fake.count("cut")
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class FakeNemweb:
+    """
+    Threaded local server of fake NEMWEB files.
+
+    Args:
+        file_bytes (int, optional): Approximate size of each served file.
+        latency (float, optional): Seconds to wait before each response.
+        fail_rate (float, optional): Share of requests answered with 503.
+        cut_rate (float, optional): Share of responses whose connection is
+            dropped halfway through the body.
+        seed (int, optional): Seed of the failure draws.
+    """
+
+    def __init__(self, file_bytes=256 * 1024, latency=0.0, fail_rate=0.0, cut_rate=0.0, seed=0):
+        self.file_bytes = file_bytes
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.cut_rate = cut_rate
+        self._random = random.Random(seed)
+        self._bodies = {}
+        self._versions = {}
+        self._counts = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def body(self, path):
+        path = unquote(urlsplit(path).path)
+        with self._lock:
+            if path not in self._bodies:
+                self._bodies[path] = make_body(path, self.file_bytes, self._versions.get(path, 0))
+            return self._bodies[path]
+
+    def last_modified(self, path):
+        """Last-Modified of a path: 2025-01-01, plus one day per republication."""
+        path = unquote(urlsplit(path).path)
+        with self._lock:
+            version = self._versions.get(path, 0)
+        return formatdate(PUBLISHED + version * 86400, usegmt=True)
+
+    def republish(self, path):
+        """Replace the file served at a path with a new version."""
+        path = unquote(urlsplit(path).path)
+        with self._lock:
+            self._versions[path] = self._versions.get(path, 0) + 1
+            self._bodies.pop(path, None)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + value
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.fail_rate
+
+    def should_cut(self):
+        with self._lock:
+            return self._random.random() < self.cut_rate
+
+    def enter(self):
+        with self._lock:
+            self._in_flight += 1
+            self._counts["requests"] = self._counts.get("requests", 0) + 1
+            self._counts["max_in_flight"] = max(self._counts.get("max_in_flight", 0), self._in_flight)
+
+    def leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        """Requests, connections, peak concurrent requests and responses per status."""
+        with self._lock:
+            return dict(self._counts)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,286 @@
+"""
+Fixed-grid, memory-mapped store of the regional price-and-demand history.
+
+Dispatch intervals are a regular grid, so the timestamps need not be stored
+at all. This store keeps each measure of a region as a raw float32 array on an
+implicit grid, interval i ending at `start + i * step`, plus a uint8 mask of
+the intervals missing from the source (1 = missing):
+
+    data/store/grid/{region}/grid.json           eras, measures
+    data/store/grid/{region}/{era}_{measure}.f32
+    data/store/grid/{region}/{era}_MISSING.u8
+
+The history has two eras with their own grid: "30min" for the trading
+intervals up to FIVE_MINUTE_SETTLEMENT (1 October 2021) and "5min" after it.
+`Grid.window(..., expand=True)` expands the 30-minute era onto the 5-minute
+grid, each trading interval's value repeated over its six dispatch intervals.
+
+The arrays are opened with `np.memmap`, so an interval is located by
+arithmetic and read without loading the file, and all sessions and processes
+reading a region share one copy of its pages in the OS page cache.
+
+Usage:
+    python -m nem.grid build [--regions QLD1 ...]
+    python -m nem.grid benchmark [--region QLD1]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from nem import store
+
+
+GRID_DIR = "data/store/grid"
+META_NAME = "grid.json"
+
+FIVE_MINUTE_SETTLEMENT = pd.Timestamp("2021-10-01 00:00")   # last 30-minute interval
+ERAS = {"30min": pd.Timedelta(minutes=30), "5min": pd.Timedelta(minutes=5)}
+
+
+def grid_dir(region, root=GRID_DIR):
+    return os.path.join(root, region)
+
+
+def meta_path(region, root=GRID_DIR):
+    return os.path.join(grid_dir(region, root), META_NAME)
+
+
+def _array_path(region, era, name, root):
+    suffix = "u8" if name == "MISSING" else "f32"
+    return os.path.join(grid_dir(region, root), f"{era}_{name}.{suffix}")
+
+
+def _write_array(array, path):
+    array.tofile(path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def build(region, data=None, root=GRID_DIR, store_root=store.STORE_DIR):
+    """
+    Write a region's grids from the store (or from `data`).
+
+    The arrays are written first and `grid.json` last, so a reader that opens
+    the grid sees either the old or the new files.
+
+    Returns:
+        dict: Region, intervals written and, per era, its grid length and
+        missing intervals.
+    """
+    if data is None:
+        data = store.read_price_and_demand(region, columns=store.MEASURES, root=store_root)
+    os.makedirs(grid_dir(region, root), exist_ok=True)
+    times = data["SETTLEMENTDATE"]
+    eras = []
+    for era, step in ERAS.items():
+        rows = data[times <= FIVE_MINUTE_SETTLEMENT] if era == "30min" else data[times > FIVE_MINUTE_SETTLEMENT]
+        if rows.empty:
+            continue
+        start = rows["SETTLEMENTDATE"].iloc[0].ceil(step)
+        positions = ((rows["SETTLEMENTDATE"] - start) // step).to_numpy()
+        on_grid = (rows["SETTLEMENTDATE"] - start) % step == pd.Timedelta(0)
+        positions = positions[on_grid.to_numpy()]
+        length = int(positions.max()) + 1
+        missing = np.ones(length, dtype="uint8")
+        missing[positions] = 0
+        _write_array(missing, _array_path(region, era, "MISSING", root))
+        for measure in store.MEASURES:
+            values = np.full(length, np.nan, dtype="float32")
+            values[positions] = rows.loc[on_grid, measure].to_numpy("float32")
+            _write_array(values, _array_path(region, era, measure, root))
+        eras.append({"era": era, "start": str(start), "step_minutes": int(step / pd.Timedelta(minutes=1)),
+                     "length": length, "missing": int(missing.sum())})
+
+    path = meta_path(region, root)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"region": region, "measures": store.MEASURES, "eras": eras}, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return {"region": region, "intervals": len(data), "eras": eras}
+
+
+class Grid:
+    """
+    Read-only, memory-mapped view of a region's grids.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        root (str, optional): Grid directory.
+    """
+
+    def __init__(self, region, root=GRID_DIR):
+        with open(meta_path(region, root)) as f:
+            meta = json.load(f)
+        self.region = region
+        self.measures = meta["measures"]
+        self.eras = []
+        for era in meta["eras"]:
+            arrays = {name: np.memmap(_array_path(region, era["era"], name, root), mode="r",
+                                      dtype="uint8" if name == "MISSING" else "float32", shape=(era["length"],))
+                      for name in [*self.measures, "MISSING"]}
+            self.eras.append({**era, "start": np.datetime64(pd.Timestamp(era["start"]), "ns"),
+                              "step": np.timedelta64(era["step_minutes"], "m").astype("timedelta64[ns]"),
+                              "arrays": arrays})
+
+    def locate(self, when):
+        """
+        Era and grid position of the interval ending at `when`.
+
+        Returns:
+            tuple or None: (era dict, position), or None if `when` is not on a grid.
+        """
+        when = np.datetime64(pd.Timestamp(when), "ns")
+        for era in self.eras:
+            offset = when - era["start"]
+            position, remainder = divmod(offset, era["step"])
+            if remainder == np.timedelta64(0) and 0 <= position < era["length"]:
+                return era, int(position)
+        return None
+
+    def value(self, measure, when):
+        """A measure at the interval ending at `when`, or NaN if missing or off the grid."""
+        found = self.locate(when)
+        if found is None:
+            return float("nan")
+        era, position = found
+        return float("nan") if era["arrays"]["MISSING"][position] else float(era["arrays"][measure][position])
+
+    def _bounds(self, era, start, end):
+        """Grid positions [low, high) of an era's intervals ending within [start, end]."""
+        low, high = 0, era["length"]
+        if start is not None:
+            offset = np.datetime64(pd.Timestamp(start), "ns") - era["start"]
+            low = min(max(-(-offset // era["step"]), 0), era["length"])
+        if end is not None:
+            offset = np.datetime64(pd.Timestamp(end), "ns") - era["start"]
+            high = min(max(offset // era["step"] + 1, 0), era["length"])
+        return int(low), int(max(low, high))
+
+    def window(self, measure, start=None, end=None, expand=False):
+        """
+        A measure over the intervals ending within [start, end].
+
+        Args:
+            measure (str): "RRP" or "TOTALDEMAND".
+            start (datetime-like, optional): First interval end to include.
+            end (datetime-like, optional): Last interval end to include.
+            expand (bool, optional): Put the 30-minute era on the 5-minute
+                grid, each value repeated over its six dispatch intervals.
+
+        Returns:
+            tuple: (times, values, missing) arrays. Within one era without
+            `expand`, values and missing are views of the mapped files.
+        """
+        parts = []
+        for era in self.eras:
+            step, era_start, length = era["step"], era["start"], era["length"]
+            values, missing = era["arrays"][measure], era["arrays"]["MISSING"]
+            repeat = era["step_minutes"] // 5 if expand else 1
+            if repeat > 1:
+                step = np.timedelta64(5, "m").astype("timedelta64[ns]")
+                era_start = era_start - (repeat - 1) * step
+                length = length * repeat
+            low, high = self._bounds({"start": era_start, "step": step, "length": length}, start, end)
+            if high > low:
+                times = era_start + np.arange(low, high) * step
+                if repeat > 1:
+                    # repeat only the trading intervals overlapping the window
+                    first, last = low // repeat, -(-high // repeat)
+                    trim = slice(low - first * repeat, high - first * repeat)
+                    values = np.repeat(values[first:last], repeat)[trim]
+                    missing = np.repeat(missing[first:last], repeat)[trim]
+                    parts.append((times, values, missing))
+                else:
+                    parts.append((times, values[low:high], missing[low:high]))
+        if not parts:
+            return np.array([], dtype="datetime64[ns]"), np.array([], dtype="float32"), np.array([], dtype="uint8")
+        if len(parts) == 1:
+            return parts[0]
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+    def to_frame(self, start=None, end=None, measures=None, expand=False):
+        """
+        The intervals within [start, end] as a DataFrame of SETTLEMENTDATE and
+        the measures, without the missing intervals.
+        """
+        measures = measures or self.measures
+        columns = {}
+        for measure in measures:
+            times, values, missing = self.window(measure, start, end, expand)
+            columns.setdefault("SETTLEMENTDATE", times)
+            columns[measure] = values
+        present = missing == 0
+        return pd.DataFrame({name: array[present] for name, array in columns.items()})
+
+
+def benchmark(region, start="2022-05-30", end="2022-06-12 23:55", lookups=10_000, repeat=5):
+    """
+    Compare the grid with the Parquet store for a two-week window and random
+    single-interval lookups, after the first read.
+
+    Returns:
+        dict: Best-of-`repeat` seconds of "store_window", "grid_window" and
+        "grid_lookups", the bytes on disk of each and "match", whether both
+        windows hold the same values.
+    """
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - began)
+        return min(timings), result
+
+    year = pd.Timestamp(start).year
+    grid = Grid(region)
+    result = {}
+    result["store_window"], expected = best(lambda: (
+        lambda d: d[(d["SETTLEMENTDATE"] >= start) & (d["SETTLEMENTDATE"] <= end)])(
+        store.read_price_and_demand(region, [year], columns=store.MEASURES)))
+    result["grid_window"], actual = best(lambda: grid.to_frame(start, end))
+
+    era = grid.eras[-1]
+    when = era["start"] + np.random.default_rng(0).integers(0, era["length"], lookups) * era["step"]
+    result["grid_lookups"], _ = best(lambda: [grid.value("RRP", t) for t in when])
+    result["store_bytes"] = sum(os.path.getsize(store.partition_path(region, y))
+                                for y in store.available_years(region))
+    result["grid_bytes"] = sum(os.path.getsize(os.path.join(grid_dir(region), name))
+                               for name in os.listdir(grid_dir(region)))
+    result["match"] = bool(np.allclose(expected[store.MEASURES].to_numpy("float32"),
+                                       actual[store.MEASURES].to_numpy(), equal_nan=True)
+                           and len(expected) == len(actual))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.grid", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="write the grids of each region from the store")
+    build_parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    bench = commands.add_parser("benchmark", help="compare window reads and lookups with the Parquet store")
+    bench.add_argument("--region", default="QLD1")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        for region in args.regions:
+            if not store.available_years(region):
+                print(f"{region}: not in the store, run `python -m nem.store convert` first")
+                continue
+            result = build(region)
+            eras = ", ".join(f"{e['era']} {e['length']} intervals ({e['missing']} missing)" for e in result["eras"])
+            print(f"{region}: {eras}")
+        print(f"Done in {time.perf_counter() - start:.2f}s")
+    elif args.command == "benchmark":
+        result = benchmark(args.region)
+        print(f"{args.region} two-week window: store {result['store_window'] * 1000:.2f}ms, "
+              f"grid {result['grid_window'] * 1000:.3f}ms; same values: {result['match']}")
+        print(f"{args.region} single-interval lookups: {result['grid_lookups'] * 1e6 / 10_000:.2f}us each")
+        print(f"{args.region} on disk: store {result['store_bytes'] / 1e6:.1f} MB, grid {result['grid_bytes'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
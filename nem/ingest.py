@@ -0,0 +1,219 @@
+"""
+Incremental ingest of the monthly price-and-demand files into the store.
+
+The notebook's `concat_files_by_year_and_region` and `concat_files_by_year`
+re-read every `PRICE_AND_DEMAND_{YYYYMM}_{region}.csv` and rewrite the whole
+history whenever a month is added. This step keeps a manifest of the monthly
+files already absorbed:
+
+    data/store/price_and_demand/manifest.json
+
+and on each run parses only the files that are new or changed since (by size
+and modification time). Their intervals are merged into the region-year
+partitions of `nem.store`, de-duplicated on SETTLEMENTDATE with the newest file
+winning, so only the partitions of the affected years are rewritten. The
+`PRICE_STATS_BY_*` files and the Topic 1 profile cube are then refreshed for
+the affected regions and years only, and the new intervals are scored by
+`nem.anomaly.update` and indexed by `nem.events.update`, and the region's
+memory-mapped grid (`nem.grid`) and chart pyramid (`nem.pyramid`) are
+rewritten, as are the Parquet copies (`nem.tables`) of the refreshed files.
+
+Usage:
+    python -m nem.ingest [--src data/aemo_data] [--analysis data/analysis] [--no-refresh]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+from nem import aggregate, anomaly, events, grid, profiles, pyramid, store, tables
+
+
+DATA_DIR = "data/aemo_data"
+MANIFEST_NAME = "manifest.json"
+
+MONTHLY_FILE = re.compile(r"^PRICE_AND_DEMAND_(\d{6})_([A-Z]+\d)\.csv$")
+DATE_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+
+def manifest_path(root=store.STORE_DIR):
+    return os.path.join(root, MANIFEST_NAME)
+
+
+def read_manifest(root=store.STORE_DIR):
+    """
+    Monthly files already ingested, keyed by file name.
+
+    Returns:
+        dict: {file name: {"region", "month", "bytes", "mtime_ns", "rows", "ingested"}}.
+    """
+    path = manifest_path(root)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, root=store.STORE_DIR):
+    os.makedirs(root, exist_ok=True)
+    path = manifest_path(root)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def monthly_files(src=DATA_DIR, regions=store.REGIONS):
+    """
+    Monthly price-and-demand files of a directory.
+
+    Returns:
+        list: (file name, region, month) tuples, sorted by month.
+    """
+    files = []
+    for name in os.listdir(src):
+        match = MONTHLY_FILE.match(name)
+        if match and match.group(2) in regions:
+            files.append((name, match.group(2), match.group(1)))
+    return sorted(files, key=lambda f: (f[2], f[1]))
+
+
+def pending_files(src=DATA_DIR, regions=store.REGIONS, manifest=None, root=store.STORE_DIR):
+    """
+    Monthly files that are new or have changed since they were ingested.
+
+    Returns:
+        list: (file name, region, month, os.stat_result) tuples.
+    """
+    manifest = read_manifest(root) if manifest is None else manifest
+    pending = []
+    for name, region, month in monthly_files(src, regions):
+        stat = os.stat(os.path.join(src, name))
+        entry = manifest.get(name)
+        if entry is None or entry["bytes"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            pending.append((name, region, month, stat))
+    return pending
+
+
+def read_monthly(path):
+    """Read one monthly file with the store's columns."""
+    data = pd.read_csv(path, usecols=["SETTLEMENTDATE", "TOTALDEMAND", "RRP", "PERIODTYPE"])
+    data["SETTLEMENTDATE"] = pd.to_datetime(data["SETTLEMENTDATE"], format=DATE_FORMAT)
+    return data
+
+
+def merge_into_store(region, data, root=store.STORE_DIR):
+    """
+    Merge new intervals into the region's yearly partitions.
+
+    Rows already in the store are replaced by new rows with the same
+    SETTLEMENTDATE. A monthly file can reach into the next year (AEMO's files
+    end at 00:00 of the next month), so the rows are split by year.
+
+    Returns:
+        list: Years whose partitions were rewritten.
+    """
+    stored = set(store.available_years(region, root))
+    years = []
+    for year, rows in data.groupby(data["SETTLEMENTDATE"].dt.year):
+        year = int(year)
+        if year in stored:
+            existing = store.read_price_and_demand(region, [year], root=root)
+            existing["PERIODTYPE"] = existing["PERIODTYPE"].astype(str)
+            rows = pd.concat([existing, rows], ignore_index=True)
+        rows = rows.drop_duplicates("SETTLEMENTDATE", keep="last")
+        store.write_partition(rows, region, year, root)
+        years.append(year)
+    return years
+
+
+def ingest(src=DATA_DIR, regions=store.REGIONS, root=store.STORE_DIR):
+    """
+    Absorb the new and changed monthly files into the store.
+
+    The manifest is written after the partitions, so an interrupted run is
+    simply repeated: merging the same rows again leaves the store unchanged.
+
+    Returns:
+        dict: "files" (names ingested), "rows" (intervals read) and
+        "affected" ({region: sorted years rewritten}).
+    """
+    manifest = read_manifest(root)
+    pending = pending_files(src, regions, manifest, root)
+
+    by_region = {}
+    for name, region, month, stat in pending:
+        by_region.setdefault(region, []).append((name, month, stat))
+
+    affected, rows = {}, 0
+    for region, files in by_region.items():
+        frames = [read_monthly(os.path.join(src, name)) for name, _, _ in files]
+        data = pd.concat(frames, ignore_index=True)
+        rows += len(data)
+        affected[region] = sorted(merge_into_store(region, data, root))
+
+        ingested = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        for (name, month, stat), frame in zip(files, frames):
+            manifest[name] = {"region": region, "month": month, "bytes": stat.st_size,
+                              "mtime_ns": stat.st_mtime_ns, "rows": len(frame), "ingested": ingested}
+        write_manifest(manifest, root)
+
+    return {"files": [name for name, _, _, _ in pending], "rows": rows, "affected": affected}
+
+
+def refresh(affected, analysis=store.CSV_DIR, root=store.STORE_DIR, cube_path=profiles.PROFILE_PATH):
+    """
+    Refresh the `PRICE_STATS_BY_*` files and the profile cube for the affected
+    regions and years only.
+
+    The cube, the anomaly tables, the event index, the grids, the pyramids
+    and the Parquet copies of the rewritten files (`nem.tables`) are
+    refreshed only if they have been built.
+    """
+    for region, years in affected.items():
+        aggregate.refresh_region(region, years, analysis, root=root)
+        if os.path.exists(anomaly.state_path(region)):
+            anomaly.update(region, store_root=root)
+        if region in events.read_state():
+            events.update(region, store_root=root)
+        if os.path.exists(grid.meta_path(region)):
+            grid.build(region, store_root=root)
+            if os.path.exists(pyramid.pyramid_path(region)):
+                pyramid.build(region)
+    if affected and os.path.exists(cube_path):
+        profiles.refresh_cube(affected, cube_path, analysis)
+    for csv_path in tables.csv_files(analysis):
+        if os.path.exists(tables.table_path(csv_path)) and not tables.is_current(csv_path):
+            tables.convert(csv_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.ingest", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--src", default=DATA_DIR, help="directory of PRICE_AND_DEMAND_{YYYYMM}_{region}.csv")
+    parser.add_argument("--root", default=store.STORE_DIR, help="store directory")
+    parser.add_argument("--analysis", default=store.CSV_DIR, help="directory of the PRICE_STATS_BY_* files")
+    parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    parser.add_argument("--no-refresh", action="store_true", help="only update the store")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    result = ingest(args.src, args.regions, args.root)
+    if not result["files"]:
+        print("No new monthly files")
+        return
+    print(f"Ingested {len(result['files'])} files ({result['rows']} intervals) in {time.perf_counter() - start:.2f}s")
+    for region, years in result["affected"].items():
+        print(f"  {region}: {', '.join(map(str, years))}")
+
+    if not args.no_refresh:
+        start = time.perf_counter()
+        refresh(result["affected"], args.analysis, args.root)
+        print(f"Refreshed the price statistics, profiles, anomalies and events in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Unit-by-interval generation matrix with sparse membership matrices.
+
+Topic 3 groups the unit-level table once per chart: by fuel source and date,
+by technology type and date, then again by date for the percentages. Here the
+generation is held as a sparse matrix X with one row per DUID (the `DUID_ID`
+of the unit dimension, see `nem.scada.to_star`) and one column per interval,
+and every grouping of the units is a sparse one-hot membership matrix M with
+one row per group. A roll-up is then a matrix product:
+
+    totals by fuel and interval    M_fuel @ X
+    totals by fuel and day         M_fuel @ X @ B_day
+    shares                         totals / totals.sum(axis=0)
+
+where B_day maps each interval to its day. Memberships are derived from the
+unit dimension (fuel, technology, region, participant, or any other unit
+column or DUID mapping) without re-reading the readings.
+
+The 5-minute matrix of a range of DISPATCH_UNIT_SCADA archives is built
+month-parallel from the zips, like `nem.scada`, and stored as
+
+    data/store/scada/DISPATCH_UNIT_SCADA_{span}_matrix.npz
+    data/store/scada/DISPATCH_UNIT_SCADA_{span}_matrix_units.parquet
+
+Usage:
+    python -m nem.matrix build 202401 202412 [--workers 4]
+    python -m nem.matrix benchmark [--span 202501] [--months 1 12 36]
+
+`UnitMatrix.region_mixes` precomputes the (region, group, date) roll-up behind
+Topic 3's region selector, including the NEM-wide "ALL".
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from nem import scada
+from nem.mms import CHUNK_BYTES, iter_mms_chunks
+
+
+FREQ = "5min"
+
+MEMBERSHIPS = {**scada.DIMENSIONS, "participant": "Participant"}
+
+
+def matrix_paths(span, root=scada.STAR_DIR):
+    """Matrix and unit files of a month span, e.g. "202501" or "202401_202412" (`nem.scada.span_name`)."""
+    return (os.path.join(root, f"{scada.TABLE}_{span}_matrix.npz"),
+            os.path.join(root, f"{scada.TABLE}_{span}_matrix_units.parquet"))
+
+
+def membership(units, by):
+    """
+    One-hot membership of the units in groups.
+
+    Args:
+        units (pd.DataFrame): Unit dimension, one row per DUID_ID.
+        by (str or pd.Series): A MEMBERSHIPS key, a unit column, or a Series
+            mapping DUID to group. Units without a group belong to none.
+
+    Returns:
+        tuple: (labels, matrix), the sorted group labels and a sparse
+        (groups x units) matrix of ones.
+    """
+    if isinstance(by, pd.Series):
+        groups = units["DUID"].map(by)
+    else:
+        groups = units[MEMBERSHIPS.get(by, by)]
+    codes, labels = pd.factorize(groups.astype(object), sort=True)
+    members = np.flatnonzero(codes >= 0)
+    matrix = sparse.csr_matrix((np.ones(len(members)), (codes[members], members)), shape=(len(labels), len(units)))
+    return pd.Index(labels), matrix
+
+
+def time_bins(times, freq):
+    """
+    Map intervals to coarser periods, e.g. "D" or "30min".
+
+    Each interval falls in the period containing its timestamp, floored. The
+    times are interval ends (SETTLEMENTDATE), so the interval ending at
+    midnight falls in the next day, as in the DATE of the daily table, which
+    normalises SETTLEMENTDATE the same way.
+
+    Returns:
+        tuple: (periods, matrix), a DatetimeIndex and a sparse (intervals x
+        periods) matrix of ones.
+    """
+    periods, codes = np.unique(pd.DatetimeIndex(times).floor(freq), return_inverse=True)
+    matrix = sparse.csr_matrix((np.ones(len(times)), (np.arange(len(times)), codes)),
+                               shape=(len(times), len(periods)))
+    return pd.DatetimeIndex(periods), matrix
+
+
+class UnitMatrix:
+    """
+    Generation of each unit in each interval, as a sparse (units x times)
+    float32 matrix.
+
+    Args:
+        values (scipy.sparse matrix): Row i belongs to the unit with DUID_ID i.
+        units (pd.DataFrame): Unit dimension (`nem.scada.unit_dimension`).
+        times (array-like): Timestamp of each column.
+        time_column (str, optional): Name of the time column of roll-ups.
+    """
+
+    def __init__(self, values, units, times, time_column="SETTLEMENTDATE"):
+        self.values = sparse.csr_matrix(values, dtype="float32")
+        self.units = units
+        self.times = pd.DatetimeIndex(times)
+        self.time_column = time_column
+        self._memberships = {}
+
+    @classmethod
+    def from_fact(cls, fact, units, time_column="DATE", value_column="SCADAVALUE_sum"):
+        """Matrix of a star fact table, e.g. the daily DUID sums."""
+        times, columns = np.unique(fact[time_column].to_numpy(), return_inverse=True)
+        values = sparse.csr_matrix(
+            (fact[value_column].to_numpy("float64"), (fact["DUID_ID"].to_numpy(), columns)),
+            shape=(len(units), len(times)),
+        )
+        return cls(values, units, times, time_column)
+
+    @property
+    def nbytes(self):
+        return (self.values.data.nbytes + self.values.indices.nbytes + self.values.indptr.nbytes
+                + int(self.units.memory_usage(deep=True).sum()) + self.times.nbytes)
+
+    def membership(self, by):
+        """Cached `membership` of the units; Series mappings are not cached."""
+        if isinstance(by, pd.Series):
+            return membership(self.units, by)
+        if by not in self._memberships:
+            self._memberships[by] = membership(self.units, by)
+        return self._memberships[by]
+
+    def rollup(self, by=None, freq=None, percent=False, where=None):
+        """
+        Generation per group and time, as one sparse product.
+
+        Args:
+            by (str or pd.Series, optional): Grouping, see `membership`.
+                Defaults to the total of all units.
+            freq (str, optional): Period to sum the intervals to, e.g. "D".
+            percent (bool, optional): Shares of the total of all groups at each
+                time, in percent, instead of totals.
+            where (array-like, optional): Boolean mask of the units to include,
+                e.g. `matrix.units["Region"] == "QLD1"`. Groups without any of
+                these units are left out.
+
+        Returns:
+            pd.DataFrame: One row per time and one column per group.
+        """
+        if by is None:
+            labels, product = pd.Index(["Total"]), sparse.csr_matrix(np.ones((1, self.values.shape[0])))
+        else:
+            labels, product = self.membership(by)
+        if where is not None:
+            product = product.multiply(np.asarray(where, dtype="float64")[np.newaxis, :]).tocsr()
+            product.eliminate_zeros()
+            present = np.flatnonzero(product.getnnz(axis=1))
+            labels, product = labels[present], product[present]
+        product = product @ self.values
+        times = self.times
+        if freq is not None:
+            times, bins = time_bins(times, freq)
+            product = product @ bins
+        totals = product.toarray()
+        if percent:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                totals = totals / totals.sum(axis=0) * 100
+        return pd.DataFrame(totals.T, index=times.rename(self._time_name(freq)), columns=labels)
+
+    def mix(self, by, freq=None, percent=False, where=None):
+        """
+        Long-format roll-up for charts: the group column, the time column and
+        SCADAVALUE_sum, plus Total and Percent with `percent`.
+
+        Every group has a row at every time (zero when none of its units ran),
+        so stacked areas do not interpolate across gaps.
+        """
+        column = by.name if isinstance(by, pd.Series) else MEMBERSHIPS.get(by, by)
+        wide = self.rollup(by, freq, where=where)
+        n_times, n_groups = wide.shape
+        mix = {
+            column: np.repeat(wide.columns.to_numpy(), n_times),
+            wide.index.name: np.tile(wide.index.to_numpy(), n_groups),
+            "SCADAVALUE_sum": wide.to_numpy().T.ravel(),
+        }
+        if percent:
+            mix["Total"] = np.tile(wide.to_numpy().sum(axis=1), n_groups)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mix["Percent"] = mix["SCADAVALUE_sum"] / mix["Total"] * 100
+        return pd.DataFrame(mix)
+
+    def region_mixes(self, by, freq="D"):
+        """
+        `mix` of every region and of the whole NEM, with Total and Percent.
+
+        Computed once, so a region selector only picks a ready frame: "ALL"
+        is the NEM-wide roll-up, not a sum of the regions at request time.
+
+        Returns:
+            dict: {"ALL" or region: long-format mix}.
+        """
+        mixes = {"ALL": self.mix(by, freq, percent=True)}
+        regions = self.units[MEMBERSHIPS["region"]]
+        for region in sorted(regions.dropna().unique()):
+            mixes[region] = self.mix(by, freq, percent=True, where=(regions == region).to_numpy())
+        return mixes
+
+    def resample(self, freq):
+        """A matrix of the same units summed to a coarser period."""
+        times, bins = time_bins(self.times, freq)
+        return UnitMatrix(self.values @ bins, self.units, times, self._time_name(freq))
+
+    def _time_name(self, freq):
+        return "DATE" if freq == "D" else self.time_column
+
+    def save(self, span, root=scada.STAR_DIR):
+        """Write the matrix and its unit dimension, atomically."""
+        os.makedirs(root, exist_ok=True)
+        matrix_path, units_path = matrix_paths(span, root)
+        tmp_path = matrix_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, data=self.values.data, indices=self.values.indices, indptr=self.values.indptr,
+                     shape=np.array(self.values.shape), times=self.times.asi8,
+                     time_column=np.array(self.time_column))
+        os.replace(tmp_path, matrix_path)
+        self.units.to_parquet(units_path + ".tmp", index=False)
+        os.replace(units_path + ".tmp", units_path)
+        return matrix_path, units_path
+
+    @classmethod
+    def load(cls, span, root=scada.STAR_DIR):
+        matrix_path, units_path = matrix_paths(span, root)
+        with np.load(matrix_path) as f:
+            values = sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+            times, time_column = pd.to_datetime(f["times"]), str(f["time_column"])
+        return cls(values, pd.read_parquet(units_path), times, time_column)
+
+
+def reduce_month(path, duids, origin, n_times, freq=FREQ, chunk_bytes=CHUNK_BYTES):
+    """
+    Sparse (units x intervals) sums of the positive readings of one archive.
+
+    Args:
+        duids (pd.Index): DUID of each matrix row. Other units are dropped.
+        origin (pd.Timestamp): Start of the first interval of the span; column
+            k holds the interval ending at origin + (k + 1) * freq.
+        n_times (int): Intervals in the span.
+    """
+    step = pd.Timedelta(freq)
+    rows, columns, values = [], [], []
+    for _, chunk in iter_mms_chunks(path, tables=[scada.TABLE], usecols=["SETTLEMENTDATE", "DUID", "SCADAVALUE"],
+                                    chunk_bytes=chunk_bytes):
+        chunk = chunk[chunk["SCADAVALUE"] > 0]
+        row = duids.get_indexer(chunk["DUID"])
+        column = ((chunk["SETTLEMENTDATE"] - origin) // step).to_numpy() - 1
+        keep = (row >= 0) & (column >= 0) & (column < n_times)
+        rows.append(row[keep])
+        columns.append(column[keep])
+        values.append(chunk["SCADAVALUE"].to_numpy()[keep])
+    if not rows:
+        return sparse.csr_matrix((len(duids), n_times))
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                             shape=(len(duids), n_times))
+
+
+def build_matrix(months, data_dir=scada.DATA_DIR, registration_path=scada.REGISTRATION_PATH, freq=FREQ,
+                 workers=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Build the 5-minute unit matrix of a range of monthly archives.
+
+    Rows are the generating and bidirectional units of the registration list,
+    as in `nem.scada.build_fuel_mix`. Months without a downloaded archive are
+    skipped but keep their (empty) columns.
+
+    Returns:
+        UnitMatrix or None: None if no archive was found.
+    """
+    registration = scada.read_registration(registration_path)
+    units = scada.unit_dimension(registration[registration["Dispatch Type"].isin(scada.GENERATING_TYPES)])
+    paths = [scada.archive_path(m, data_dir) for m in months]
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+
+    origin = pd.Timestamp(f"{months[0][:4]}-{months[0][4:]}-01")
+    times = pd.date_range(origin, pd.Timestamp(f"{months[-1][:4]}-{months[-1][4:]}-01") + pd.offsets.MonthBegin(),
+                          freq=freq)[1:]
+    duids = pd.Index(units["DUID"])
+    args = [duids, origin, len(times), freq, chunk_bytes]
+
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers == 1:
+        partials = [reduce_month(p, *args) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(reduce_month, paths, *[[a] * len(paths) for a in args]))
+    return UnitMatrix(sum(partials[1:], partials[0]), units, times)
+
+
+def benchmark(span="202501", src=scada.ANALYSIS_DIR, repeat=20):
+    """
+    Time Topic 3's four charts (fuel and technology, totals and percent) with
+    the pandas groupbys on the wide daily table and with matrix products.
+
+    Returns:
+        dict: Milliseconds per set of four charts for "groupby" and "matrix",
+        and for "membership" of a new dimension (participant).
+    """
+    daily = pd.read_csv(os.path.join(src, f"{scada.TABLE}_{span}_daily.csv"), parse_dates=["DATE"])
+    matrix = UnitMatrix.from_fact(*scada.to_star(daily))
+    columns = [scada.DIMENSIONS["fuel"], scada.DIMENSIONS["technology"]]
+
+    def groupby():
+        for column in columns:
+            mix = daily.groupby([column, "DATE"]).agg({"SCADAVALUE_sum": "sum"}).reset_index()
+            mix["Total"] = mix.groupby("DATE")["SCADAVALUE_sum"].transform("sum")
+            mix["Percent"] = mix["SCADAVALUE_sum"] / mix["Total"] * 100
+
+    def products():
+        for column in columns:
+            matrix.mix(column, percent=True)
+
+    def timed(function):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    results = {"groupby": timed(groupby), "matrix": timed(products)}
+    start = time.perf_counter()
+    membership(matrix.units, "participant")
+    results["membership"] = (time.perf_counter() - start) * 1000
+    return results
+
+
+def region_benchmark(span="202501", src=scada.ANALYSIS_DIR, months=(1, 12, 36), repeat=20):
+    """
+    Time switching Topic 3's region as the SCADA history grows.
+
+    The month of daily DUID sums is repeated `months` times (shifted by a
+    month each time) to stand in for longer histories. For each length, a
+    region switch is timed as a re-aggregation of the wide unit-level table
+    (filter, groupby, percentages) and as a lookup in `region_mixes`.
+
+    Returns:
+        list: One dict per length with "months", "rows", "build" (seconds to
+        precompute the mixes) and "groupby" / "lookup" (ms per switch).
+    """
+    daily = pd.read_csv(os.path.join(src, f"{scada.TABLE}_{span}_daily.csv"), parse_dates=["DATE"])
+    column = scada.DIMENSIONS["fuel"]
+    regions = ["ALL", *sorted(daily["Region"].dropna().unique())]
+    results = []
+    for n in months:
+        wide = pd.concat([daily.assign(DATE=daily["DATE"] + pd.DateOffset(months=k)) for k in range(n)],
+                         ignore_index=True)
+
+        start = time.perf_counter()
+        mixes = UnitMatrix.from_fact(*scada.to_star(wide)).region_mixes("fuel")
+        build = time.perf_counter() - start
+
+        def groupby(region):
+            data = wide if region == "ALL" else wide[wide["Region"] == region]
+            mix = data.groupby([column, "DATE"]).agg({"SCADAVALUE_sum": "sum"}).reset_index()
+            mix["Total"] = mix.groupby("DATE")["SCADAVALUE_sum"].transform("sum")
+            mix["Percent"] = mix["SCADAVALUE_sum"] / mix["Total"] * 100
+
+        def timed(function):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for region in regions:
+                    function(region)
+            return (time.perf_counter() - start) / repeat / len(regions) * 1000
+
+        results.append({"months": n, "rows": len(wide), "build": build, "groupby": timed(groupby),
+                        "lookup": timed(lambda region: mixes[region].copy(deep=False))})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.matrix", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the 5-minute unit matrix of a range of months")
+    build.add_argument("start", help="first month, YYYYMM")
+    build.add_argument("end", help="last month, YYYYMM")
+    build.add_argument("--data-dir", default=scada.DATA_DIR)
+    build.add_argument("--root", default=scada.STAR_DIR)
+    build.add_argument("--workers", type=int, default=None)
+    bench = commands.add_parser("benchmark", help="compare Topic 3's groupbys with matrix products")
+    bench.add_argument("--span", default="202501")
+    bench.add_argument("--months", nargs="+", type=int, default=[1, 12, 36],
+                       help="history lengths, in repeats of the span, for the region switch timings")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        months = scada.month_range(args.start, args.end)
+        matrix = build_matrix(months, args.data_dir, workers=args.workers)
+        if matrix is None:
+            print(f"No {scada.TABLE} archives found in {args.data_dir}")
+            return
+        for path in matrix.save(scada.span_name(months), args.root):
+            print(f"Saved to {path}")
+        print(f"{matrix.values.shape[0]} units x {matrix.values.shape[1]} intervals, {matrix.values.nnz} readings, "
+              f"{matrix.nbytes / 1e6:.1f} MB, in {time.perf_counter() - start:.2f}s")
+    elif args.command == "benchmark":
+        results = benchmark(args.span)
+        print(f"Topic 3 mixes: groupby {results['groupby']:.2f} ms, matrix {results['matrix']:.2f} ms; "
+              f"new participant membership {results['membership']:.2f} ms")
+        for row in region_benchmark(args.span, months=args.months):
+            print(f"Region switch, {row['months']:>3} months ({row['rows']:,} rows): "
+                  f"groupby {row['groupby']:.2f} ms, lookup {row['lookup']:.3f} ms "
+                  f"(mixes precomputed in {row['build']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Streaming reader for AEMO MMS Data Model CSV files, read directly from the zip.
+
+MMS files mix three kinds of rows:
+
+    C,NEMP.WORLD,DVD_DISPATCH_UNIT_SCADA,AEMO,PUBLIC,2025/02/05,...   comment
+    I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE,LASTCHANGED  header
+    D,DISPATCH,UNIT_SCADA,1,"2025/01/01 00:05:00",AGLHAL,0,"2025/..."   data
+    ...
+    C,"END OF REPORT",12345                                             footer
+
+and a file may contain several tables, each starting with its own I row.
+`pd.read_csv(..., skiprows=1, skipfooter=1, engine='python')` only handles a
+single table and forces the slow pure-Python parser. `iter_mms_chunks` instead
+decompresses the zip member as a stream, cuts it into blocks of whole lines,
+locates the C and I rows with a byte-level scan and hands each run of D rows to
+the C parser with the table's dtype map. Nothing is extracted to disk and only
+one block is held in memory at a time.
+
+Tables are named `{I row field 2}_{I row field 3}`, e.g. DISPATCH_UNIT_SCADA.
+"""
+
+import contextlib
+import csv
+import io
+import zipfile
+
+import pandas as pd
+
+
+CHUNK_BYTES = 32 * 1024 * 1024
+
+MMS_DATE_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+# Column types of the tables used by the dashboard. Columns not listed are
+# inferred by the parser; columns ending with DATE, TIME or LASTCHANGED are
+# parsed as datetimes.
+TABLE_DTYPES = {
+    "DISPATCH_UNIT_SCADA": {"DUID": "str", "SCADAVALUE": "float64"},
+    "DISPATCH_PRICE": {"REGIONID": "str", "RUNNO": "int16", "INTERVENTION": "int8", "RRP": "float64"},
+    "DISPATCH_REGIONSUM": {"REGIONID": "str", "RUNNO": "int16", "INTERVENTION": "int8",
+                           "TOTALDEMAND": "float64"},
+    "DISPATCH_INTERCONNECTORRES": {"INTERCONNECTORID": "str", "RUNNO": "int16", "INTERVENTION": "int8",
+                                   "MWFLOW": "float64", "MWLOSSES": "float64"},
+    "NETWORK_OUTAGEDETAIL": {"OUTAGEID": "str", "SUBSTATIONID": "str", "EQUIPMENTTYPE": "str",
+                             "EQUIPMENTID": "str", "OUTAGESTATUSCODE": "str", "REASON": "str"},
+}
+
+
+
+def is_date_column(column):
+    return column.endswith(("DATE", "TIME", "LASTCHANGED"))
+
+
+@contextlib.contextmanager
+def open_mms_csv(path):
+    """
+    Open the CSV member of an MMS zip as a binary stream.
+
+    Plain CSV files are opened as they are, so already extracted files can be
+    read the same way.
+    """
+    if not zipfile.is_zipfile(path):
+        with open(path, "rb") as stream:
+            yield stream
+        return
+    with zipfile.ZipFile(path) as archive:
+        members = [name for name in archive.namelist() if name.upper().endswith(".CSV")]
+        if len(members) != 1:
+            raise ValueError(f"Expected one CSV file in {path}, found {len(members)}")
+        with archive.open(members[0]) as stream:
+            yield stream
+
+
+def _iter_blocks(stream, chunk_bytes):
+    """Yield blocks of whole lines from a binary stream."""
+    pending = b""
+    while True:
+        data = stream.read(chunk_bytes)
+        if not data:
+            break
+        data = pending + data
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            pending = data
+            continue
+        pending = data[end:]
+        yield data[:end]
+    if pending.strip():
+        yield pending + b"\n"
+
+
+def _marker_rows(block):
+    """Start offsets of the C and I rows of a block, found with bytes.find."""
+    offsets = [0] if block[:2] in (b"C,", b"I,") else []
+    for marker in (b"\nC,", b"\nI,"):
+        position = block.find(marker)
+        while position != -1:
+            offsets.append(position + 1)
+            position = block.find(marker, position + 1)
+    return sorted(offsets)
+
+
+def _parse_rows(segment, columns, dtypes, usecols):
+    names = ["_ROW", "_REPORT", "_SUBREPORT", "_VERSION"] + columns
+    usecols = [c for c in (usecols or columns) if c in columns]
+    dates = [c for c in usecols if is_date_column(c) and c not in dtypes]
+    data = pd.read_csv(
+        io.BytesIO(segment),
+        header=None,
+        names=names,
+        index_col=False,
+        usecols=usecols,
+        dtype={c: t for c, t in dtypes.items() if c in usecols} | {c: "str" for c in dates},
+        engine="c",
+        low_memory=False,
+    )
+    for column in dates:
+        data[column] = pd.to_datetime(data[column], format=MMS_DATE_FORMAT)
+    return data[usecols]
+
+
+def iter_mms_chunks(path, tables=None, usecols=None, dtypes=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Stream typed DataFrame chunks out of an MMS zip (or CSV) file.
+
+    Args:
+        path (str): Path to the zip (or an extracted CSV).
+        tables (iterable, optional): Table names to read. Rows of other tables
+            are skipped without being parsed. Defaults to every table.
+        usecols (list, optional): Columns to keep. Defaults to every column.
+        dtypes (dict, optional): Per-table dtype maps, merged over TABLE_DTYPES.
+        chunk_bytes (int, optional): Uncompressed bytes per block. Each block
+            yields at most one chunk per table it contains.
+
+    Yields:
+        tuple: (table name, pd.DataFrame chunk).
+    """
+    tables = set(tables) if tables else None
+    dtypes = {**TABLE_DTYPES, **(dtypes or {})}
+    table, columns = None, None
+
+    with open_mms_csv(path) as stream:
+        for block in _iter_blocks(stream, chunk_bytes):
+            start = 0
+            for offset in _marker_rows(block):
+                if offset > start and columns is not None and (tables is None or table in tables):
+                    yield table, _parse_rows(block[start:offset], columns, dtypes.get(table, {}), usecols)
+                end = block.find(b"\n", offset) + 1
+                row = next(csv.reader([block[offset:end].decode().strip()]))
+                if row[0] == "I":
+                    table, columns = f"{row[1]}_{row[2]}", row[4:]
+                start = end
+            if start < len(block) and columns is not None and (tables is None or table in tables):
+                yield table, _parse_rows(block[start:], columns, dtypes.get(table, {}), usecols)
+
+
+def read_mms_table(path, table=None, usecols=None, dtypes=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Read one table of an MMS file into a single DataFrame.
+
+    Args:
+        table (str, optional): Table name. Defaults to the first table found.
+
+    Returns:
+        pd.DataFrame: Every row of the table.
+    """
+    frames = []
+    for name, chunk in iter_mms_chunks(path, [table] if table else None, usecols, dtypes, chunk_bytes):
+        if table is None:
+            table = name
+        if name == table:
+            frames.append(chunk)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=usecols)
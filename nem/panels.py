@@ -0,0 +1,108 @@
+"""
+Fragment-scoped panels for the dashboard pages.
+
+Streamlit reruns the whole page script on every widget change, and runs the
+body of every `st.tabs` tab on each run, visible or not. A page is instead
+split into panels:
+
+- `panel` turns a function drawing one chart panel, with its own inputs,
+  into an `st.fragment`: a change to one of its widgets reruns that function
+  only. It also records the CPU time of each run of the panel in
+  `st.session_state[PANEL_TIMES]`.
+- `lazy_tabs` is a row of tab-like radio buttons returning the selected label,
+  so a panel computes only the tab that is shown.
+
+Inputs shared by several panels (the region, the year) stay outside them and
+rerun the page as before.
+
+`python -m nem.panels benchmark` runs each page once to warm the caches, then
+reports the CPU time of a whole-page run, which every interaction cost before,
+and of each panel run, which is what an interaction within a panel costs now.
+
+Usage:
+    python -m nem.panels benchmark [pages ...]
+"""
+
+import argparse
+import functools
+import time
+
+import streamlit as st
+
+
+PANEL_TIMES = "panel-times"
+
+PAGES = [
+    "topics/Topic-1-Price-Anomaly-Detection.py",
+    "topics/Topic-2-Outage-Analysis.py",
+    "topics/Topic-3-Renewable-Integration.py",
+]
+
+
+def panel(function):
+    """
+    Run `function` as an `st.fragment`, recording the CPU seconds of its
+    last run in `st.session_state[PANEL_TIMES][function name]`.
+    """
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.thread_time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            st.session_state.setdefault(PANEL_TIMES, {})[function.__name__] = time.thread_time() - start
+
+    return st.fragment(timed)
+
+
+def lazy_tabs(labels, key):
+    """
+    Tab-like radio buttons: only the body of the returned label need run.
+
+    Args:
+        labels (list): Tab labels.
+        key (str): Widget key.
+
+    Returns:
+        str: The selected label.
+    """
+    return st.radio("Tab", labels, horizontal=True, key=key, label_visibility="collapsed")
+
+
+def benchmark(pages=PAGES, timeout=120):
+    """
+    CPU time of a whole-page run and of each of its panels, with warm caches.
+
+    Returns:
+        dict: {page: {"page": seconds of the whole run, "panels": {name: seconds}}}.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for page in pages:
+        AppTest.from_file(page, default_timeout=timeout).run()
+        app = AppTest.from_file(page, default_timeout=timeout)
+        start = time.process_time()
+        app.run()
+        elapsed = time.process_time() - start
+        panels = app.session_state[PANEL_TIMES] if PANEL_TIMES in app.session_state else {}
+        results[page] = {"page": elapsed, "panels": dict(panels)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.panels", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="CPU time of a page run and of each panel run")
+    bench.add_argument("pages", nargs="*", default=PAGES)
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        for page, result in benchmark(args.pages).items():
+            print(f"{page}: whole page {result['page'] * 1000:.0f}ms CPU")
+            for name, seconds in result["panels"].items():
+                print(f"  {name}: {seconds * 1000:.0f}ms CPU")
+
+
+if __name__ == "__main__":
+    main()
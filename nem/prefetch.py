@@ -0,0 +1,148 @@
+"""
+Speculative prefetch of the Topic 1 selections a reader is likely to pick next.
+
+Readers of Topic 1 step through the regions and years one after another, and
+each step blocks on the first read of the new region's tables. After a
+selection is drawn, `prefetch` runs the reads of its neighbouring selections
+(`neighbours`: the adjacent years of the region, then the other regions in the
+same year) on a shared pool of PREFETCH_WORKERS threads (`NEM_PREFETCH_WORKERS`),
+filling the process-wide `dataset_cache`. The page script does not wait for
+them. A read the page then needs while it is being prefetched waits for that
+read instead of parsing the file a second time.
+
+A prefetch is a guess, so it gives way:
+
+- no read starts while `dataset_cache` holds PREFETCH_MAX_BYTES or more
+  (`NEM_PREFETCH_MAX_BYTES`, default half of the cache budget), so prefetched
+  tables never evict the ones being shown;
+- a new selection cancels the session's prefetches that have not started;
+- the reads of a session that has ended are cancelled, or skipped if already
+  queued.
+
+`python -m nem.prefetch benchmark` times the reads of each neighbour of a
+selection from an empty cache and after the selection's prefetch.
+
+Usage:
+    python -m nem.prefetch benchmark [--region QLD1] [--year 2023]
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from nem import store, warmup
+from nem.cache import dataset_cache
+
+
+PREFETCH_WORKERS = int(os.environ.get("NEM_PREFETCH_WORKERS", 2))
+PREFETCH_MAX_BYTES = int(os.environ.get("NEM_PREFETCH_MAX_BYTES", dataset_cache.max_bytes // 2))
+
+YEARS = list(range(2022, 2025))
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="nem-prefetch")
+_pending = {}   # session id -> futures of its last prefetch
+_lock = threading.Lock()
+
+
+def neighbours(region, year, regions=store.REGIONS, years=YEARS):
+    """The adjacent years of `region`, then the other regions in `year`, as (region, year) pairs."""
+    near = [(region, other) for other in (year + 1, year - 1) if other in years]
+    return near + [(other, year) for other in regions if other != region]
+
+
+def _session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def _session_active(session_id):
+    """Whether a session is still connected (always, outside a Streamlit server)."""
+    from streamlit import runtime
+
+    if session_id is None or not runtime.exists():
+        return True
+    return runtime.get_instance().is_active_session(session_id)
+
+
+def _run(session_id, reads, max_bytes):
+    """Run `reads` while the session is active and the cache is under `max_bytes`."""
+    for _, call in reads:
+        if not _session_active(session_id) or dataset_cache.stats()["bytes"] >= max_bytes:
+            return
+        try:
+            call()
+        except Exception:
+            pass   # the page reports the error if the selection is made
+
+
+def prefetch(region, year, regions=store.REGIONS, years=YEARS, max_bytes=PREFETCH_MAX_BYTES):
+    """
+    Queue the reads of the neighbours of a selection, replacing the session's
+    earlier prefetch.
+
+    Args:
+        region (str): Selected region.
+        year (int): Selected year.
+        regions (list, optional): Regions the page offers.
+        years (list, optional): Years the page offers.
+        max_bytes (int, optional): Cache size at which reads stop starting.
+
+    Returns:
+        list: The futures of the neighbours, in `neighbours` order.
+    """
+    session_id = _session_id()
+    with _lock:
+        for other in [other for other in _pending if other == session_id or not _session_active(other)]:
+            for future in _pending.pop(other):
+                future.cancel()
+        futures = [_executor.submit(_run, session_id, warmup.selection_reads(*selection), max_bytes)
+                   for selection in neighbours(region, year, regions, years)]
+        _pending[session_id] = futures
+    return futures
+
+
+def benchmark(region="QLD1", year=2023):
+    """
+    Seconds of the reads of each neighbour of a selection from an empty cache
+    and once the selection's prefetch has finished.
+
+    Returns:
+        dict: {(region, year): (cold seconds, prefetched seconds)}.
+    """
+    def timed(selection):
+        start = time.perf_counter()
+        for _, call in warmup.selection_reads(*selection):
+            call()
+        return time.perf_counter() - start
+
+    results = {}
+    for selection in neighbours(region, year):
+        dataset_cache.clear()
+        timed((region, year))
+        cold = timed(selection)
+        dataset_cache.clear()
+        timed((region, year))
+        wait(prefetch(region, year))
+        results[selection] = (cold, timed(selection))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.prefetch", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="time the neighbours of a selection with and without prefetch")
+    bench.add_argument("--region", default="QLD1")
+    bench.add_argument("--year", type=int, default=2023)
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        for (region, year), (cold, prefetched) in benchmark(args.region, args.year).items():
+            print(f"{region} {year}: {cold * 1000:.1f}ms cold, {prefetched * 1000:.1f}ms after prefetch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Precomputed intra-day price and demand profiles for Topic 1.
+
+The "1 Hour" and "Dispatch" tabs of Topic 1 show, for one region and year, the
+mean, median, min and max of RRP and TOTALDEMAND at each hour (or each dispatch
+interval) of the day. Instead of grouping a year of data on every rerun, the
+profiles of every region and year are materialised once into a small cube:
+
+    data/store/profiles.parquet
+
+with one row per (GRANULARITY, REGION, YEAR, HOUR, MINUTE) and one column per
+measure and statistic. Switching region, year or statistic is then a lookup.
+
+Usage:
+    python -m nem.profiles build     # rebuild the cube from the current data
+    python -m nem.profiles check     # compare the cube with on-the-fly results
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from nem import store
+
+
+PROFILE_PATH = "data/store/profiles.parquet"
+
+GRANULARITIES = ["hour", "dispatch"]
+KEYS = {"hour": ["HOUR"], "dispatch": ["HOUR", "MINUTE"]}
+STATISTICS = ["mean", "median", "min", "max"]
+STAT_COLUMNS = [f"{m}_{s}" for m in ["RRP", "TOTALDEMAND"] for s in STATISTICS]
+
+
+def hour_stats_path(region, src=store.CSV_DIR):
+    return os.path.join(src, f"PRICE_STATS_BY_HOUR_{region}.csv")
+
+
+def hourly_profile(stats_by_hour):
+    """
+    Hour-of-day profile from `PRICE_STATS_BY_HOUR_{region}.csv` rows of one year.
+
+    Each statistic is aggregated with itself over the hourly buckets (mean of
+    the hourly means, median of the hourly medians, and so on).
+
+    Returns:
+        pd.DataFrame: HOUR and the eight statistic columns, rounded to 2 d.p.
+    """
+    return stats_by_hour.groupby(['HOUR']).agg(
+        {column: column.split('_')[1] for column in STAT_COLUMNS}
+    ).round(2).reset_index()
+
+
+def dispatch_profile(intervals):
+    """
+    Dispatch-interval profile from the 5-minute intervals of one year.
+
+    Returns:
+        pd.DataFrame: HOUR, MINUTE and the eight statistic columns, rounded to
+        2 d.p.
+    """
+    return intervals.groupby(['HOUR', 'MINUTE']).agg(
+        **{column: tuple(column.split('_')) for column in STAT_COLUMNS}
+    ).round(2).reset_index()
+
+
+def _read_hour_stats(region, src, years=None):
+    data = pd.read_csv(hour_stats_path(region, src), usecols=['YEAR', 'HOUR'] + STAT_COLUMNS)
+    return data if years is None else data[data['YEAR'].isin(years)]
+
+
+def _read_intervals(region, src, years=None):
+    if store.available_years(region):
+        return store.read_price_and_demand(region, years, columns=store.MEASURES, calendar=['YEAR', 'HOUR', 'MINUTE'])
+    data = pd.read_csv(store.csv_path(region, src), usecols=['YEAR', 'HOUR', 'MINUTE'] + store.MEASURES)
+    return data if years is None else data[data['YEAR'].isin(years)]
+
+
+def _profiles(region, src, years=None):
+    """Yield (granularity, year, profile) for every source file of a region."""
+    if os.path.exists(hour_stats_path(region, src)):
+        data = _read_hour_stats(region, src, years)
+        for year, group in data.groupby('YEAR'):
+            yield "hour", int(year), hourly_profile(group)
+    if store.available_years(region) or os.path.exists(store.csv_path(region, src)):
+        data = _read_intervals(region, src, years)
+        for year, group in data.groupby('YEAR'):
+            yield "dispatch", int(year), dispatch_profile(group)
+
+
+def _typed(cube):
+    cube = cube.astype({'GRANULARITY': 'category', 'REGION': 'category', 'YEAR': 'int16',
+                        'HOUR': 'int8', 'MINUTE': 'int8'})
+    return cube.sort_values(['GRANULARITY', 'REGION', 'YEAR', 'HOUR', 'MINUTE'], ignore_index=True)
+
+
+def build_cube(regions=store.REGIONS, src=store.CSV_DIR, years=None):
+    """
+    Compute the profiles of every region, year and granularity.
+
+    Args:
+        years (iterable, optional): Only compute these years.
+
+    Returns:
+        pd.DataFrame: The cube, sorted by GRANULARITY, REGION, YEAR, HOUR, MINUTE.
+    """
+    frames = []
+    for region in regions:
+        for granularity, year, profile in _profiles(region, src, years):
+            if 'MINUTE' not in profile:
+                profile.insert(1, 'MINUTE', 0)
+            profile.insert(0, 'YEAR', year)
+            profile.insert(0, 'REGION', region)
+            profile.insert(0, 'GRANULARITY', granularity)
+            frames.append(profile)
+
+    if not frames:
+        return _typed(pd.DataFrame(columns=['GRANULARITY', 'REGION', 'YEAR', 'HOUR', 'MINUTE'] + STAT_COLUMNS))
+    return _typed(pd.concat(frames, ignore_index=True))
+
+
+def refresh_cube(affected, path=PROFILE_PATH, src=store.CSV_DIR):
+    """
+    Recompute the profiles of some regions and years and replace them in the
+    cube file, leaving the other profiles as they are.
+
+    Args:
+        affected (dict): Years to recompute per region, e.g. {"QLD1": [2024]}.
+
+    Returns:
+        pd.DataFrame: The updated cube.
+    """
+    cube = pd.read_parquet(path).astype({'GRANULARITY': str, 'REGION': str})
+    fresh = []
+    for region, years in affected.items():
+        cube = cube[~((cube['REGION'] == region) & cube['YEAR'].isin(years))]
+        fresh.append(build_cube([region], src, years).astype({'GRANULARITY': str, 'REGION': str}))
+    cube = _typed(pd.concat([cube, *fresh], ignore_index=True))
+    write_cube(cube, path)
+    return cube
+
+
+def write_cube(cube, path=PROFILE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    cube.to_parquet(tmp_path, index=False, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_cube(path=PROFILE_PATH):
+    """
+    Read the cube indexed by (GRANULARITY, REGION, YEAR) for fast lookups.
+    """
+    cube = pd.read_parquet(path)
+    cube = cube.astype({'GRANULARITY': str, 'REGION': str, 'YEAR': int})
+    return cube.set_index(['GRANULARITY', 'REGION', 'YEAR']).sort_index()
+
+
+def lookup(cube, granularity, region, year):
+    """
+    Slice one profile out of an indexed cube.
+
+    Returns:
+        pd.DataFrame or None: The profile in the same layout as
+        `hourly_profile` / `dispatch_profile`, or None if it is not in the cube.
+    """
+    try:
+        profile = cube.loc[(granularity, region, year)]
+    except KeyError:
+        return None
+    profile = profile.reset_index(drop=True)
+    if granularity == "hour":
+        profile = profile.drop(columns='MINUTE')
+    return profile.astype({key: 'int64' for key in KEYS[granularity]})
+
+
+def check_cube(cube, regions=store.REGIONS, src=store.CSV_DIR):
+    """
+    Compare every profile of the cube with the same profile computed on the fly.
+
+    Returns:
+        list: (granularity, region, year, reason) for each mismatch.
+    """
+    mismatches = []
+    for region in regions:
+        for granularity, year, expected in _profiles(region, src):
+            actual = lookup(cube, granularity, region, year)
+            if actual is None:
+                mismatches.append((granularity, region, year, "missing from cube"))
+                continue
+            try:
+                pd.testing.assert_frame_equal(actual, expected.astype({k: 'int64' for k in KEYS[granularity]}),
+                                              check_dtype=False)
+            except AssertionError as e:
+                mismatches.append((granularity, region, year, str(e).splitlines()[0]))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.profiles", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--src", default=store.CSV_DIR, help="directory of the source CSV files")
+    parser.add_argument("--path", default=PROFILE_PATH, help="cube file")
+    parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    parser.add_argument("command", choices=["build", "check"])
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        cube = build_cube(args.regions, args.src)
+        write_cube(cube, args.path)
+        print(f"Built {len(cube)} profile rows into {args.path} in {time.perf_counter() - start:.2f}s")
+
+    elif args.command == "check":
+        mismatches = check_cube(read_cube(args.path), args.regions, args.src)
+        for granularity, region, year, reason in mismatches:
+            print(f"Mismatch {granularity} {region} {year}: {reason}")
+        if mismatches:
+            sys.exit(1)
+        print("Cube matches the on-the-fly profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Multi-resolution pyramid of the price-and-demand grids for long-range charts.
+
+An Altair chart embeds its rows in the page, so a year of 5-minute RRP sends
+over 100,000 points to the browser. The pyramid keeps each measure of a region
+at coarser LEVELS, each period with the min, max and mean of its 5-minute
+intervals:
+
+    5min (the grid of `nem.grid`) -> 30min -> 2h -> 1D
+
+    data/store/pyramid/PYRAMID_{region}.npz   {measure}_{level}_{MIN,MAX,MEAN} float32, START
+
+`Pyramid.select` picks the finest level with at most `max_points` periods in
+the requested window (MAX_POINTS, or `NEM_MAX_CHART_POINTS`). Charts draw the
+min/max envelope as a band, so a single 5-minute spike stays visible at every
+level, and the mean as a line. With `method="lttb"` the line is instead the
+Largest-Triangle-Three-Buckets selection of `max_points` periods from a finer
+level (at most LTTB_SOURCE_FACTOR times as many), which keeps its shape.
+
+The pyramid is built from the grid with the 30-minute era expanded onto the
+5-minute grid, so every level is a reshape of one regular array. TIME is the
+start of each period (the SETTLEMENTDATE of its first interval minus five
+minutes), and days run from 00:00 to 24:00.
+
+Usage:
+    python -m nem.pyramid build [--regions QLD1 ...]
+    python -m nem.pyramid select QLD1 --start 2023-01-01 --end 2023-12-31 [--max-points 2000]
+"""
+
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from nem import grid, store
+
+
+PYRAMID_DIR = "data/store/pyramid"
+
+STEP = pd.Timedelta(minutes=5)
+LEVELS = {"5min": 1, "30min": 6, "2h": 24, "1D": 288}   # 5-minute intervals per period
+STATISTICS = ["MIN", "MAX", "MEAN"]
+
+MAX_POINTS = int(os.environ.get("NEM_MAX_CHART_POINTS", 2000))
+LTTB_SOURCE_FACTOR = 20
+
+
+def pyramid_path(region, root=PYRAMID_DIR):
+    return os.path.join(root, f"PYRAMID_{region}.npz")
+
+
+def build(region, root=PYRAMID_DIR, grid_root=grid.GRID_DIR):
+    """
+    Aggregate a region's grid into the coarser LEVELS and write them.
+
+    The 5-minute series is padded with NaN to whole days, so period k of a
+    level with m intervals per period covers intervals [k*m, (k+1)*m).
+
+    Returns:
+        dict: Region and periods per level.
+    """
+    source = grid.Grid(region, grid_root)
+    arrays, periods = {}, {}
+    for measure in source.measures:
+        times, values, missing = source.window(measure, expand=True)
+        values = np.where(missing == 1, np.nan, values).astype("float32")
+        first = pd.Timestamp(times[0]) - STEP
+        lead = int((first - first.normalize()) / STEP)
+        trail = -(lead + len(values)) % LEVELS["1D"]
+        values = np.concatenate([np.full(lead, np.nan, "float32"), values, np.full(trail, np.nan, "float32")])
+        arrays["START"] = np.int64(first.normalize().value)
+        for level, size in LEVELS.items():
+            if size == 1:
+                continue
+            blocks = values.reshape(-1, size)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)   # all-NaN padding periods
+                arrays[f"{measure}_{level}_MIN"] = np.nanmin(blocks, axis=1)
+                arrays[f"{measure}_{level}_MAX"] = np.nanmax(blocks, axis=1)
+                arrays[f"{measure}_{level}_MEAN"] = np.nanmean(blocks, axis=1).astype("float32")
+            periods[level] = len(blocks)
+
+    os.makedirs(root, exist_ok=True)
+    path = pyramid_path(region, root)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+    return {"region": region, "periods": periods}
+
+
+def lttb(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of `n - 2` equal buckets in
+    between, the point forming the largest triangle with the point kept from
+    the previous bucket and the mean of the next bucket.
+
+    Args:
+        x (np.ndarray): Increasing x values (e.g. int64 nanoseconds).
+        y (np.ndarray): Values; NaN points are never selected.
+        n (int): Points to keep.
+
+    Returns:
+        np.ndarray: Sorted positions of the kept points.
+    """
+    present = np.flatnonzero(~np.isnan(y))
+    if n >= len(present) or n < 3:
+        return present
+    x, y = np.asarray(x, dtype="float64")[present], np.asarray(y, dtype="float64")[present]
+    edges = np.linspace(1, len(x) - 1, n - 1).astype("int64")
+    kept = np.empty(n, dtype="int64")
+    kept[0], kept[-1] = 0, len(x) - 1
+    previous = 0
+    for bucket in range(n - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        following = slice(high, edges[bucket + 2] if bucket + 2 < len(edges) else len(x))
+        mean_x, mean_y = x[following].mean(), y[following].mean()
+        area = np.abs((x[previous] - mean_x) * (y[low:high] - y[previous])
+                      - (x[previous] - x[low:high]) * (mean_y - y[previous]))
+        previous = low + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return present[kept]
+
+
+def merge_periods(frame, factor):
+    """
+    Merge every `factor` consecutive rows of a level: the min of MIN, the max
+    of MAX and the mean of MEAN, timed at the first row.
+    """
+    groups = np.arange(len(frame)) // factor
+    merged = frame.groupby(groups).agg(TIME=("TIME", "first"), MIN=("MIN", "min"), MAX=("MAX", "max"),
+                                       MEAN=("MEAN", "mean"))
+    return merged.reset_index(drop=True)
+
+
+class Pyramid:
+    """
+    A region's pyramid levels, with the 5-minute level read from its grid.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        root (str, optional): Pyramid directory.
+        grid_root (str, optional): Grid directory.
+    """
+
+    def __init__(self, region, root=PYRAMID_DIR, grid_root=grid.GRID_DIR):
+        with np.load(pyramid_path(region, root)) as arrays:
+            self.arrays = {name: arrays[name] for name in arrays.files}
+        self.start = np.datetime64(int(self.arrays.pop("START")), "ns")
+        self.grid = grid.Grid(region, grid_root)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def _positions(self, level, start, end):
+        """
+        Periods [low, high) of a level from the one holding `start` to the
+        last one starting before `end`, so a period starting at `end` (e.g.
+        the next midnight) is left out, as the 5-minute level leaves out the
+        intervals after `end`.
+        """
+        step = (STEP * LEVELS[level]).to_timedelta64()
+        periods = len(self.arrays[f"{self.grid.measures[0]}_{level}_MEAN"])
+        low = 0 if start is None else (np.datetime64(pd.Timestamp(start), "ns") - self.start) // step
+        high = periods if end is None else -((self.start - np.datetime64(pd.Timestamp(end), "ns")) // step)
+        low, high = int(np.clip(low, 0, periods)), int(np.clip(high, 0, periods))
+        return low, max(low, high), step
+
+    def count(self, level, start=None, end=None):
+        """
+        Periods of a level overlapping [start, end]; for "5min", an upper bound
+        from the 30-minute periods, so the grid is not read to count.
+        """
+        if level == "5min":
+            low, high, _ = self._positions("30min", start, end)
+            return (high - low) * LEVELS["30min"]
+        low, high, _ = self._positions(level, start, end)
+        return high - low
+
+    def level(self, measure, level, start=None, end=None):
+        """
+        One level of a measure over [start, end].
+
+        Returns:
+            pd.DataFrame: TIME (period start), MIN, MAX and MEAN, without
+            periods that have no intervals.
+        """
+        if level == "5min":
+            times, values, missing = self.grid.window(measure, start, end, expand=True)
+            present = missing == 0
+            values = values[present]
+            return pd.DataFrame({"TIME": times[present] - STEP.to_timedelta64(),
+                                 "MIN": values, "MAX": values, "MEAN": values})
+        low, high, step = self._positions(level, start, end)
+        frame = pd.DataFrame({"TIME": self.start + np.arange(low, high) * step,
+                              **{stat: self.arrays[f"{measure}_{level}_{stat}"][low:high] for stat in STATISTICS}})
+        return frame[frame["MEAN"].notna()].reset_index(drop=True)
+
+    def choose(self, start=None, end=None, max_points=MAX_POINTS):
+        """The finest level with at most `max_points` periods in [start, end] (else the coarsest)."""
+        for level in LEVELS:
+            if self.count(level, start, end) <= max_points:
+                return level
+        return list(LEVELS)[-1]
+
+    def select(self, measure, start=None, end=None, max_points=MAX_POINTS, method="envelope"):
+        """
+        A measure over [start, end] in at most `max_points` rows.
+
+        Args:
+            measure (str): "RRP" or "TOTALDEMAND".
+            start (datetime-like, optional): Window start.
+            end (datetime-like, optional): Window end.
+            max_points (int, optional): Row budget of the chart.
+            method (str, optional): "envelope", the level chosen by `choose`;
+                or "lttb", the MEAN of the finest level with at most
+                LTTB_SOURCE_FACTOR * max_points periods, downsampled with `lttb`.
+
+        Returns:
+            tuple: (DataFrame of TIME, MIN, MAX and MEAN, level name). When even
+            the coarsest level exceeds the budget, its periods are merged with
+            `merge_periods`.
+        """
+        if method == "envelope":
+            level = self.choose(start, end, max_points)
+            frame = self.level(measure, level, start, end)
+            if len(frame) > max_points:
+                frame = merge_periods(frame, -(-len(frame) // max_points))
+            return frame, level
+        level = self.choose(start, end, max_points * LTTB_SOURCE_FACTOR)
+        frame = self.level(measure, level, start, end)
+        kept = lttb(frame["TIME"].to_numpy("int64"), frame["MEAN"].to_numpy("float64"), max_points)
+        return frame.iloc[kept].reset_index(drop=True), level
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.pyramid", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="aggregate each region's grid into the coarser levels")
+    build_parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    select_parser = commands.add_parser("select", help="show the level and rows chosen for a window")
+    select_parser.add_argument("region")
+    select_parser.add_argument("--measure", default="RRP")
+    select_parser.add_argument("--start", default=None)
+    select_parser.add_argument("--end", default=None)
+    select_parser.add_argument("--max-points", type=int, default=MAX_POINTS)
+    select_parser.add_argument("--method", choices=["envelope", "lttb"], default="envelope")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        for region in args.regions:
+            if not os.path.exists(grid.meta_path(region)):
+                print(f"{region}: no grid, run `python -m nem.grid build` first")
+                continue
+            result = build(region)
+            print(f"{region}: " + ", ".join(f"{level} {n}" for level, n in result["periods"].items()))
+        print(f"Done in {time.perf_counter() - start:.2f}s")
+    elif args.command == "select":
+        pyramid = Pyramid(args.region)
+        start = time.perf_counter()
+        frame, level = pyramid.select(args.measure, args.start, args.end, args.max_points, args.method)
+        elapsed = time.perf_counter() - start
+        print(frame)
+        print(f"{len(frame)} rows at {level} (up to {pyramid.count('5min', args.start, args.end)} 5-minute "
+              f"intervals in the window) in {elapsed * 1000:.2f}ms; max {frame['MAX'].max():.2f}")
+
+
+if __name__ == "__main__":
+    main()
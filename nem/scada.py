@@ -0,0 +1,339 @@
+"""
+Out-of-core, month-parallel reduction of DISPATCH_UNIT_SCADA archives.
+
+A month of DISPATCH_UNIT_SCADA holds several million 5-minute unit readings,
+so the notebook only processed January 2025. This pipeline maps every monthly
+archive downloaded by `download_dispatch_unit_scada_data` to a small partial
+result in its own worker process, streaming the zip chunk by chunk with
+`nem.mms`, and then merges the partials:
+
+- per-DUID daily sums of the positive SCADAVALUE readings (the layout of
+  `DISPATCH_UNIT_SCADA_202501_daily.csv` once joined with the registration
+  list), and optionally
+- per-interval sums by fuel source, technology type and/or region.
+
+Each worker holds one chunk and its running partial, so peak memory depends on
+the chunk size and the number of workers, not on the number of months.
+
+With `--star` the daily table is also stored as a star schema (`to_star`): a
+narrow fact table of int32 unit codes, dates and float32 values, and a unit
+dimension holding the registration columns once per DUID.
+
+Usage:
+    python -m nem.scada 202401 202412 [--by fuel technology region] [--workers 4] [--star]
+"""
+
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from nem.mms import CHUNK_BYTES, iter_mms_chunks
+
+
+DATA_DIR = "data/aemo_data"
+ANALYSIS_DIR = "data/analysis"
+REGISTRATION_PATH = "data/analysis/NEM_Registration.csv"
+STAR_DIR = "data/store/scada"
+
+TABLE = "DISPATCH_UNIT_SCADA"
+SAMPLE_SPAN = "202501"   # the daily table shipped in data/analysis
+
+GENERATING_TYPES = ["Generating Unit", "Bidirectional Unit"]
+
+DIMENSIONS = {
+    "fuel": "Fuel Source - Primary",
+    "technology": "Technology Type - Primary",
+    "region": "Region",
+}
+
+
+def archive_path(month, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"{TABLE}_{month}.zip")
+
+
+def month_range(start, end):
+    """
+    List the months from `start` to `end` inclusive, as YYYYMM strings.
+    """
+    return list(pd.period_range(pd.Period(f"{start[:4]}-{start[4:]}", "M"),
+                                pd.Period(f"{end[:4]}-{end[4:]}", "M"), freq="M").strftime("%Y%m"))
+
+
+def span_name(months):
+    """File name part of a month span: "202501" for one month, "202401_202412" for several."""
+    return months[0] if len(months) == 1 else f"{months[0]}_{months[-1]}"
+
+
+def span_months(span):
+    """The YYYYMM months of a span name."""
+    first, _, last = span.partition("_")
+    return month_range(first, last or first)
+
+
+def span_label(span):
+    """A span for page text, e.g. "January 2025" or "January 2024 to December 2024"."""
+    months = [pd.Timestamp(f"{month[:4]}-{month[4:]}-01") for month in span_months(span)]
+    if len(months) == 1:
+        return f"{months[0]:%B %Y}"
+    return f"{months[0]:%B %Y} to {months[-1]:%B %Y}"
+
+
+def built_spans(src=ANALYSIS_DIR, root=STAR_DIR):
+    """
+    Month spans with a daily table, star or unit matrix (`nem.matrix`).
+
+    Returns:
+        list: Span names, the most months first, then the latest.
+    """
+    pattern = re.compile(rf"{TABLE}_(\d{{6}}(?:_\d{{6}})?)_(?:daily\.csv|daily\.parquet|matrix\.npz)$")
+    spans = {match.group(1) for directory in (src, root) if os.path.isdir(directory)
+             for match in map(pattern.match, os.listdir(directory)) if match}
+    return sorted(spans, key=lambda span: (len(span_months(span)), span_months(span)[-1]), reverse=True)
+
+
+def default_span(src=ANALYSIS_DIR, root=STAR_DIR):
+    """The span Topic 3 shows: the first of `built_spans`, else SAMPLE_SPAN."""
+    spans = built_spans(src, root)
+    return spans[0] if spans else SAMPLE_SPAN
+
+
+def read_registration(path=REGISTRATION_PATH):
+    """
+    Registration list with one row per DUID.
+    """
+    registration = pd.read_csv(path)
+    return registration.drop_duplicates("DUID")
+
+
+def reduce_month(path, units=None, by=(), chunk_bytes=CHUNK_BYTES):
+    """
+    Reduce one monthly archive to its partial sums.
+
+    Args:
+        path (str): DISPATCH_UNIT_SCADA zip of one month.
+        units (pd.DataFrame, optional): DUID and the DIMENSIONS columns of the
+            generating units, required when `by` is given.
+        by (iterable, optional): DIMENSIONS keys to sum per interval.
+        chunk_bytes (int, optional): Uncompressed bytes parsed at a time.
+
+    Returns:
+        dict: "daily" (DUID, DATE, SCADAVALUE_sum), "intervals" (one frame per
+        dimension with SETTLEMENTDATE, the dimension and SCADAVALUE_sum) and
+        "rows" (readings read).
+    """
+    daily, intervals, rows = [], {key: [] for key in by}, 0
+    for _, chunk in iter_mms_chunks(path, tables=[TABLE], usecols=["SETTLEMENTDATE", "DUID", "SCADAVALUE"],
+                                    chunk_bytes=chunk_bytes):
+        rows += len(chunk)
+        chunk = chunk[chunk["SCADAVALUE"] > 0]
+        daily.append(chunk.groupby(["DUID", chunk["SETTLEMENTDATE"].dt.normalize().rename("DATE")])
+                     ["SCADAVALUE"].sum())
+        if by:
+            generating = chunk.merge(units, on="DUID", how="inner")
+            for key in by:
+                intervals[key].append(generating.groupby(["SETTLEMENTDATE", DIMENSIONS[key]])["SCADAVALUE"].sum())
+
+    return {
+        "daily": _combine(daily),
+        "intervals": {key: _combine(parts) for key, parts in intervals.items()},
+        "rows": rows,
+    }
+
+
+def _combine(parts):
+    """Sum partial group sums that may share keys (chunk and month boundaries)."""
+    if not parts:
+        return pd.Series(dtype="float64", name="SCADAVALUE")
+    combined = pd.concat(parts)
+    return combined.groupby(level=list(range(combined.index.nlevels))).sum()
+
+
+def _frame(series):
+    return series.rename("SCADAVALUE_sum").reset_index()
+
+
+def build_fuel_mix(months, data_dir=DATA_DIR, registration_path=REGISTRATION_PATH, by=(), workers=None,
+                   chunk_bytes=CHUNK_BYTES):
+    """
+    Reduce a range of monthly archives in parallel and merge the results.
+
+    Args:
+        months (list): YYYYMM strings, e.g. `month_range("202301", "202412")`.
+            Months without a downloaded archive are skipped.
+        by (iterable, optional): DIMENSIONS keys to also sum per interval.
+        workers (int, optional): Worker processes. Defaults to the CPU count.
+
+    Returns:
+        dict: "daily" (daily DUID sums joined with the registration list and
+        limited to generating and bidirectional units, as in the notebook),
+        "intervals" (per-interval sums for each `by` key), "months" (the months
+        read) and "rows" (readings read).
+    """
+    registration = read_registration(registration_path)
+    units = registration[registration["Dispatch Type"].isin(GENERATING_TYPES)][["DUID", *DIMENSIONS.values()]]
+    months = [m for m in months if os.path.exists(archive_path(m, data_dir))]
+
+    workers = min(workers or os.cpu_count() or 1, len(months)) or 1
+    paths = [archive_path(m, data_dir) for m in months]
+    if workers == 1:
+        partials = [reduce_month(p, units, by, chunk_bytes) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(reduce_month, paths, [units] * len(paths), [by] * len(paths),
+                                         [chunk_bytes] * len(paths)))
+
+    daily = _frame(_combine([p["daily"] for p in partials]))
+    daily["DATE"] = daily["DATE"].dt.date
+    daily = daily.merge(registration, on="DUID", how="left")
+    daily = daily[daily["Dispatch Type"].isin(GENERATING_TYPES)].reset_index(drop=True)
+    return {
+        "daily": daily,
+        "intervals": {key: _frame(_combine([p["intervals"][key] for p in partials])) for key in by},
+        "months": months,
+        "rows": sum(p["rows"] for p in partials),
+    }
+
+
+def unit_dimension(registration):
+    """
+    One row per DUID, sorted, with DUID_ID (int32) equal to the row number and
+    the text columns other than DUID stored as categoricals.
+    """
+    units = registration.drop_duplicates("DUID").sort_values("DUID", ignore_index=True)
+    units.insert(0, "DUID_ID", np.arange(len(units), dtype="int32"))
+    for column in units.columns:
+        if column != "DUID" and units[column].dtype == object:
+            units[column] = units[column].astype("category")
+    return units
+
+
+def to_star(daily):
+    """
+    Split a daily DUID table joined with the registration list (the layout of
+    `DISPATCH_UNIT_SCADA_202501_daily.csv`) into a star schema.
+
+    The wide table repeats about twenty registration columns on every
+    DUID-day row. The star keeps them once per unit:
+
+    - fact: DUID_ID (int32), DATE (datetime64) and SCADAVALUE_sum (float32);
+    - units: one row per DUID, with DUID_ID equal to its row number and the
+      text columns stored as categoricals.
+
+    Returns:
+        tuple: (fact, units) DataFrames.
+    """
+    units = unit_dimension(daily.drop(columns=["DATE", "SCADAVALUE_sum"]))
+    fact = pd.DataFrame({
+        "DUID_ID": pd.Categorical(daily["DUID"], categories=units["DUID"]).codes.astype("int32"),
+        "DATE": pd.to_datetime(daily["DATE"]),
+        "SCADAVALUE_sum": daily["SCADAVALUE_sum"].to_numpy("float32"),
+    })
+    return fact, units
+
+
+def unit_attribute(fact, units, column):
+    """
+    A column of the unit dimension aligned with the fact rows, without a merge.
+
+    Categorical columns stay categorical, so grouping on the result works on
+    integer codes.
+    """
+    values = units[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()[fact["DUID_ID"].to_numpy()]
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=values.dtype), index=fact.index, name=column)
+    return pd.Series(values.to_numpy()[fact["DUID_ID"].to_numpy()], index=fact.index, name=column)
+
+
+def join_units(fact, units, columns=None):
+    """Widen the fact table with unit columns, for the few views that need them."""
+    columns = [c for c in (columns or units.columns) if c != "DUID_ID"]
+    return fact.assign(**{column: unit_attribute(fact, units, column) for column in columns})
+
+
+def daily_mix(fact, units, column, percent=False):
+    """
+    Daily generation per value of a unit column, e.g. "Fuel Source - Primary".
+
+    Returns:
+        pd.DataFrame: `column`, DATE and SCADAVALUE_sum, plus Total and Percent
+        with `percent`, as Topic 3 plots them.
+    """
+    mix = (fact["SCADAVALUE_sum"].astype("float64")
+           .groupby([unit_attribute(fact, units, column), fact["DATE"]], observed=True)
+           .sum()
+           .reset_index())
+    mix[column] = mix[column].astype(str)
+    if percent:
+        mix["Total"] = mix.groupby("DATE")["SCADAVALUE_sum"].transform("sum")
+        mix["Percent"] = mix["SCADAVALUE_sum"] / mix["Total"] * 100
+    return mix
+
+
+def star_paths(span, root=STAR_DIR):
+    """Fact and unit files of a month span, e.g. "202501" or "202401_202412"."""
+    return (os.path.join(root, f"{TABLE}_{span}_daily.parquet"),
+            os.path.join(root, f"{TABLE}_{span}_units.parquet"))
+
+
+def write_star(fact, units, span, root=STAR_DIR):
+    os.makedirs(root, exist_ok=True)
+    for frame, path in zip((fact, units), star_paths(span, root)):
+        tmp_path = path + ".tmp"
+        frame.to_parquet(tmp_path, index=False, compression="zstd")
+        os.replace(tmp_path, path)
+    return star_paths(span, root)
+
+
+def read_star(span, root=STAR_DIR):
+    """
+    Read the star of a month span.
+
+    Returns:
+        tuple: (fact, units) DataFrames.
+    """
+    fact_path, units_path = star_paths(span, root)
+    return pd.read_parquet(fact_path), pd.read_parquet(units_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.scada", description=__doc__.split("\n\n")[0])
+    parser.add_argument("start", help="first month, YYYYMM")
+    parser.add_argument("end", help="last month, YYYYMM")
+    parser.add_argument("--by", nargs="*", default=[], choices=list(DIMENSIONS),
+                        help="also write per-interval sums by these dimensions")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--dest", default=ANALYSIS_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--star", action="store_true",
+                        help=f"also write the daily table as a fact table and unit dimension to {STAR_DIR}")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    result = build_fuel_mix(month_range(args.start, args.end), args.data_dir, by=args.by, workers=args.workers)
+    if not result["months"]:
+        print(f"No {TABLE} archives found in {args.data_dir}")
+        return
+
+    span = span_name(result["months"])
+    path = os.path.join(args.dest, f"{TABLE}_{span}_daily.csv")
+    result["daily"].to_csv(path, index=False)
+    print(f"Saved to {path}")
+    if args.star:
+        for path in write_star(*to_star(result["daily"]), span):
+            print(f"Saved to {path}")
+    for key, intervals in result["intervals"].items():
+        path = os.path.join(args.dest, f"{TABLE}_{span}_{key}.csv")
+        intervals.to_csv(path, index=False)
+        print(f"Saved to {path}")
+    print(f"Reduced {result['rows']} readings from {len(result['months'])} months "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
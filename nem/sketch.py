@@ -0,0 +1,158 @@
+"""
+Mergeable quantile sketches of the price-and-demand statistics buckets.
+
+`PRICE_STATS_BY_*` keeps the median of each bucket, and a median of medians
+is not the median of the coarser bucket: the archived price analysis' quarter
+and fortnight views were built that way. Next to the statistics, every bucket
+also gets a quantile sketch of its RRP and TOTALDEMAND intervals, so the
+median or any percentile of a coarser bucket (a quarter from months, a
+fortnight from weeks, a day of the month over several years) is computed from
+the sketches alone.
+
+The sketch is a logarithmic histogram (the DDSketch construction): a value x
+with |x| >= MIN_VALUE falls in bucket
+
+    key = sign(x) * (ceil(log(|x| / MIN_VALUE) / log(gamma)) + 1),  gamma = (1 + ALPHA) / (1 - ALPHA)
+
+and |x| < MIN_VALUE in key 0. A sketch is the count of values per key, so
+merging sketches adds counts: the merge of two buckets' sketches is exactly
+the sketch of their union, in any order.
+
+Error bounds: ranks are exact, so the q-quantile estimate lies within a
+relative ALPHA (1%) of the true order statistic, |estimate - x| <= ALPHA * |x|,
+or within MIN_VALUE (0.01, the data's resolution) for |x| < MIN_VALUE.
+Interpolated quantiles (pandas' median of an even count) keep the bound of the
+larger of the two values. Size: at most one key per factor gamma (about 2%)
+of value range on each side of zero, 1,441 keys for |x| up to 17,500; a month
+of 5-minute RRP uses a few hundred.
+
+Sketches are stored per region, for the DAY to QUARTER granularities of
+`nem.aggregate` (`SKETCH_GRANULARITIES`):
+
+    data/store/sketches/PRICE_SKETCH_{region}.parquet
+
+with one row per (GRANULARITY, bucket label, MEASURE, KEY) and its COUNT.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+ALPHA = 0.01
+MIN_VALUE = 0.01
+
+SKETCH_DIR = "data/store/sketches"
+
+COLUMNS = ["GRANULARITY", "YEAR", "BUCKET", "MEASURE", "KEY", "COUNT"]
+
+
+def _gamma(alpha):
+    return (1 + alpha) / (1 - alpha)
+
+
+def sketch_path(region, root=SKETCH_DIR):
+    return os.path.join(root, f"PRICE_SKETCH_{region}.parquet")
+
+
+def value_keys(values, alpha=ALPHA, min_value=MIN_VALUE):
+    """Sketch key of each value (int16, ordered like the values). Values must not be NaN."""
+    values = np.asarray(values, dtype="float64")
+    magnitude = np.abs(values)
+    with np.errstate(divide="ignore"):
+        index = np.ceil(np.log(np.maximum(magnitude, min_value) / min_value) / np.log(_gamma(alpha))) + 1
+    return np.where(magnitude < min_value, 0, np.sign(values) * index).astype("int16")
+
+
+def key_values(keys, alpha=ALPHA, min_value=MIN_VALUE):
+    """Representative value of each key, within a relative `alpha` of every value in it."""
+    keys = np.asarray(keys, dtype="float64")
+    gamma = _gamma(alpha)
+    return np.sign(keys) * min_value * 2 * gamma ** (np.abs(keys) - 1) / (gamma + 1)
+
+
+def build(buckets, values, alpha=ALPHA, min_value=MIN_VALUE):
+    """
+    Sketch the values of each bucket.
+
+    Args:
+        buckets (array-like): Bucket of each value, e.g. an integer calendar key.
+        values (array-like): Values; NaN values are skipped.
+
+    Returns:
+        pd.DataFrame: BUCKET, KEY and COUNT, sorted by BUCKET and KEY.
+    """
+    values = np.asarray(values, dtype="float64")
+    present = ~np.isnan(values)
+    frame = pd.DataFrame({"BUCKET": np.asarray(buckets)[present], "KEY": value_keys(values[present], alpha, min_value)})
+    return frame.groupby(["BUCKET", "KEY"]).size().rename("COUNT").astype("int32").reset_index()
+
+
+def merge(sketches, buckets):
+    """
+    Merge sketches into coarser buckets.
+
+    Args:
+        sketches (pd.DataFrame): BUCKET, KEY and COUNT rows, e.g. of monthly buckets.
+        buckets (array-like): New bucket of each row, e.g. the quarter of its month.
+
+    Returns:
+        pd.DataFrame: BUCKET, KEY and COUNT of the merged sketches.
+    """
+    frame = pd.DataFrame({"BUCKET": np.asarray(buckets), "KEY": sketches["KEY"].to_numpy(),
+                          "COUNT": sketches["COUNT"].to_numpy()})
+    return frame.groupby(["BUCKET", "KEY"], sort=True)["COUNT"].sum().reset_index()
+
+
+def quantiles(sketches, qs, alpha=ALPHA, min_value=MIN_VALUE):
+    """
+    Quantiles of each bucket's sketch, interpolated between ranks like
+    `pd.Series.quantile`.
+
+    Args:
+        sketches (pd.DataFrame): BUCKET, KEY and COUNT rows.
+        qs (list): Quantiles in [0, 1], e.g. [0.05, 0.5, 0.95].
+
+    Returns:
+        pd.DataFrame: One row per BUCKET and one column per quantile.
+    """
+    sketches = sketches.sort_values(["BUCKET", "KEY"], kind="stable")
+    buckets, codes = np.unique(sketches["BUCKET"].to_numpy(), return_inverse=True)
+    counts = sketches["COUNT"].to_numpy("int64")
+    cumulative = np.cumsum(counts)
+    totals = np.bincount(codes, weights=counts, minlength=len(buckets)).astype("int64")
+    offsets = np.concatenate([[0], np.cumsum(totals)[:-1]])
+    values = key_values(sketches["KEY"].to_numpy(), alpha, min_value)
+
+    def at_rank(rank):
+        return values[np.searchsorted(cumulative, offsets + rank, side="right")]
+
+    result = {}
+    for q in qs:
+        position = q * (totals - 1)
+        low, high = np.floor(position).astype("int64"), np.ceil(position).astype("int64")
+        result[q] = at_rank(low) + (position - low) * (at_rank(high) - at_rank(low))
+    return pd.DataFrame(result, index=pd.Index(buckets, name="BUCKET"))
+
+
+def write_sketches(sketches, region, root=SKETCH_DIR):
+    os.makedirs(root, exist_ok=True)
+    path = sketch_path(region, root)
+    sketches = sketches[COLUMNS].astype({"GRANULARITY": "category", "MEASURE": "category"})
+    sketches.to_parquet(path + ".tmp", index=False, compression="zstd")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_sketches(region, granularity=None, measure=None, root=SKETCH_DIR):
+    """
+    Read a region's sketches, optionally of one granularity and measure.
+
+    Returns:
+        pd.DataFrame: COLUMNS rows.
+    """
+    filters = [(column, "==", value) for column, value in (("GRANULARITY", granularity), ("MEASURE", measure))
+               if value is not None]
+    sketches = pd.read_parquet(sketch_path(region, root), filters=filters or None)
+    return sketches.astype({"GRANULARITY": str, "MEASURE": str})
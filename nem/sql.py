@@ -0,0 +1,234 @@
+"""
+Embedded SQL engine over the price-and-demand history.
+
+The charts group 5-minute intervals with hand-written pandas code after
+loading a whole region into memory. This module registers the on-disk data
+with an in-process DuckDB database instead and answers parameterised
+aggregate queries:
+
+    interval_stats("QLD1", by="dispatch", years=[2023], statistics=["median"])
+
+DuckDB reads only the partitions and columns a query needs (the Parquet
+store of `nem.store`, or `PRICE_AND_DEMAND_ALL_YEARS_{region}.csv` when the
+store has not been built), and filters, groups and computes quantiles with its
+vectorised, multi-threaded operators. Only the aggregated rows reach pandas.
+
+Usage:
+    python -m nem.sql query "SELECT YEAR, avg(RRP) FROM intervals GROUP BY YEAR" [--region QLD1]
+    python -m nem.sql benchmark [--region QLD1] [--year 2023]
+"""
+
+import argparse
+import threading
+import time
+
+import duckdb
+import pandas as pd
+
+from nem import store
+
+
+STATISTICS = ["mean", "median", "min", "max"]
+
+# calendar fields of an interval, with the conventions of `nem.aggregate.calendar_keys`
+# (WEEKDAY 0 is Monday; WEEK follows %U; FORTNIGHT pairs weeks as the archived analysis does)
+CALENDAR = {
+    "YEAR": "year(SETTLEMENTDATE)",
+    "QUARTER": "quarter(SETTLEMENTDATE)",
+    "MONTH": "month(SETTLEMENTDATE)",
+    "DAY": "day(SETTLEMENTDATE)",
+    "HOUR": "hour(SETTLEMENTDATE)",
+    "MINUTE": "minute(SETTLEMENTDATE)",
+    "WEEKDAY": "isodow(SETTLEMENTDATE) - 1",
+    "WEEK": "(dayofyear(SETTLEMENTDATE) + 6 - isodow(SETTLEMENTDATE) % 7) // 7",
+}
+CALENDAR["FORTNIGHT"] = f"CAST(trunc(({CALENDAR['WEEK']} - 1) / 2) AS BIGINT) + 1"
+
+# group keys of each granularity: calendar buckets and intra-period profiles
+GROUPINGS = {
+    "hour": ["YEAR", "MONTH", "DAY", "HOUR"],
+    "day": ["YEAR", "MONTH", "DAY"],
+    "week": ["YEAR", "WEEK"],
+    "fortnight": ["YEAR", "FORTNIGHT"],
+    "month": ["YEAR", "MONTH"],
+    "quarter": ["YEAR", "QUARTER"],
+    "year": ["YEAR"],
+    "dispatch": ["HOUR", "MINUTE"],
+    "hour_of_day": ["HOUR"],
+    "weekday": ["WEEKDAY"],
+    "day_of_month": ["DAY"],
+}
+
+AGGREGATES = {
+    "mean": "avg({})",
+    "median": "quantile_cont({}, 0.5)",
+    "min": "min({})",
+    "max": "max({})",
+}
+
+_database = None
+_lock = threading.Lock()
+
+
+def connection():
+    """
+    A cursor on the process-wide in-memory database.
+
+    Each call returns its own cursor, so concurrent sessions do not share
+    query state.
+    """
+    global _database
+    with _lock:
+        if _database is None:
+            _database = duckdb.connect(":memory:")
+        return _database.cursor()
+
+
+def intervals(region, years=None, root=store.STORE_DIR, src=store.CSV_DIR):
+    """
+    SQL relation of a region's intervals, limited to `years` when given.
+
+    Returns:
+        tuple: (SQL text usable after FROM, list of its parameters).
+    """
+    stored = store.available_years(region, root)
+    if stored:
+        years = stored if years is None else [y for y in years if y in stored]
+        files = [store.partition_path(region, year, root) for year in years]
+        if not files:
+            return "(SELECT * FROM read_parquet(?) LIMIT 0)", [store.partition_path(region, stored[0], root)]
+        return "read_parquet(?)", [files]
+
+    relation = ("(SELECT SETTLEMENTDATE, TOTALDEMAND, RRP, PERIODTYPE FROM "
+                "read_csv(?, types={'SETTLEMENTDATE': 'TIMESTAMP'})")
+    params = [store.csv_path(region, src)]
+    if years is not None:
+        relation += f" WHERE {CALENDAR['YEAR']} IN (SELECT unnest(?))"
+        params.append([int(y) for y in years])
+    return relation + ")", params
+
+
+def query(sql, params=None, region=None, years=None):
+    """
+    Run SQL and return the result as a DataFrame.
+
+    With `region`, the name `intervals` in the SQL refers to that region's
+    intervals (of `years`, when given), with the CALENDAR fields as columns.
+    """
+    if region is not None:
+        relation, relation_params = intervals(region, years)
+        calendar = ", ".join(f"{expression} AS {name}" for name, expression in CALENDAR.items())
+        sql = f"WITH intervals AS (SELECT *, {calendar} FROM {relation}) {sql}"
+        params = relation_params + list(params or [])
+    return connection().execute(sql, params or []).df()
+
+
+def interval_stats(region, by, years=None, start=None, end=None, statistics=STATISTICS,
+                   measures=store.MEASURES):
+    """
+    Statistics of the 5-minute intervals per calendar bucket or profile slot.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        by (str): Key of GROUPINGS, e.g. "month" or "dispatch".
+        years (iterable, optional): Years to include. Defaults to all.
+        start (date, optional): First day to include.
+        end (date, optional): Last day to include.
+        statistics (list, optional): Subset of STATISTICS.
+        measures (list, optional): Measures, e.g. ["RRP"].
+
+    Returns:
+        pd.DataFrame: The GROUPINGS keys of `by` and one `{measure}_{statistic}`
+        column per pair, rounded to 2 d.p. and sorted by the keys.
+    """
+    keys = GROUPINGS[by]
+    relation, params = intervals(region, years)
+    conditions = []
+    if start is not None:
+        conditions.append("SETTLEMENTDATE >= CAST(? AS DATE)")
+        params.append(str(start))
+    if end is not None:
+        conditions.append("SETTLEMENTDATE < CAST(? AS DATE) + INTERVAL 1 DAY")
+        params.append(str(end))
+
+    columns = [f"{CALENDAR[key]} AS {key}" for key in keys]
+    columns += [f"round({AGGREGATES[stat].format(measure)}, 2) AS {measure}_{stat}"
+                for measure in measures for stat in statistics]
+    sql = (f"SELECT {', '.join(columns)} FROM {relation}"
+           f"{' WHERE ' + ' AND '.join(conditions) if conditions else ''}"
+           f" GROUP BY ALL ORDER BY {', '.join(keys)}")
+    return connection().execute(sql, params).df()
+
+
+def benchmark(region, year, repeat=3):
+    """
+    Time two of the archived price analysis' aggregations with pandas on the
+    CSV, pandas on the store, and SQL:
+
+    - "dispatch": one year grouped by HOUR and MINUTE;
+    - "month": every year grouped by YEAR and MONTH.
+
+    Each computes the four statistics of both measures.
+
+    Returns:
+        dict: {workload: best-of-`repeat` seconds per path and "match", whether
+        the SQL result agrees with pandas}.
+    """
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    def stats(data, keys):
+        return data.groupby(keys).agg(
+            **{f"{m}_{s}": (m, s) for m in store.MEASURES for s in STATISTICS}
+        ).round(2).reset_index()
+
+    workloads = {"dispatch": (["HOUR", "MINUTE"], [year]), "month": (["YEAR", "MONTH"], None)}
+    results = {}
+    for by, (keys, years) in workloads.items():
+        def from_csv():
+            data = pd.read_csv(store.csv_path(region), parse_dates=["SETTLEMENTDATE"])
+            return stats(data if years is None else data[data["YEAR"].isin(years)], keys)
+
+        def from_store():
+            return stats(store.read_price_and_demand(region, years, store.MEASURES, calendar=keys), keys)
+
+        result = {}
+        result["pandas_csv"], expected = best(from_csv)
+        if store.available_years(region):
+            result["pandas_store"], _ = best(from_store)
+        result["sql"], actual = best(lambda: interval_stats(region, by, years=years))
+        columns = expected.columns.drop(keys)
+        result["match"] = (len(expected) == len(actual)
+                           and bool(((expected[columns] - actual[columns]).abs() <= 0.011).all().all()))
+        results[by] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.sql", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("query", help="run SQL; `intervals` is the region's intervals")
+    run.add_argument("sql")
+    run.add_argument("--region", default="QLD1")
+    run.add_argument("--years", nargs="+", type=int, default=None)
+    bench = commands.add_parser("benchmark", help="compare the archived analysis' pandas paths with SQL")
+    bench.add_argument("--region", default="QLD1")
+    bench.add_argument("--year", type=int, default=2023)
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        with pd.option_context("display.max_rows", 100, "display.width", 200):
+            print(query(args.sql, region=args.region, years=args.years))
+    elif args.command == "benchmark":
+        for by, result in benchmark(args.region, args.year).items():
+            timings = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in result.items() if name != "match")
+            print(f"{args.region} {by}: {timings}; results match: {result['match']}")
+
+
+if __name__ == "__main__":
+    main()
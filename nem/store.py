@@ -0,0 +1,247 @@
+"""
+Partitioned Parquet store for the regional price-and-demand history.
+
+`PRICE_AND_DEMAND_ALL_YEARS_{region}.csv` holds every interval of every year as
+text, together with six derived calendar columns. The store keeps the same
+history as one Parquet file per region and year:
+
+    data/store/price_and_demand/REGION=QLD1/YEAR=2023.parquet
+
+with typed columns only (SETTLEMENTDATE, TOTALDEMAND, RRP, PERIODTYPE). The
+calendar fields are derived when the data is read. A request for one region,
+one year and two measures opens a single file and decodes only those two
+column chunks.
+
+Usage:
+    python -m nem.store convert [--src data/analysis] [--regions QLD1 ...]
+    python -m nem.store benchmark [--region QLD1] [--year 2023]
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+REGIONS = ['NSW1', 'QLD1', 'SA1', 'TAS1', 'VIC1']
+
+STORE_DIR = "data/store/price_and_demand"
+CSV_DIR = "data/analysis"
+
+MEASURES = ["TOTALDEMAND", "RRP"]
+CALENDAR_COLUMNS = ["YEAR", "MONTH", "DAY", "HOUR", "MINUTE", "WEEKDAY"]
+
+SCHEMA = pa.schema([
+    ("SETTLEMENTDATE", pa.timestamp("s")),
+    ("TOTALDEMAND", pa.float64()),
+    ("RRP", pa.float64()),
+    ("PERIODTYPE", pa.dictionary(pa.int8(), pa.string())),
+])
+
+
+def csv_path(region, src=CSV_DIR):
+    return os.path.join(src, f"PRICE_AND_DEMAND_ALL_YEARS_{region}.csv")
+
+
+def partition_path(region, year, root=STORE_DIR):
+    return os.path.join(root, f"REGION={region}", f"YEAR={year}.parquet")
+
+
+def available_years(region, root=STORE_DIR):
+    """
+    List the years stored for a region.
+
+    Returns:
+        list: Sorted years, empty if the region has not been converted.
+    """
+    region_dir = os.path.join(root, f"REGION={region}")
+    if not os.path.isdir(region_dir):
+        return []
+    years = [
+        int(name[len("YEAR="):-len(".parquet")])
+        for name in os.listdir(region_dir)
+        if name.startswith("YEAR=") and name.endswith(".parquet")
+    ]
+    return sorted(years)
+
+
+def add_calendar_columns(data, columns=CALENDAR_COLUMNS):
+    """
+    Derive the calendar columns from SETTLEMENTDATE.
+
+    Args:
+        data (pd.DataFrame): Data with a datetime SETTLEMENTDATE column.
+        columns (list, optional): Subset of CALENDAR_COLUMNS to add.
+
+    Returns:
+        pd.DataFrame: The same frame with the calendar columns added.
+    """
+    dates = data["SETTLEMENTDATE"].dt
+    derive = {
+        "YEAR": lambda: dates.year.astype("int16"),
+        "MONTH": lambda: dates.month.astype("int8"),
+        "DAY": lambda: dates.day.astype("int8"),
+        "HOUR": lambda: dates.hour.astype("int8"),
+        "MINUTE": lambda: dates.minute.astype("int8"),
+        "WEEKDAY": lambda: dates.weekday.astype("int8"),
+    }
+    for column in columns:
+        data[column] = derive[column]()
+    return data
+
+
+def write_partition(data, region, year, root=STORE_DIR):
+    """
+    Write one region-year partition, replacing any existing file atomically.
+
+    Args:
+        data (pd.DataFrame): Rows of that region and year with at least the
+            SETTLEMENTDATE, TOTALDEMAND and RRP columns.
+        region (str): Region code, e.g. "QLD1".
+        year (int): Calendar year of the rows.
+        root (str, optional): Store directory.
+
+    Returns:
+        str: Path of the written file.
+    """
+    data = data.sort_values("SETTLEMENTDATE")
+    if "PERIODTYPE" not in data:
+        data = data.assign(PERIODTYPE="TRADE")
+    table = pa.Table.from_pandas(data[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+    path = partition_path(region, year, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+
+def convert_csv(region, src=CSV_DIR, root=STORE_DIR):
+    """
+    Convert `PRICE_AND_DEMAND_ALL_YEARS_{region}.csv` into yearly partitions.
+
+    The derived calendar columns of the CSV are dropped.
+
+    Returns:
+        list: Paths of the written partitions.
+    """
+    data = pd.read_csv(csv_path(region, src), usecols=lambda c: c not in CALENDAR_COLUMNS + ["REGION"],
+                       parse_dates=["SETTLEMENTDATE"])
+    paths = []
+    for year, group in data.groupby(data["SETTLEMENTDATE"].dt.year):
+        paths.append(write_partition(group, region, int(year), root))
+    return paths
+
+
+def read_price_and_demand(region, years=None, columns=None, calendar=False, root=STORE_DIR):
+    """
+    Read price-and-demand intervals from the store.
+
+    Only the partitions of the requested years are opened, and only the
+    requested columns are decoded.
+
+    Args:
+        region (str): Region code, e.g. "QLD1".
+        years (iterable, optional): Years to read. Defaults to all stored years.
+        columns (list, optional): Measure columns to read (e.g. ["RRP"]).
+            SETTLEMENTDATE is always included. Defaults to every column.
+        calendar (bool or list, optional): Add the calendar columns (all of
+            them if True, or the given subset).
+        root (str, optional): Store directory.
+
+    Returns:
+        pd.DataFrame: Intervals sorted by SETTLEMENTDATE.
+    """
+    stored = available_years(region, root)
+    years = stored if years is None else [y for y in years if y in stored]
+    if columns is not None:
+        columns = ["SETTLEMENTDATE"] + [c for c in columns if c != "SETTLEMENTDATE"]
+
+    tables = [pq.read_table(partition_path(region, y, root), columns=columns) for y in years]
+    if tables:
+        data = pa.concat_tables(tables).to_pandas(coerce_temporal_nanoseconds=True)
+    else:
+        names = columns if columns is not None else SCHEMA.names
+        data = SCHEMA.empty_table().select(names).to_pandas(coerce_temporal_nanoseconds=True)
+
+    if calendar:
+        add_calendar_columns(data, CALENDAR_COLUMNS if calendar is True else calendar)
+    return data
+
+
+def benchmark(region, year, src=CSV_DIR, root=STORE_DIR, repeat=3):
+    """
+    Time a one-region, one-year, two-measure load from the CSV and the store.
+
+    Returns:
+        dict: Best-of-`repeat` seconds and bytes on disk for both paths.
+    """
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def from_csv():
+        data = pd.read_csv(csv_path(region, src), parse_dates=["SETTLEMENTDATE"])
+        return data[data["YEAR"] == year][["SETTLEMENTDATE", "RRP", "TOTALDEMAND"]]
+
+    def from_store():
+        return read_price_and_demand(region, [year], ["RRP", "TOTALDEMAND"])
+
+    path = partition_path(region, year, root)
+    metadata = pq.ParquetFile(path).metadata
+    column_bytes = sum(
+        metadata.row_group(i).column(j).total_compressed_size
+        for i in range(metadata.num_row_groups)
+        for j in range(metadata.num_columns)
+        if metadata.row_group(i).column(j).path_in_schema in ("SETTLEMENTDATE", "RRP", "TOTALDEMAND")
+    )
+    return {
+        "csv_seconds": best(from_csv),
+        "store_seconds": best(from_store),
+        "csv_bytes": os.path.getsize(csv_path(region, src)),
+        "store_bytes": column_bytes,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.store", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--src", default=CSV_DIR, help="directory of PRICE_AND_DEMAND_ALL_YEARS_{region}.csv")
+    parser.add_argument("--root", default=STORE_DIR, help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert the CSV history into the store")
+    convert.add_argument("--regions", nargs="+", default=REGIONS)
+
+    bench = commands.add_parser("benchmark", help="compare CSV and store load times")
+    bench.add_argument("--region", default="QLD1")
+    bench.add_argument("--year", type=int, default=2023)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        for region in args.regions:
+            if not os.path.exists(csv_path(region, args.src)):
+                print(f"No file found for {region}")
+                continue
+            start = time.perf_counter()
+            paths = convert_csv(region, args.src, args.root)
+            print(f"Converted {region} into {len(paths)} partitions in {time.perf_counter() - start:.2f}s")
+
+    elif args.command == "benchmark":
+        result = benchmark(args.region, args.year, args.src, args.root)
+        print(f"{args.region} {args.year}, RRP + TOTALDEMAND:")
+        print(f"  CSV:   {result['csv_seconds'] * 1000:8.1f} ms, {result['csv_bytes'] / 1e6:6.2f} MB on disk")
+        print(f"  Store: {result['store_seconds'] * 1000:8.1f} ms, {result['store_bytes'] / 1e6:6.2f} MB read")
+        print(f"  Speed-up: {result['csv_seconds'] / result['store_seconds']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
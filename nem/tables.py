@@ -0,0 +1,124 @@
+"""
+Parquet copies of the CSV tables in data/analysis.
+
+`read_csv` in `nem.data` parses the text of a table on the first read in each
+server process. `convert` writes each table once as Parquet, with the column
+types `pd.read_csv` infers, and `read_csv` reads the copy instead while it is
+not older than its CSV:
+
+    data/analysis/PRICE_STATS_BY_HOUR_QLD1.csv -> data/store/tables/PRICE_STATS_BY_HOUR_QLD1.parquet
+
+Date columns are parsed when the copy is read, like `parse_dates`, so every
+caller gets the frame it got from the CSV. The price-and-demand histories are
+left to the partitioned store of `nem.store`.
+
+Usage:
+    python -m nem.tables convert [--src data/analysis]
+    python -m nem.tables benchmark [--src data/analysis]
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import pandas as pd
+
+from nem import store
+
+
+TABLE_DIR = "data/store/tables"
+SKIP_PREFIXES = ("PRICE_AND_DEMAND_ALL_YEARS_",)   # served by nem.store
+
+
+def table_path(csv_path, root=TABLE_DIR):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(root, f"{name}.parquet")
+
+
+def csv_files(src=store.CSV_DIR):
+    """The CSV tables of `src` that get a Parquet copy."""
+    return [path for path in sorted(glob.glob(os.path.join(src, "*.csv")))
+            if not os.path.basename(path).startswith(SKIP_PREFIXES)]
+
+
+def is_current(csv_path, root=TABLE_DIR):
+    """Whether the Parquet copy of a CSV exists and is not older than it."""
+    path = table_path(csv_path, root)
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path)
+
+
+def convert(csv_path, root=TABLE_DIR):
+    """
+    Write the Parquet copy of a CSV table.
+
+    Returns:
+        dict: Path of the copy, rows and the sizes of the CSV and the copy.
+    """
+    data = pd.read_csv(csv_path)
+    os.makedirs(root, exist_ok=True)
+    path = table_path(csv_path, root)
+    data.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return {"path": path, "rows": len(data), "csv_bytes": os.path.getsize(csv_path),
+            "bytes": os.path.getsize(path)}
+
+
+def read_table(path, date_columns=None):
+    """
+    Read a Parquet copy, parsing `date_columns` as `pd.read_csv` would.
+
+    A column that does not parse as dates (e.g. "2019-00" week labels) is
+    left as text, as `pd.read_csv(parse_dates=...)` leaves it.
+    """
+    data = pd.read_parquet(path)
+    for column in date_columns or []:
+        try:
+            data[column] = pd.to_datetime(data[column])
+        except (ValueError, TypeError):
+            pass
+    return data
+
+
+def benchmark(src=store.CSV_DIR, root=TABLE_DIR):
+    """
+    Time the first read of each table from its CSV and from its copy.
+
+    Returns:
+        dict: {file name: (CSV seconds, Parquet seconds)} for the converted tables.
+    """
+    results = {}
+    for csv_path in csv_files(src):
+        if not is_current(csv_path, root):
+            continue
+        start = time.perf_counter()
+        pd.read_csv(csv_path)
+        middle = time.perf_counter()
+        read_table(table_path(csv_path, root))
+        results[os.path.basename(csv_path)] = (middle - start, time.perf_counter() - middle)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.tables", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="write a Parquet copy of each CSV table")
+    convert_parser.add_argument("--src", default=store.CSV_DIR)
+    bench = commands.add_parser("benchmark", help="compare first reads of the CSV tables and their copies")
+    bench.add_argument("--src", default=store.CSV_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        start = time.perf_counter()
+        for csv_path in csv_files(args.src):
+            result = convert(csv_path)
+            print(f"{result['path']}: {result['rows']} rows, "
+                  f"{result['csv_bytes'] / 1e6:.1f} MB -> {result['bytes'] / 1e6:.1f} MB")
+        print(f"Done in {time.perf_counter() - start:.2f}s")
+    elif args.command == "benchmark":
+        for name, (csv_seconds, parquet_seconds) in benchmark(args.src).items():
+            print(f"{name}: CSV {csv_seconds * 1000:.1f}ms, Parquet {parquet_seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
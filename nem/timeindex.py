@@ -0,0 +1,142 @@
+"""
+Sorted time index for date-range views of the 5-minute history.
+
+A date slider that filters with `data['SETTLEMENTDATE'].dt.date >= start`
+builds a Python `date` per row and a boolean mask over the whole history on
+every move. `TimeIndex` keeps the intervals sorted by SETTLEMENTDATE, with the
+timestamps as a datetime64 array, so the rows of any [start, end] window are
+found by two binary searches (O(log n)) and returned as a positional slice,
+which shares the memory of the indexed frame instead of copying it.
+
+    index = TimeIndex(data)
+    week = index.slice(datetime.date(2022, 5, 30), datetime.date(2022, 6, 5))
+
+Usage:
+    python -m nem.timeindex benchmark [--region QLD1]
+"""
+
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from nem import store
+
+
+class TimeIndex:
+    """
+    Intervals sorted by a datetime column, sliced by binary search.
+
+    Args:
+        data (pd.DataFrame): Intervals; sorted by `column` here unless they
+            already are.
+        column (str, optional): Datetime column to index.
+    """
+
+    def __init__(self, data, column="SETTLEMENTDATE"):
+        times = data[column].to_numpy()
+        if len(times) > 1 and (np.diff(times) < np.timedelta64(0)).any():
+            data = data.sort_values(column, kind="stable", ignore_index=True)
+            times = data[column].to_numpy()
+        self.data = data
+        self.times = times
+        self.column = column
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        return int(self.data.memory_usage(deep=True).sum())
+
+    @staticmethod
+    def _bound(value, end=False):
+        """A date bound covers the whole day; a datetime bound is exact."""
+        if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+            value = pd.Timestamp(value) + pd.Timedelta(days=1 if end else 0)
+            return np.datetime64(value, "ns"), "left"
+        return np.datetime64(pd.Timestamp(value), "ns"), "right" if end else "left"
+
+    def bounds(self, start=None, end=None):
+        """
+        Positions of the first row at or after `start` and one past the last
+        row at or before `end` (the end of its day, for a date).
+
+        Returns:
+            tuple: (low, high) row positions.
+        """
+        low, high = 0, len(self.times)
+        if start is not None:
+            value, side = self._bound(start)
+            low = int(np.searchsorted(self.times, value, side=side))
+        if end is not None:
+            value, side = self._bound(end, end=True)
+            high = int(np.searchsorted(self.times, value, side=side))
+        return low, max(low, high)
+
+    def slice(self, start=None, end=None):
+        """
+        Rows within [start, end], as a view of the indexed frame.
+
+        Args:
+            start (date or datetime, optional): First day or interval.
+            end (date or datetime, optional): Last day or interval.
+
+        Returns:
+            pd.DataFrame: The rows, sharing memory with the index; do not
+            modify values in place.
+        """
+        low, high = self.bounds(start, end)
+        return self.data.iloc[low:high]
+
+    def span(self):
+        """First and last timestamps, or None for an empty index."""
+        if not len(self.times):
+            return None
+        return pd.Timestamp(self.times[0]), pd.Timestamp(self.times[-1])
+
+
+def benchmark(region, start=datetime.date(2022, 5, 30), end=datetime.date(2022, 6, 12), repeat=20):
+    """
+    Time a date-range selection over a region's whole history with a
+    `.dt.date` mask and with `TimeIndex.slice`.
+
+    Returns:
+        dict: Best-of-`repeat` seconds of "mask" and "slice", the rows
+        selected and "match", whether both select the same rows.
+    """
+    data = store.read_price_and_demand(region, columns=store.MEASURES)
+    index = TimeIndex(data)
+
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - began)
+        return min(timings), result
+
+    mask_seconds, masked = best(lambda: data[(data["SETTLEMENTDATE"].dt.date >= start)
+                                             & (data["SETTLEMENTDATE"].dt.date <= end)])
+    slice_seconds, sliced = best(lambda: index.slice(start, end))
+    return {"mask": mask_seconds, "slice": slice_seconds, "rows": len(sliced),
+            "match": masked.reset_index(drop=True).equals(sliced.reset_index(drop=True))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.timeindex", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="compare a date mask with a binary-search slice")
+    bench.add_argument("--region", default="QLD1")
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        result = benchmark(args.region)
+        print(f"{args.region}: {result['rows']} rows; mask {result['mask'] * 1000:.2f}ms, "
+              f"slice {result['slice'] * 1000:.3f}ms; same rows: {result['match']}")
+
+
+if __name__ == "__main__":
+    main()
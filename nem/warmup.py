@@ -0,0 +1,263 @@
+"""
+Warm-up of the dashboard: derived stores at image build, shared cache at server start.
+
+A fresh server process parses every table, detects anomalies and indexes
+events on the first visit of a page, so the first visitor waits for all of it.
+The warm-up moves that work ahead of the first request:
+
+- `build` (at image build time) writes each derived store that is missing or
+  older than its inputs, in one pass: the Parquet store (`nem.store`), the Parquet copies of
+  the analysis tables (`nem.tables`), the profile cube (`nem.profiles`) and,
+  for each region, the anomaly table, event index, grid and pyramid. The
+  committed PRICE_STATS tables are left as they are.
+- `warm` (at server start) reads what each page of `app.py` shows with its
+  default selections (QLD1, 2023 and the January anomaly range in Topic 1;
+  the longest reduced span of months in Topic 3) into the process-wide `dataset_cache`.
+- `serve` runs `warm`, then Streamlit in the same process, so the cache is
+  full before the port opens.
+
+`report` times the first run of each navigation page in a fresh session, when
+all of its charts have been sent, against FIRST_CHART_BUDGET seconds
+(`NEM_FIRST_CHART_BUDGET`).
+
+Usage:
+    python -m nem.warmup build [--force]
+    python -m nem.warmup warm
+    python -m nem.warmup serve [streamlit options ...]
+    python -m nem.warmup report [--cold] [--budget 2.0] [pages ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from nem import anomaly, data, events, grid, profiles, pyramid, scada, store, tables
+
+
+APP = "app.py"
+
+PAGES = [
+    "home.py",
+    "topics/Topic-1-Price-Anomaly-Detection.py",
+    "topics/Topic-2-Outage-Analysis.py",
+    "topics/Topic-3-Renewable-Integration.py",
+    "topics/Topic-4-Infrastructure-Analysis.py",
+    "data/NEMWEB-Data-Download-Guide.py",
+    "about.py",
+]
+
+DEFAULT_REGION = "QLD1"
+DEFAULT_YEAR = 2023
+
+FIRST_CHART_BUDGET = float(os.environ.get("NEM_FIRST_CHART_BUDGET", 2.0))
+
+
+def _older(path, inputs):
+    """Whether `path` is missing or older than any of the `inputs` that exist."""
+    times = [os.path.getmtime(source) for source in inputs if os.path.exists(source)]
+    return not os.path.exists(path) or (bool(times) and os.path.getmtime(path) < max(times))
+
+
+def _store_stale(region):
+    """
+    Whether the partitions `store.convert_csv` writes from a region's CSV are
+    missing or older than it. Partitions of other years (e.g. added by
+    `nem.ingest`) are not compared, as the conversion does not rewrite them.
+    """
+    source = store.csv_path(region)
+    stored = store.available_years(region)
+    if stored and min(os.path.getmtime(store.partition_path(region, year)) for year in stored) \
+            >= os.path.getmtime(source):
+        return False
+    years = pd.read_csv(source, usecols=["SETTLEMENTDATE"], parse_dates=["SETTLEMENTDATE"])["SETTLEMENTDATE"].dt.year
+    return any(_older(store.partition_path(region, year), [source]) for year in years.unique())
+
+
+def _steps(regions, force):
+    """
+    The build steps whose output is missing or older than its inputs, as
+    (name, call) pairs in the order they must run. A region whose store is
+    converted gets every derived store rebuilt after it, and a rebuilt grid
+    its pyramid, so one pass leaves nothing stale.
+    """
+    steps = []
+    converted = set()
+    for region in regions:
+        if os.path.exists(store.csv_path(region)) and (force or _store_stale(region)):
+            steps.append((f"store {region}", lambda region=region: store.convert_csv(region)))
+            converted.add(region)
+    for csv_path in tables.csv_files():
+        if force or not tables.is_current(csv_path):
+            steps.append((f"table {os.path.basename(csv_path)}", lambda csv_path=csv_path: tables.convert(csv_path)))
+
+    def partitions(region):
+        return [store.partition_path(region, year) for year in store.available_years(region)]
+
+    if force or converted or _older(profiles.PROFILE_PATH, [path for region in store.REGIONS for path in
+                                                          [profiles.hour_stats_path(region), *partitions(region)]]):
+        steps.append(("profiles", lambda: profiles.write_cube(profiles.build_cube())))
+    for region in regions:
+        if region not in converted and not store.available_years(region):
+            continue
+        stale = force or region in converted
+        if stale or _older(anomaly.state_path(region), partitions(region)):
+            steps.append((f"anomalies {region}", lambda region=region: anomaly.build(region)))
+        if stale or _older(events.events_path(region), partitions(region)):
+            steps.append((f"events {region}", lambda region=region: events.build(region)))
+        grid_stale = stale or _older(grid.meta_path(region), partitions(region))
+        if grid_stale:
+            steps.append((f"grid {region}", lambda region=region: grid.build(region)))
+        if grid_stale or _older(pyramid.pyramid_path(region), [grid.meta_path(region)]):
+            steps.append((f"pyramid {region}", lambda region=region: pyramid.build(region)))
+    return steps
+
+
+def build(regions=store.REGIONS, force=False):
+    """
+    Write the derived stores that are missing or stale (all of them with `force`).
+
+    Returns:
+        dict: {step: seconds}.
+    """
+    timings = {}
+    for name, call in _steps(regions, force):
+        start = time.perf_counter()
+        call()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def selection_reads(region, year):
+    """
+    The reads of Topic 1 for a region and year, with the same arguments as
+    the page so they hit the same cache entries.
+
+    Returns:
+        list: (name, call) pairs.
+    """
+    start, end = pd.Timestamp(year, 1, 1), pd.Timestamp(year, 1, 31) + pd.Timedelta(days=1)
+    return [
+        ("Topic 1 hourly profile", lambda: data.read_profile("hour", region, year)),
+        ("Topic 1 dispatch profile", lambda: data.read_profile("dispatch", region, year)),
+        ("Topic 1 anomalies", lambda: data.read_anomalies(region, start, end, anomaly.DETECTORS)),
+        ("Topic 1 pyramid", lambda: data.read_pyramid(region)),
+        ("Topic 1 events", lambda: data.read_events(region, "high", events.HIGH[0], start=pd.Timestamp(year, 1, 1),
+                                                    end=pd.Timestamp(year, 12, 31, 23, 59))),
+    ]
+
+
+def default_reads(region=DEFAULT_REGION, year=DEFAULT_YEAR, span=None):
+    """
+    The reads of the navigation pages with their default selections, and
+    Topic 3's span (`nem.scada.default_span`) unless given.
+
+    Returns:
+        list: (name, call) pairs.
+    """
+    span = span or scada.default_span()
+    return selection_reads(region, year) + [
+        ("Topic 2 outages", lambda: data.read_csv(
+            "data/analysis/NETWORK_OUTAGEDETAIL_202201_202501.csv",
+            ["STARTTIME", "ENDTIME", "SUBMITTEDDATE", "ACTUAL_STARTTIME", "ACTUAL_ENDTIME"])),
+        ("Topic 3 dispatch", lambda: data.read_csv(
+            f"data/analysis/{scada.TABLE}_{scada.SAMPLE_SPAN}_screenshot.csv", ["SETTLEMENTDATE", "LASTCHANGED"])),
+        ("Topic 3 registration", lambda: data.read_csv("data/analysis/NEM_Registration.csv")),
+        ("Topic 3 fuel mix", lambda: data.read_region_mixes(span, "fuel")),
+        ("Topic 3 technology mix", lambda: data.read_region_mixes(span, "technology")),
+    ]
+
+
+def warm(reads=None):
+    """
+    Run the default reads, filling `dataset_cache`.
+
+    A read that fails (e.g. a table that is not downloaded) is reported and
+    skipped: its page reports the error as before.
+
+    Returns:
+        dict: {name: seconds, or the exception}.
+    """
+    results = {}
+    for name, call in reads or default_reads():
+        start = time.perf_counter()
+        try:
+            call()
+            results[name] = time.perf_counter() - start
+        except Exception as e:
+            results[name] = e
+    return results
+
+
+def serve(args=()):
+    """Warm the cache, then run the dashboard in this process with `streamlit run` options."""
+    from streamlit.web import cli
+
+    for name, result in warm().items():
+        print(f"warm-up {name}: " + (f"{result:.2f}s" if isinstance(result, float) else f"skipped ({result})"))
+    cli.main(["run", APP, *args], prog_name="streamlit")
+
+
+def report(pages=PAGES, timeout=120):
+    """
+    Seconds until each page has sent all of its charts in a fresh session.
+
+    Returns:
+        dict: {page: (seconds, charts drawn)}.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for page in pages:
+        app = AppTest.from_file(page, default_timeout=timeout)
+        start = time.perf_counter()
+        app.run()
+        elapsed = time.perf_counter() - start
+        results[page] = (elapsed, len(app.get("arrow_vega_lite_chart")))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m nem.warmup", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="write the derived stores that are missing or stale")
+    build_parser.add_argument("--regions", nargs="+", default=store.REGIONS)
+    build_parser.add_argument("--force", action="store_true", help="rebuild every store")
+    commands.add_parser("warm", help="time the reads of the default selections")
+    commands.add_parser("serve", help="warm the cache, then run the dashboard with `streamlit run` options")
+    report_parser = commands.add_parser("report", help="time to first chart of each page against the budget")
+    report_parser.add_argument("pages", nargs="*", default=PAGES)
+    report_parser.add_argument("--budget", type=float, default=FIRST_CHART_BUDGET)
+    report_parser.add_argument("--cold", action="store_true", help="do not warm the cache first")
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != "serve":
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    if args.command == "build":
+        start = time.perf_counter()
+        for name, seconds in build(args.regions, args.force).items():
+            print(f"{name}: {seconds:.2f}s")
+        print(f"Done in {time.perf_counter() - start:.2f}s")
+    elif args.command == "warm":
+        for name, result in warm().items():
+            print(f"{name}: " + (f"{result * 1000:.0f}ms" if isinstance(result, float) else f"skipped ({result})"))
+    elif args.command == "serve":
+        serve(extra)
+    elif args.command == "report":
+        if not args.cold:
+            warm()
+        over = []
+        for page, (seconds, charts) in report(args.pages).items():
+            flag = "" if seconds <= args.budget else "  OVER BUDGET"
+            print(f"{page}: {seconds:.2f}s, {charts} charts{flag}")
+            if flag:
+                over.append(page)
+        print(f"{len(args.pages) - len(over)} of {len(args.pages)} pages within {args.budget:.1f}s")
+        if over:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
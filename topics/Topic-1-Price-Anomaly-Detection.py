@@ -2,6 +2,14 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 
+from nem.anomaly import DETECTORS
+from nem.charts import altair_chart, fold_statistics, statistic_param, with_statistic
+from nem.data import load_anomalies, load_events, load_profile, load_pyramid, load_time_index
+from nem.events import HIGH, LOW
+from nem.panels import lazy_tabs, panel
+from nem.prefetch import prefetch
+from nem.pyramid import MAX_POINTS
+
 
 
 st.header("Topic 1: Electricity Pricing Anomaly Detection and Analysis")
@@ -20,25 +28,92 @@ st.write("---")
 # List of regions
 REGIONS =[ 'NSW1', 'QLD1', 'SA1', 'TAS1', 'VIC1']
 
-# Load data function
-def load_data(file_path, date_columns):
-    try:
-        data = pd.read_csv(file_path, parse_dates=date_columns)
-        return data
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return None
-
-
 # Selecta region to start
 selected_region = st.sidebar.selectbox("Select a region to analyse the electricity price data", REGIONS, index=1)
 
 
 # Main content
 
+
 ### Chart: Trade Price Daily Distribution for selected_region
 ### x-axis: day, x-range: hour, y-axis: mean, median, min, max
 
+@panel
+def profile_panel(region, year):
+    """Hourly and dispatch-level profiles of a region in a year: only the selected tab is loaded."""
+    tab = lazy_tabs(["1 Hour", "Dispatch"], key="profile-tab")
+
+    if tab == "1 Hour":
+        if region:
+            # mean, median, min, max for each hour in the day over the whole year (precomputed profile)
+            data = load_profile("hour", region, year)
+            if data is not None:
+                data = fold_statistics(data, ['HOUR'])
+
+                base = alt.Chart(data).encode(
+                    x=alt.X('HOUR:O', title="Hour", axis=alt.Axis(labelAngle=0))
+                )
+
+                rrp_line = base.mark_line(color='red').encode(
+                    y=alt.Y('RRP:Q', title='Electricity Price',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['HOUR', 'STATISTIC', 'RRP']
+                )
+
+                demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
+                    y=alt.Y('TOTALDEMAND:Q', title='Total Demand',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['HOUR', 'STATISTIC', 'TOTALDEMAND']
+                )
+
+                chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                    y='independent'
+                ).interactive()
+                altair_chart(with_statistic(chart, statistic_param()))
+                st.caption("Legend: Red line = :red[Electricity Price]; Blue dashed line = :blue[Total Demand] (aggregated by hour).")
+            else:
+                st.warning("Please provide a valid file path to load data.")
+        else:
+            st.warning("Please select a region to analyse.")
+
+    else:
+        if region:
+            # mean, median, min, max for each dispatch interval in the day over the whole year (precomputed profile)
+            data = load_profile("dispatch", region, year)
+            if data is not None:
+                data['time'] = data['HOUR'].astype(str).str.zfill(2) + ':' + data['MINUTE'].astype(str).str.zfill(2)
+                data = fold_statistics(data, ['time'])
+
+                base = alt.Chart(data).encode(
+                    x=alt.X('time:O', title="Time", axis=alt.Axis(labelAngle=0))
+                )
+
+                rrp_line = base.mark_line(color='red').encode(
+                    y=alt.Y('RRP:Q', title='Electricity Price',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['time', 'STATISTIC', 'RRP']
+                )
+
+                demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
+                    y=alt.Y('TOTALDEMAND:Q', title='Total Demand',
+                            scale=alt.Scale(zero=False, nice=True)),
+                    tooltip=['time', 'STATISTIC', 'TOTALDEMAND']
+                )
+
+                chart = alt.layer(rrp_line, demand_line).resolve_scale(
+                    y='independent'
+                ).interactive()
+
+                st.warning("Since AEMC changed the settlement period from 30 minutes to 5 minutes in 2022, the data before 2022 is not included in the analysis of dispatch level.")
+
+                altair_chart(with_statistic(chart, statistic_param()))
+                st.caption("Legend: Red line = :red[Electricity Price]; Blue dashed line = :blue[Total Demand] (aggregated by dispatch).")
+            else:
+                st.warning("Please provide a valid file path to load data.")
+        else:
+            st.warning("Please select a region to analyse.")
+
+
 with st.container():
     st.subheader(f"Example: *Electricity Price Daily Distribution for {selected_region}*")
 
@@ -48,124 +123,147 @@ with st.container():
             and total demand using a chosen statistic (mean, median, min, or max). Data is filtered by year (2022-2024), with independent y-axes \
             for each metric.")
 
-    col1, col2,  _ = st.columns([0.25, 0.20, 0.55])
+    col1, _ = st.columns([0.25, 0.75])
 
-    with col2:
+    with col1:
         year = st.selectbox("Select a year to display the data", list(range(2022, 2025)), index=1, key="year-select")
 
-    with col1:
-        option = ['mean', 'median', 'min', 'max']
-        selection = st.pills("Select a statistic to display", 
-                            option, 
-                            selection_mode='single', 
-                            default=['median'],
-                            key="by_day")
-
-    
-    hours, dispatch = st.tabs(["1 Hour", "Dispatch"])
-
-    with hours:
-        file_path = f"data/analysis/PRICE_STATS_BY_HOUR_{selected_region}.csv"
-        if selected_region:
-            data = load_data(file_path, date_columns=['YEAR_MONTH_DAY_HOUR'])
-            if data is not None:
-                # get year in the selected range
-                data = data[data['YEAR'] == year]
-                # calculate mean, median, min, max for each hour in the day over the whole year
-                data = data.groupby(['HOUR']).agg({'RRP_mean': 'mean', 'RRP_median': 'median', 
-                                                'RRP_min': 'min', 'RRP_max': 'max',
-                                                'TOTALDEMAND_mean': 'mean', 'TOTALDEMAND_median': 'median',
-                                                    'TOTALDEMAND_min': 'min', 'TOTALDEMAND_max': 'max'}).round(2).reset_index()
-                
-                if selection:
-                    _selection_RRP = f'RRP_{selection}'
-                    _selection_DEMAND = f'TOTALDEMAND_{selection}'
-                    
-                    base = alt.Chart(data).encode(
-                        x=alt.X('HOUR:O', title="Hour", axis=alt.Axis(labelAngle=0))
+    # all four statistics go to the browser once; the radio buttons under each chart switch between them
+    # without rerunning the page
+    st.caption("Choose the statistic (mean, median, min or max) with the buttons under each chart.")
+
+    # the tabs rerun on their own: only the year and region above rerun the page
+    profile_panel(selected_region, year)
+
+
+### Chart: Detected price anomalies for selected_region
+### x-axis: settlement date, y-axis: RRP, points: anomalies by detector
+
+@panel
+def anomaly_panel(region, year):
+    """
+    Detected anomalies and price events of a region in a year, in one panel
+    because selecting an event sets the anomaly chart's date range.
+    """
+    with st.container():
+        st.subheader(f"Example: *Detected Price Anomalies for {region}*")
+
+        st.write("Intervals flagged by four detectors: a rolling median/MAD score against the previous day (mad), \
+                a z-score against the same time of day over the previous four weeks (seasonal), prices at or above \
+                $300/MWh (spike) and spikes lasting at least 30 minutes (run). Select a date range within the year above.")
+
+        col1, col2, _ = st.columns([0.25, 0.35, 0.40])
+
+        with col1:
+            # the range follows the year, and jumps to an event selected below
+            if st.session_state.get("anomaly-year") != year:
+                st.session_state["anomaly-range"] = (pd.Timestamp(year, 1, 1).date(), pd.Timestamp(year, 1, 31).date())
+                st.session_state["anomaly-year"] = year
+            date_range = st.date_input("Select a date range",
+                                       min_value=pd.Timestamp(year, 1, 1),
+                                       max_value=pd.Timestamp(year, 12, 31),
+                                       key="anomaly-range")
+
+        with col2:
+            detectors = st.pills("Select detectors to display",
+                                 DETECTORS,
+                                 selection_mode='multi',
+                                 default=DETECTORS,
+                                 key="anomaly-detectors")
+
+        if len(date_range) == 2 and detectors:
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+            anomalies = load_anomalies(region, start, end, detectors)
+            if anomalies is not None:
+                # long ranges come from the pyramid, at most MAX_POINTS periods with their min/max band
+                pyramid = load_pyramid(region)
+                if pyramid is not None:
+                    prices, level = pyramid.select('RRP', start, end, MAX_POINTS)
+                    prices = prices.rename(columns={'TIME': 'SETTLEMENTDATE'})
+                else:
+                    prices = load_time_index(region, columns=['RRP'])
+                    if prices is not None:
+                        prices = prices.slice(start, end)
+                        prices = prices.assign(MIN=prices['RRP'], MAX=prices['RRP'], MEAN=prices['RRP'])
+                if prices is not None:
+                    rrp_band = alt.Chart(prices).mark_area(color='grey', opacity=0.3).encode(
+                        x=alt.X('SETTLEMENTDATE:T', title="Settlement Date"),
+                        y=alt.Y('MIN:Q', title='Electricity Price', scale=alt.Scale(zero=False, nice=True)),
+                        y2='MAX:Q'
                     )
-                    
-                    rrp_line = base.mark_line(color='red').encode(
-                        y=alt.Y(f'{_selection_RRP}:Q', title='Electricity Price',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['HOUR', f'{_selection_RRP}']
+
+                    rrp_line = alt.Chart(prices).mark_line(color='grey', strokeWidth=1).encode(
+                        x='SETTLEMENTDATE:T',
+                        y='MEAN:Q',
                     )
-                    
-                    demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
-                        y=alt.Y(f'{_selection_DEMAND}:Q', title='Total Demand',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['HOUR', f'{_selection_DEMAND}']
+
+                    anomaly_points = alt.Chart(anomalies).mark_point(filled=True, size=30).encode(
+                        x='SETTLEMENTDATE:T',
+                        y='RRP:Q',
+                        color=alt.Color('DETECTOR:N', title='Detector', scale=alt.Scale(domain=DETECTORS)),
+                        tooltip=['SETTLEMENTDATE', 'DETECTOR', 'RRP', 'BASELINE', 'SCORE']
                     )
-                    
-                    chart = alt.layer(rrp_line, demand_line).resolve_scale(
-                        y='independent'
-                    ).interactive()
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-                    st.caption("Legend: Red line = :red[Electricity Price]; Blue dashed line = :blue[Total Demand] (aggregated by hour).")
-                else:
-                    st.warning("Please select one statistic to display the plot.")
+
+                    chart = alt.layer(rrp_band, rrp_line, anomaly_points).interactive()
+                    altair_chart(chart)
+                    st.caption(f"{len(anomalies)} flagged intervals: " +
+                               ", ".join(f"{d} {n}" for d, n in anomalies['DETECTOR'].value_counts(sort=False).items()
+                                         if d in detectors))
             else:
-                st.warning("Please provide a valid file path to load data.")
+                st.warning("The anomaly tables have not been built. Run `python -m nem.anomaly build`.")
         else:
-            st.warning("Please select a region to analyse.")
+            st.warning("Please select a start and end date and at least one detector.")
 
-    with dispatch:
 
-        file_path = f"data/analysis/PRICE_AND_DEMAND_ALL_YEARS_{selected_region}.csv"
-        if selected_region:
-            data = load_data(file_path, date_columns=['SETTLEMENTDATE'])
-            if data is not None:
-                # get year in the selected range
-                data = data[data['YEAR'] == year]
-                # calculate mean, median, min, max for each hour in the day over the whole year
-                data = data.groupby(['HOUR', 'MINUTE']).agg(                
-                    RRP_mean=('RRP', 'mean'),
-                    RRP_median=('RRP', 'median'),
-                    RRP_min=('RRP', 'min'),
-                    RRP_max=('RRP', 'max'),
-                    TOTALDEMAND_mean=('TOTALDEMAND', 'mean'),
-                    TOTALDEMAND_median=('TOTALDEMAND', 'median'),
-                    TOTALDEMAND_min=('TOTALDEMAND', 'min'),
-                    TOTALDEMAND_max=('TOTALDEMAND', 'max')
-                ).round(2).reset_index()
-                
-                data['time'] = data['HOUR'].astype(str).str.zfill(2) + ':' + data['MINUTE'].astype(str).str.zfill(2)
+    ### Table: Price events for selected_region
+    ### runs of intervals beyond a price threshold, from the event index
 
-                if selection:
-                    _selection_RRP = f'RRP_{selection}'
-                    _selection_DEMAND = f'TOTALDEMAND_{selection}'
-                    
-                    base = alt.Chart(data).encode(
-                        x=alt.X('time:O', title="Time", axis=alt.Axis(labelAngle=0))
-                    )
-                    
-                    rrp_line = base.mark_line(color='red').encode(
-                        y=alt.Y(f'{_selection_RRP}:Q', title='Electricity Price',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['time', f'{_selection_RRP}']
-                    )
-                    
-                    demand_line = base.mark_line(color='blue', strokeDash=(5,5)).encode(
-                        y=alt.Y(f'{_selection_DEMAND}:Q', title='Total Demand',
-                                scale=alt.Scale(zero=False, nice=True)),
-                        tooltip=['time', f'{_selection_DEMAND}']
-                    )
-                    
-                    chart = alt.layer(rrp_line, demand_line).resolve_scale(
-                        y='independent'
-                    ).interactive()
+    def jump_to_event():
+        """Show the selected event's days in the anomaly chart."""
+        event = st.session_state["event-jump"]
+        if event is not None:
+            first, last = pd.Timestamp(year, 1, 1), pd.Timestamp(year, 12, 31)
+            st.session_state["anomaly-range"] = (max(event[0], first).date(), min(event[1], last).date())
 
-                    st.warning("Since AEMC changed the settlement period from 30 minutes to 5 minutes in 2022, the data before 2022 is not included in the analysis of dispatch level.")
+    with st.container():
+        st.subheader(f"Example: *Price Events for {region}*")
 
-                    st.altair_chart(chart, theme="streamlit", use_container_width=True)
-                    st.caption("Legend: Red line = :red[Electricity Price]; Blue dashed line = :blue[Total Demand] (aggregated by dispatch).")
+        st.write("Runs of consecutive intervals with the price above (or below) a threshold in the selected year, \
+                with their duration, peak price and price integral ($/MWh x hours). Select an event to show its days \
+                in the anomaly chart above.")
 
-                else:
-                    st.warning("Please select one statistic to display the plot.")
-            else:
-                st.warning("Please provide a valid file path to load data.")
+        thresholds = {f"RRP ≥ ${t:,.0f}": ("high", t) for t in HIGH} | {f"RRP < ${t:,.0f}": ("low", t) for t in LOW}
+
+        col1, col2, _ = st.columns([0.25, 0.25, 0.50])
+
+        with col1:
+            threshold_label = st.selectbox("Select a threshold", list(thresholds), key="event-threshold")
+
+        with col2:
+            min_hours = st.number_input("Minimum duration (hours)", min_value=0.0, value=0.0, step=0.5, key="event-hours")
+
+        kind, threshold = thresholds[threshold_label]
+        found = load_events(region, kind, threshold,
+                            start=pd.Timestamp(year, 1, 1), end=pd.Timestamp(year, 12, 31, 23, 59),
+                            min_hours=min_hours or None)
+        if found is not None:
+            st.caption(f"{len(found)} events in {year}, {found['HOURS'].sum():,.1f} hours in total.")
+            st.dataframe(found[['START', 'END', 'INTERVALS', 'HOURS', 'PEAK', 'INTEGRAL']].round(2),
+                         hide_index=True, use_container_width=True)
+
+            largest = found.reindex(found['INTEGRAL'].abs().sort_values(ascending=False).index[:100])
+            st.selectbox("Jump to one of the largest events",
+                         [None] + list(zip(largest['START'], largest['END'])),
+                         format_func=lambda e: "" if e is None else f"{e[0]:%Y-%m-%d %H:%M} to {e[1]:%Y-%m-%d %H:%M}",
+                         key="event-jump", on_change=jump_to_event)
         else:
-            st.warning("Please select a region to analyse.")
+            st.warning("The event index has not been built. Run `python -m nem.events build`.")
+
+
+anomaly_panel(selected_region, year)
+
+# warm the cache for the adjacent years and the other regions in the background
+prefetch(selected_region, year, REGIONS)
 
 
 st.write("---")
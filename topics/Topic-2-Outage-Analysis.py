@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 
+from nem.charts import altair_chart
+from nem.data import load_data
+from nem.panels import lazy_tabs, panel
+
 
 st.header("Topic 2: Power Outage Root Cause and Impact Analysis")
 
@@ -15,41 +19,12 @@ st.write("This topic examines the occurrence and impact of power outages across
 
 st.write("---")
 
-## Main Content
-
-# Load data function
-def load_data(file_path, date_columns):
-    try:
-        data = pd.read_csv(file_path, parse_dates=date_columns)
-        return data
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return None
-
-with st.container():
-    st.subheader("Example: **Network Planned Outage Analysis**")
-    st.write("In this example, we will explore the network planned outages in the NEM. The analysis will focus on the planned outage \
-             start from 2022 to 2025. ")
-    
-    ## show the data
-    # Load the data
-    file_path = f"data/analysis/NETWORK_OUTAGEDETAIL_202201_202501.csv"
-    date_cols = ["STARTTIME", "ENDTIME", "SUBMITTEDDATE", "ACTUAL_STARTTIME", "ACTUAL_ENDTIME"]
-    data = load_data(file_path, date_columns=date_cols)
-
-    # Filter data for years 2022 to 2025
-    data = data[(data["STARTTIME"].dt.year >= 2022) & (data["STARTTIME"].dt.year <= 2024)]
-
-    # Display the data
-    st.write("The planned outage logs look like this:")
-    st.write(data.head())
-
-    # Visualize the data
-    st.write("Let's start by visualising from both temporal and reason analysis.")
-
-    temporal, reason = st.tabs(["Temporal Analysis", "Reason Analysis"])
+@panel
+def outage_panel(data):
+    """Temporal and reason analyses of the planned outages: only the selected tab is computed."""
+    tab = lazy_tabs(["Temporal Analysis", "Reason Analysis"], key="outage-tab")
 
-    with temporal:
+    if tab == "Temporal Analysis":
         # ---- Temporal Analysis ----
         if data is not None:
             # Extract year and month from STARTTIME
@@ -96,12 +71,12 @@ with st.container():
             st.write("The chart below shows the number of planned outages per month from 2022 to 2024. \
                      :blue[Monthly outages] are represented by :blue[blue bars], with :red[red overlays] highlighting the \
                      portion that :red[exceeds the overall mean value].")
-            st.altair_chart(chart_outages, theme="streamlit", use_container_width=True)
+            altair_chart(chart_outages)
             
         else:
             st.warning("Please provide a valid file path to load data.")
 
-    with reason:
+    else:
         # ---- Status and Reason Analysis ----
         # Count outages by status
         status_counts = data["OUTAGESTATUSCODE"].value_counts().reset_index()
@@ -136,11 +111,35 @@ with st.container():
 
         co1, co2 = st.columns(2)
         with co1:
-            st.altair_chart(chart_status, theme="streamlit", use_container_width=True)
+            altair_chart(chart_status)
         with co2:
-            st.altair_chart(chart_reason, theme="streamlit", use_container_width=True)
+            altair_chart(chart_reason)
+
+
+## Main Content
+
+with st.container():
+    st.subheader("Example: **Network Planned Outage Analysis**")
+    st.write("In this example, we will explore the network planned outages in the NEM. The analysis will focus on the planned outage \
+             start from 2022 to 2025. ")
+    
+    ## show the data
+    # Load the data
+    file_path = f"data/analysis/NETWORK_OUTAGEDETAIL_202201_202501.csv"
+    date_cols = ["STARTTIME", "ENDTIME", "SUBMITTEDDATE", "ACTUAL_STARTTIME", "ACTUAL_ENDTIME"]
+    data = load_data(file_path, date_columns=date_cols)
+
+    # Filter data for years 2022 to 2025
+    data = data[(data["STARTTIME"].dt.year >= 2022) & (data["STARTTIME"].dt.year <= 2024)]
 
+    # Display the data
+    st.write("The planned outage logs look like this:")
+    st.write(data.head())
+
+    # Visualize the data
+    st.write("Let's start by visualising from both temporal and reason analysis.")
 
+    outage_panel(data)
 
 
 st.write("---")
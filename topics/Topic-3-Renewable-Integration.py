@@ -2,6 +2,11 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 
+from nem.charts import altair_chart
+from nem.data import load_data, load_region_mixes
+from nem.panels import lazy_tabs, panel
+from nem.scada import default_span, span_label
+
 
 st.header("Topic 3: Renewable Integration Analysis and Impact Forecast")
 
@@ -19,49 +24,17 @@ st.write("---")
 # List of regions
 REGIONS =['ALL', 'NSW1', 'QLD1', 'SA1', 'TAS1', 'VIC1']
 
-# Load data function
-def load_data(file_path, date_columns):
-    try:
-        data = pd.read_csv(file_path, parse_dates=date_columns)
-        return data
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return None
-
 # Selecta region to start
 selected_region = st.sidebar.selectbox("Select a region to analyse the fuel mix", REGIONS, index=0)
 
 
-with st.container():
-    st.subheader("Example: **Generation Fuel Mix in the NEM (Jan 2025)**")
-    st.write("In this example, we will explore the generation fuel mix in the NEM for January 2025.")
-
-    reg_file_path = "data/analysis/NEM_Registration.csv"
-    screenshot_path = "data/analysis/DISPATCH_UNIT_SCADA_202501_screenshot.csv"
-    file_path = "data/analysis/DISPATCH_UNIT_SCADA_202501_daily.csv"
-    date_cols = ["DATE"]
-
-    data_screenshot = load_data(screenshot_path, date_columns=["SETTLEMENTDATE", "LASTCHANGED"])
-    data_reg = load_data(reg_file_path, date_columns=None)
-    ## aggregated data
-    data = load_data(file_path, date_columns=date_cols)
-
-    ### display data
-    if data_reg is not None:
-        st.write("The registration details of the generators in the NEM is shown below:")
-        st.dataframe(data_reg.head())
-        st.caption("The registration table includes the generator's fuel type, technology, capacity and classification.")
-    if data_screenshot is not None:
-        st.write("The generation and load data by each participant in January 2025 is shown below:")
-        st.dataframe(data_screenshot.head())
-        st.caption("The postive SCADAVALUE indicates the generation, and the negative SCADAVALUE indicates the load.")
-
-    ### visualisation
-
-    fuel, technology = st.tabs(["Fuel Mix", "Technology Mix"])
+@panel
+def mix_panel(fuel_mixes, tech_mixes, region, area, period):
+    """Daily fuel and technology mixes of a region: only the selected tab is drawn."""
+    tab = lazy_tabs(["Fuel Mix", "Technology Mix"], key="mix-tab")
 
     # column name Fuel Source - Primary
-    with fuel:
+    if tab == "Fuel Mix":
         option = ['total', 'percent']
         selection = st.pills("Select a statistic to display", 
                             option, 
@@ -71,7 +44,7 @@ with st.container():
         
         if selection:
             if 'total' in selection:
-                fuel_mix = data.groupby(["Fuel Source - Primary", "DATE"]).agg({"SCADAVALUE_sum": "sum"}).reset_index()
+                fuel_mix = fuel_mixes[region]
                 fuel_chart = alt.Chart(fuel_mix).mark_area().encode(
                     x=alt.X("DATE:T", title="Date"),
                     y=alt.Y("SCADAVALUE_sum:Q", title="Total Generation (MWh)", stack=True),
@@ -80,9 +53,7 @@ with st.container():
                 )
 
             elif 'percent' in selection:
-                fuel_mix = data.groupby(["Fuel Source - Primary", "DATE"]).agg({"SCADAVALUE_sum": "sum"}).reset_index()
-                fuel_mix["Total"] = fuel_mix.groupby("DATE")["SCADAVALUE_sum"].transform("sum")
-                fuel_mix["Percent"] = fuel_mix["SCADAVALUE_sum"] / fuel_mix["Total"] * 100
+                fuel_mix = fuel_mixes[region]
 
                 fuel_chart = alt.Chart(fuel_mix).mark_area().encode(
                     x=alt.X("DATE:T", title="Date"),
@@ -91,15 +62,15 @@ with st.container():
                     order=alt.Order("Fuel Source - Primary:N", sort="ascending")
                 )
 
-            st.write("The generation fuel mix in the NEM for January 2025 is shown below:")
-            st.altair_chart(fuel_chart, theme="streamlit", use_container_width=True)
+            st.write(f"The generation fuel mix in {area} for {period} is shown below:")
+            altair_chart(fuel_chart)
             st.caption("The fuel sources are extracted from the registration table of the generators.")
 
         else:
             st.warning("Please select a statistic to display.")
-    
+
     # column name Technology Type - Primary
-    with technology:
+    else:
         option = ['total', 'percent']
         selection = st.pills("Select a statistic to display", 
                     option, 
@@ -109,7 +80,7 @@ with st.container():
         
         if selection:
             if 'total' in selection:
-                tech_mix = data.groupby(["Technology Type - Primary", "DATE"]).agg({"SCADAVALUE_sum": "sum"}).reset_index()
+                tech_mix = tech_mixes[region]
                 tech_chart = alt.Chart(tech_mix).mark_area().encode(
                     x=alt.X("DATE:T", title="Date"),
                     y=alt.Y("SCADAVALUE_sum:Q", title="Total Generation (MWh)", stack=True),
@@ -118,9 +89,7 @@ with st.container():
                 )
             
             elif 'percent' in selection:
-                tech_mix = data.groupby(["Technology Type - Primary", "DATE"]).agg({"SCADAVALUE_sum": "sum"}).reset_index()
-                tech_mix["Total"] = tech_mix.groupby("DATE")["SCADAVALUE_sum"].transform("sum")
-                tech_mix["Percent"] = tech_mix["SCADAVALUE_sum"] / tech_mix["Total"] * 100
+                tech_mix = tech_mixes[region]
 
                 tech_chart = alt.Chart(tech_mix).mark_area().encode(
                     x=alt.X("DATE:T", title="Date"),
@@ -129,13 +98,44 @@ with st.container():
                     order=alt.Order("Technology Type - Primary:N", sort="ascending")
                 )
             
-            st.write("The generation technology mix in the NEM for January 2025 is shown below:")
-            st.altair_chart(tech_chart, theme="streamlit", use_container_width=True)
+            st.write(f"The generation technology mix in {area} for {period} is shown below:")
+            altair_chart(tech_chart)
             st.caption("The technology types are extracted from the registration table of the generators.")
         else:
             st.warning("Please select a statistic to display.")
 
 
+# the longest span of months reduced by `python -m nem.scada` (or `nem.matrix build`), else the January 2025 sample
+span = default_span()
+period = span_label(span)
+
+with st.container():
+    st.subheader(f"Example: **Generation Fuel Mix in the NEM ({period})**")
+    st.write(f"In this example, we will explore the generation fuel mix in the NEM for {period}.")
+
+    reg_file_path = "data/analysis/NEM_Registration.csv"
+    screenshot_path = "data/analysis/DISPATCH_UNIT_SCADA_202501_screenshot.csv"
+
+    data_screenshot = load_data(screenshot_path, date_columns=["SETTLEMENTDATE", "LASTCHANGED"])
+    data_reg = load_data(reg_file_path, date_columns=None)
+    ## aggregated data: daily generation by fuel source and technology type, for each region and the whole NEM
+    fuel_mixes = load_region_mixes(span, "fuel")
+    tech_mixes = load_region_mixes(span, "technology")
+    area = "the NEM" if selected_region == "ALL" else selected_region
+
+    ### display data
+    if data_reg is not None:
+        st.write("The registration details of the generators in the NEM is shown below:")
+        st.dataframe(data_reg.head())
+        st.caption("The registration table includes the generator's fuel type, technology, capacity and classification.")
+    if data_screenshot is not None:
+        st.write("The generation and load data by each participant in January 2025 is shown below:")
+        st.dataframe(data_screenshot.head())
+        st.caption("The postive SCADAVALUE indicates the generation, and the negative SCADAVALUE indicates the load.")
+
+    ### visualisation
+    mix_panel(fuel_mixes, tech_mixes, selected_region, area, period)
+
 
 st.write("---")
 